@@ -1,16 +1,26 @@
-import httpx
 import asyncio
-from typing import List, Optional
+import re
+import httpx
+from itertools import zip_longest
+from datetime import datetime
+from typing import AsyncIterator, FrozenSet, List, Optional, Tuple
 from models.search_result import SearchResult
-from .base import DataSourceAdapter
+from .base import DataSourceAdapter, wants
 
 class AudiobookshelfAdapter(DataSourceAdapter):
+    name = "Audiobookshelf"
+    supports_mirror = True
+    thumbnail_path = re.compile(r"/items/[\w-]+/cover")
+
     def __init__(self, config: dict):
         super().__init__(config)
         self.username = config.get("username")
         self.password = config.get("password")
         self.session_token: Optional[str] = None
         self.token_lock = asyncio.Lock()
+        # "all", "default" or a comma-separated list of library ids or names
+        self.library_filter = config.get("libraries", "all")
+        self.libraries: List[Tuple[str, str]] = []  # (id, name) searched on every query
 
     async def _login(self) -> bool:
         if not self.username or not self.password or not self.web_base_url:
@@ -24,108 +34,202 @@ class AudiobookshelfAdapter(DataSourceAdapter):
         }
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    login_url,
-                    json=payload,
-                    timeout=5
-                )
-                response.raise_for_status()
-                data = response.json()
-                if "user" in data and "token" in data["user"]:
-                    self.session_token = data["user"]["token"]
-                    self.default_library_id = data.get("userDefaultLibraryId")
-                    return True
-                else:
-                    self.session_token = None
-                    return False
+            response = await self.client.post(
+                login_url,
+                json=payload,
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            data = response.json()
+            if "user" in data and "token" in data["user"]:
+                self.session_token = data["user"]["token"]
+                self.default_library_id = data.get("userDefaultLibraryId")
+                self.libraries = await self._load_libraries()
+                return True
+            else:
+                self.session_token = None
+                return False
         except Exception as e:
             print(f"AudiobookshelfAdapter login error: {e}")
             self.session_token = None
-            return False
+            raise
 
-    async def search(self, query: str) -> List[SearchResult]:
-        if not self.enabled: return []
-        results = []
+    async def warmup(self):
+        # Log in up front so the first search does not pay for the login round-trip.
+        if not await self._ensure_session():
+            raise RuntimeError("could not obtain a session token")
 
+    async def _ensure_session(self) -> bool:
         async with self.token_lock:
             if not self.session_token:
                 if not await self._login():
                     print("AudiobookshelfAdapter: Failed to obtain session token. Cannot perform search.")
-                    return results
+                    return False
 
         if not self.session_token:
-            return results
+            return False
 
-        if not hasattr(self, 'default_library_id') or not self.default_library_id:
-            print("AudiobookshelfAdapter: Default library ID not found after login. Cannot perform search.")
-            return results
+        if not self.libraries:
+            print("AudiobookshelfAdapter: No library to search after login. Cannot perform search.")
+            return False
+        return True
 
+    async def _load_libraries(self) -> List[Tuple[str, str]]:
+        # Called from _login(); falls back to the user's default library if listing fails.
+        default = [(self.default_library_id, "")] if self.default_library_id else []
+        if self.library_filter == "default":
+            return default
         try:
-            search_url = f"{self.api_base_url}/libraries/{self.default_library_id}/search"
-            headers = {
-                "Authorization": f"Bearer {self.session_token}"
-            }
-            params = {
-                "q": query,
-                "limit": 50
-            }
-
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    search_url,
-                    headers=headers,
-                    params=params,
-                    timeout=10
-                )
-                response.raise_for_status()
-                data = response.json()
-                items = []
-                if "books" in data and isinstance(data["books"], list):
-                    items.extend(data["books"])
-                if "podcast" in data and isinstance(data["podcast"], list):
-                    items.extend(data["podcast"])
-
-                if not items:
-                    print(f"AudiobookshelfAdapter: No recognized items (books/podcast) in search response: {data}")
-                    return results
-
-                for item in items:
-                    if "libraryItem" in item:
-                        book_data = item["libraryItem"].get("media", {}).get("metadata", {})
-                        book_id = item["libraryItem"].get("id")
-                    else:
-                        book_data = item
-                        book_id = item.get("_id")
-
-                    if not book_id:
-                        print(f"AudiobookshelfAdapter: Skipping item due to missing ID: {item}")
-                        continue
-
-                    title = book_data.get("title")
-                    description_parts = []
-                    if book_data.get("series"):
-                        description_parts.append(f"Series: {book_data.get('series')}")
-                    if book_data.get("author"):
-                        description_parts.append(f"Author: {book_data.get('author')}")
-                    if book_data.get("description"):
-                        description_parts.append(book_data.get("description"))
-                    description = "\n".join(description_parts).strip() or ""
-                    thumbnail_url = f"{self.api_base_url}/items/{book_id}/cover"
-
-                    results.append(SearchResult(
-                        id=book_id,
-                        source="Audiobookshelf",
-                        title=title or "Untitled Audiobook",
-                        description=description,
-                        thumbnail_url=thumbnail_url,
-                        detail_url=self._build_detail_url(book_id, item_type="book"),
-                        type="Audiobook"
-                    ))
+            response = await self.client.get(f"{self.api_base_url}/libraries",
+                                             headers={"Authorization": f"Bearer {self.session_token}"},
+                                             timeout=self.timeout)
+            response.raise_for_status()
+            listed = [(lib["id"], lib.get("name") or "") for lib in response.json().get("libraries", []) if lib.get("id")]
         except Exception as e:
-            print(f"AudiobookshelfAdapter error: {e}")
+            print(f"AudiobookshelfAdapter: could not list libraries ({type(e).__name__} - {e}), using the default library.")
+            return default
+        if self.library_filter != "all":
+            wanted = {part.strip().lower() for part in self.library_filter.split(",") if part.strip()}
+            listed = [(lib_id, name) for lib_id, name in listed if lib_id.lower() in wanted or name.lower() in wanted]
+        return listed or default
+
+    async def _refresh_session(self, stale_token: Optional[str]) -> bool:
+        # Only the first caller holding the expired token logs in again; callers queued
+        # behind it on token_lock find a new token and reuse it.
+        async with self.token_lock:
+            if self.session_token == stale_token:
+                print("AudiobookshelfAdapter: session expired, logging in again.")
+                self.session_token = None
+        return await self._ensure_session()
+
+    async def _get(self, url: str, **kwargs) -> httpx.Response:
+        token = self.session_token
+        response = await self.client.get(url, headers={"Authorization": f"Bearer {token}"},
+                                         timeout=self.timeout, **kwargs)
+        if response.status_code == 401 and await self._refresh_session(token):
+            response = await self.client.get(url, headers={"Authorization": f"Bearer {self.session_token}"},
+                                             timeout=self.timeout, **kwargs)
+        return response
+
+    def _to_result(self, book_id: str, book_data: dict, fields: Optional[FrozenSet[str]] = None,
+                   library: Optional[str] = None) -> SearchResult:
+        title = book_data.get("title")
+        description = None
+        if wants(fields, "description"):
+            description_parts = []
+            if book_data.get("series"):
+                description_parts.append(f"Series: {book_data.get('series')}")
+            if book_data.get("author"):
+                description_parts.append(f"Author: {book_data.get('author')}")
+            if book_data.get("description"):
+                description_parts.append(book_data.get("description"))
+            description = "\n".join(description_parts).strip() or ""
+        thumbnail_url = self._thumbnail_url(f"/items/{book_id}/cover") if wants(fields, "thumbnail_url") else None
+
+        return SearchResult(
+            id=book_id,
+            source=self.name,
+            title=title or "Untitled Audiobook",
+            description=description,
+            thumbnail_url=thumbnail_url,
+            detail_url=self._build_detail_url(book_id, item_type="book"),
+            type="Audiobook" if wants(fields, "type") else None,
+            library=library or None
+        )
+
+    async def search(self, query: str, limit: Optional[int] = None, offset: int = 0, fields: Optional[FrozenSet[str]] = None) -> List[SearchResult]:
+        if not self.enabled: return []
+
+        if not await self._ensure_session():
+            return []
+
+        # Every library is searched concurrently for offset + limit items; the
+        # per-library lists are interleaved so each library's best hits come first.
+        fetch = offset + limit if limit is not None else 50
+        per_library = await self.fan_out((self._search_library(lib_id, name, query, fetch, fields)
+                                          for lib_id, name in self.libraries), "library")
+        results = [result for rank in zip_longest(*per_library) for result in rank if result is not None]
+        return results[offset:offset + limit] if limit is not None else results[offset:]
+
+    async def _search_library(self, library_id: str, library_name: str, query: str, fetch: int,
+                              fields: Optional[FrozenSet[str]]) -> List[SearchResult]:
+        results = []
+        search_url = f"{self.api_base_url}/libraries/{library_id}/search"
+        # The library search endpoint has no offset, so fetch offset + limit and slice.
+        params = {
+            "q": query,
+            "limit": fetch
+        }
+
+        response = await self._get(search_url, params=params)
+        response.raise_for_status()
+        data = response.json()
+        items = []
+        if "books" in data and isinstance(data["books"], list):
+            items.extend(data["books"])
+        if "podcast" in data and isinstance(data["podcast"], list):
+            items.extend(data["podcast"])
+
+        if not items:
+            return results
+
+        for item in items:
+            if "libraryItem" in item:
+                book_data = item["libraryItem"].get("media", {}).get("metadata", {})
+                book_id = item["libraryItem"].get("id")
+            else:
+                book_data = item
+                book_id = item.get("_id")
+
+            if not book_id:
+                print(f"AudiobookshelfAdapter: Skipping item due to missing ID: {item}")
+                continue
+
+            results.append(self._to_result(book_id, book_data, fields, library_name))
+            if len(results) >= fetch:
+                break
         return results
 
+    async def fetch_catalog(self, since: Optional[datetime] = None) -> AsyncIterator[List[SearchResult]]:
+        # Items are listed newest-updated first, so an incremental sync stops at the first older item.
+        if not self.enabled or not await self._ensure_session():
+            return
+        since_ms = since.timestamp() * 1000 if since is not None else None
+        for library_id, library_name in list(self.libraries):
+            async for batch in self._fetch_library(library_id, library_name, since_ms):
+                yield batch
+
+    async def _fetch_library(self, library_id: str, library_name: str, since_ms: Optional[float]) -> AsyncIterator[List[SearchResult]]:
+        page_size = self.config.get("mirror_page_size", 500)
+        page = 0
+        while True:
+            response = await self._get(
+                f"{self.api_base_url}/libraries/{library_id}/items",
+                params={"limit": page_size, "page": page, "sort": "updatedAt", "desc": 1},
+            )
+            response.raise_for_status()
+            items = response.json().get("results", [])
+            batch = []
+            reached_watermark = False
+            for item in items:
+                if since_ms is not None and (item.get("updatedAt") or 0) < since_ms:
+                    reached_watermark = True
+                    break
+                if item.get("id"):
+                    metadata = item.get("media", {}).get("metadata", {})
+                    book_data = dict(metadata, author=metadata.get("authorName"), series=metadata.get("seriesName"))
+                    batch.append(self._to_result(item["id"], book_data, library=library_name))
+            yield batch
+            if reached_watermark or len(items) < page_size:
+                break
+            page += 1
+
+    async def fetch_thumbnail(self, path: str) -> httpx.Response:
+        # Covers need the session token, which the browser doesn't have when linked directly.
+        if not await self._ensure_session():
+            raise RuntimeError("AudiobookshelfAdapter: no session for cover request")
+        return await self._get(f"{self.api_base_url}{path}")
+
     def _build_detail_url(self, item_id: str, item_type: Optional[str] = None, original_query: Optional[str] = None) -> str:
         if item_type == "book":
             return f"{self.web_base_url}/item/{item_id}"
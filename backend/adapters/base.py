@@ -1,15 +1,247 @@
-from typing import List, Optional
+import asyncio
+import dataclasses
+import importlib.util
+import time
+import urllib.parse
+import httpx
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, FrozenSet, Iterable, List, Optional, Pattern
 from models.search_result import SearchResult
+from models.search_filters import SearchFilters
+from services.cache import ResultCache, normalize_query
+from services.concurrency import LimitedTransport, UpstreamLimiter
+from services.resilience import CircuitBreaker
+from services.mirror import CatalogMirror
+from services.metrics import SEARCH_COALESCED, UPSTREAM_BYTES, UPSTREAM_SEARCH_DURATION
+from services.singleflight import SingleFlight
+
+
+# Optional SearchResult fields a caller can ask for; id, source, title and detail_url are always filled.
+PROJECTABLE_FIELDS = frozenset({"description", "thumbnail_url", "type", "size", "modified", "author"})
+
+
+def wants(fields: Optional[FrozenSet[str]], name: str) -> bool:
+    return fields is None or name in fields
+
+
+def project(results: List[SearchResult], fields: Optional[FrozenSet[str]]) -> List[SearchResult]:
+    """Copies of `results` with the fields not asked for cleared, as a live search would return them."""
+    if fields is None:
+        return results
+    cleared = {name: None for name in PROJECTABLE_FIELDS - fields}
+    return [dataclasses.replace(result, **cleared) for result in results] if cleared else results
+
+
+def _cache_variant(limit: Optional[int], offset: int, fields: Optional[FrozenSet[str]],
+                   filters: Optional[SearchFilters] = None) -> str:
+    variant = f"{limit}:{offset}:{','.join(sorted(fields)) if fields is not None else '*'}"
+    return f"{variant}:{filters.cache_key()}" if filters is not None else variant
+
+
+def create_http_client(config: dict, limiter: Optional[UpstreamLimiter] = None, **options) -> httpx.AsyncClient:
+    http2 = bool(config.get("http2", False))
+    if http2 and importlib.util.find_spec("h2") is None:
+        print("HTTP/2 requested but the 'h2' package is not installed, falling back to HTTP/1.1.")
+        http2 = False
+    limits = httpx.Limits(
+        max_connections=config.get("http_max_connections", 20),
+        max_keepalive_connections=config.get("http_max_keepalive", 10),
+        keepalive_expiry=config.get("http_keepalive_expiry", 30.0),
+    )
+    if limiter is None:
+        return httpx.AsyncClient(limits=limits, http2=http2, **options)
+    transport = LimitedTransport(httpx.AsyncHTTPTransport(limits=limits, http2=http2), limiter)
+    return httpx.AsyncClient(transport=transport, **options)
+
 
 class DataSourceAdapter:
+    name = "base"
+    supports_mirror = False  # adapters implementing fetch_catalog() set this
+    mirror_incremental = True  # False when fetch_catalog() ignores `since`
+    supports_filters = False  # True when search() accepts SearchFilters (file metadata)
+    warmup_timeout_factor = 1.0  # warm-up budget in multiples of `timeout`; None for no limit
+    # The only paths /thumbnail fetches (with the adapter's credentials); None when there are no thumbnails.
+    thumbnail_path: Optional[Pattern[str]] = None
+
     def __init__(self, config: dict):
         self.config = config
+        # Further instances of a source type are named after it, e.g. "Jellyfin:office".
+        self.instance = config.get("instance")
+        if self.instance:
+            self.name = f"{type(self).name}:{self.instance}"
         self.enabled = config.get("enabled", False)
         self.api_base_url = config.get("api_base_url")
         self.web_base_url = config.get("web_base_url")
+        self.timeout = config.get("timeout", 10.0)
+        self.rank_weight = config.get("rank_weight", 1.0)
+        self.backend_base_url = config.get("backend_base_url")
+        self.thumbnail_proxy = config.get("thumbnail_proxy", False)
+        self.breaker = CircuitBreaker(
+            failure_threshold=config.get("breaker_failure_threshold", 3),
+            reset_timeout=config.get("breaker_reset_timeout", 30.0),
+        )
+        self.mirror: Optional[CatalogMirror] = None
+        if self.supports_mirror and config.get("mirror_enabled", False):
+            self.mirror = CatalogMirror(
+                self,
+                interval=config.get("mirror_interval", 900.0),
+                max_age=config.get("mirror_max_age", 3600.0),
+                full_sync_interval=config.get("mirror_full_sync_interval", 86400.0),
+            )
+        self._mirror_task: Optional[asyncio.Task] = None
+        self._warmup_task: Optional[asyncio.Task] = None
+        self.ready = False
+        self.startup_error: Optional[str] = None
+        self._http: Optional[httpx.AsyncClient] = None
+        self.limiter: Optional[UpstreamLimiter] = None  # shared across sources, injected by routes
+        self.cache = ResultCache(
+            max_entries=config.get("cache_max_entries", 256),
+            ttl=config.get("cache_ttl", 60.0),
+            stale_ttl=config.get("cache_stale_ttl", 300.0),
+        )
+        # Identical concurrent searches (cache misses and stale refreshes) share one upstream request.
+        self.flights = SingleFlight()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created by startup() from the app lifespan; lazily here for scripts and tests.
+        if self._http is None or self._http.is_closed:
+            self._http = create_http_client(self.config, self.limiter, event_hooks={"response": [self._record_response]},
+                                            **self._client_options())
+        return self._http
+
+    async def _record_response(self, response: httpx.Response):
+        # Every caller reads the whole body anyway, so reading it here only moves that work earlier.
+        await response.aread()
+        UPSTREAM_BYTES.inc(len(response.content), source=self.name)
+
+    def _client_options(self) -> dict:
+        return {}
+
+    @property
+    def serving(self) -> bool:
+        # Whether search() can answer at all; sources backed by a local index override this.
+        return True
+
+    @property
+    def state(self) -> str:
+        if not self.enabled:
+            return "disabled"
+        if self.ready:
+            return "ready"
+        return "failed" if self.startup_error else "starting"
+
+    async def startup(self):
+        # Returns immediately: warm-up runs as a task so all sources warm in parallel
+        # while the app already accepts requests.
+        if self.enabled and (self.api_base_url or self.web_base_url):
+            self.client
+        if self.enabled and self.mirror is not None and self._mirror_task is None:
+            self._mirror_task = asyncio.create_task(self.mirror.run())
+        if self.enabled and self._warmup_task is None:
+            self._warmup_task = asyncio.create_task(self._run_warmup())
 
-    async def search(self, query: str) -> List[SearchResult]:
+    async def _run_warmup(self):
+        started = time.monotonic()
+        budget = None if self.warmup_timeout_factor is None else self.timeout * self.warmup_timeout_factor
+        try:
+            await asyncio.wait_for(self.warmup(), budget)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.startup_error = f"{type(e).__name__}: {e}"
+            print(f"{self.name}: warm-up failed ({self.startup_error}); searches will still be attempted.")
+            return
+        self.ready = True
+        print(f"{self.name}: ready after {time.monotonic() - started:.1f}s")
+
+    async def warmup(self):
+        # Open a pooled connection now so the first search skips connection setup.
+        await self.probe()
+
+    async def shutdown(self):
+        for task in (self._mirror_task, self._warmup_task):
+            if task is not None:
+                task.cancel()
+        self._mirror_task = None
+        self._warmup_task = None
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def search(self, query: str, limit: Optional[int] = None, offset: int = 0, fields: Optional[FrozenSet[str]] = None) -> List[SearchResult]:
+        # limit/offset and fields should be translated into the upstream's own paging and projection.
+        raise NotImplementedError
+
+    async def cached_search(self, query: str, limit: Optional[int] = None, offset: int = 0, fields: Optional[FrozenSet[str]] = None,
+                            filters: Optional[SearchFilters] = None) -> List[SearchResult]:
+        # `filters` is only passed on to adapters that set supports_filters.
+        if filters is None and self.mirror is not None and self.mirror.is_fresh():
+            return project(self.mirror.search(query, limit, offset), fields)
+        variant = _cache_variant(limit, offset, fields, filters)
+
+        async def fetch() -> List[SearchResult]:
+            started = time.monotonic()
+            try:
+                if filters is not None:
+                    return await self.search(query, limit, offset, fields, filters)
+                return await self.search(query, limit, offset, fields)
+            finally:
+                UPSTREAM_SEARCH_DURATION.observe(time.monotonic() - started, source=self.name)
+
+        async def shared_fetch() -> List[SearchResult]:
+            key = (normalize_query(query), variant)
+            if key in self.flights:
+                SEARCH_COALESCED.inc(source=self.name)
+            return await self.flights.do(key, fetch)
+
+        return await self.cache.get_or_fetch(query, shared_fetch, variant)
+
+    def peek_cached(self, query: str, limit: Optional[int] = None, offset: int = 0, fields: Optional[FrozenSet[str]] = None,
+                    filters: Optional[SearchFilters] = None) -> Optional[List[SearchResult]]:
+        return self.cache.peek(query, _cache_variant(limit, offset, fields, filters))
+
+    async def fan_out(self, calls: Iterable[Awaitable[List[SearchResult]]], what: str = "part") -> List[List[SearchResult]]:
+        """Run per-library (or similar) searches concurrently.
+
+        A part that fails is logged and left out; the search only fails when
+        every part does. The caller's budget still bounds the whole fan-out.
+        """
+        outcomes = await asyncio.gather(*calls, return_exceptions=True)
+        failures = [o for o in outcomes if isinstance(o, BaseException)]
+        for failure in failures:
+            if isinstance(failure, asyncio.CancelledError):
+                raise failure
+            print(f"{self.name}: {what} search failed: {type(failure).__name__} - {failure}")
+        if failures and len(failures) == len(outcomes):
+            raise failures[0]
+        return [o for o in outcomes if not isinstance(o, BaseException)]
+
+    async def fetch_catalog(self, since: Optional[datetime] = None) -> AsyncIterator[List[SearchResult]]:
+        # Yield pages of the source's catalog, only items modified after `since` where the API allows.
         raise NotImplementedError
+        yield
+
+    def _thumbnail_base(self) -> Optional[str]:
+        return self.api_base_url
+
+    def _thumbnail_headers(self) -> dict:
+        return {}
+
+    def _thumbnail_url(self, path: str) -> str:
+        # `path` is relative to _thumbnail_base(); the proxy only ever fetches from that host.
+        if self.thumbnail_proxy and self.backend_base_url:
+            return f"{self.backend_base_url}/thumbnail/{urllib.parse.quote(self.name, safe='')}?path={urllib.parse.quote(path, safe='')}"
+        return f"{self._thumbnail_base()}{path}"
+
+    async def fetch_thumbnail(self, path: str) -> httpx.Response:
+        return await self.client.get(f"{self._thumbnail_base()}{path}", headers=self._thumbnail_headers(), timeout=self.timeout)
+
+    async def probe(self):
+        # Any HTTP response means the host is reachable again; only transport errors count.
+        url = self.api_base_url or self.web_base_url
+        if url:
+            await self.client.get(url, timeout=self.timeout)
 
     def _build_detail_url(self, item_id: str, item_type: Optional[str] = None, original_query: Optional[str] = None) -> str:
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError
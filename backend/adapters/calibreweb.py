@@ -1,32 +1,245 @@
+import asyncio
+import re
+import time
+import urllib.parse
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from io import BytesIO
 import httpx
-from typing import List, Optional
+from typing import FrozenSet, List, Optional
 from models.search_result import SearchResult
-from .base import DataSourceAdapter
-from bs4 import BeautifulSoup
+from .base import DataSourceAdapter, wants
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+ATOM = "{http://www.w3.org/2005/Atom}"
+OPDS_BOOK_ID = re.compile(r"/opds/(?:cover|download|cover_\d+_\d+)/(\d+)")
+
+# HTML/XML parsing is CPU-bound; keep it off the event loop so one big result page
+# doesn't stall every other concurrent search. Threads rather than a spawn-started
+# process pool (as ContentIndex uses for extraction): the parsers stop after `limit`
+# books, a few milliseconds of work, which is about what shipping the page to another
+# process and the results back would cost. They still hold the GIL while parsing;
+# what they buy is that the loop keeps switching to other requests meanwhile.
+_PARSE_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="calibreweb-parse")
+# In auto mode, how long to use HTML scraping after OPDS fails with an error that may pass.
+OPDS_RETRY_SECONDS = 300.0
+
+
+def parse_csrf_token(html: str) -> Optional[str]:
+    soup = BeautifulSoup(html, HTML_PARSER, parse_only=SoupStrainer('input', attrs={'name': 'csrf_token'}))
+    csrf_token_field = soup.find('input', {'name': 'csrf_token'})
+    return csrf_token_field['value'] if csrf_token_field else None
+
+
+class _SearchPageParser(HTMLParser):
+    """Streaming extractor for the books in div.discover of a /search page.
+
+    Builds no tree, so it is several times faster than BeautifulSoup on large
+    pages, and it stops as soon as `limit` books have been collected.
+    """
+
+    def __init__(self, limit: Optional[int] = None):
+        super().__init__(convert_charrefs=True)
+        self.limit = limit
+        self.books: List[dict] = []
+        self._discover_depth = 0  # div nesting depth inside div.discover, 0 when outside
+        self._book_depth = 0  # div nesting depth inside the current book div
+        self._book: Optional[dict] = None
+        self._in_author = False
+        self._author_text: Optional[List[str]] = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        classes = (attrs.get("class") or "").split()
+        if tag == "div":
+            if self._discover_depth:
+                self._discover_depth += 1
+                if self._book is not None:
+                    self._book_depth += 1
+                elif "book" in classes or "session" in classes:
+                    self._book = {"id": None, "title": "Untitled Book", "author": "Unknown Author",
+                                  "description": None, "cover": None, "_link_seen": False}
+                    self._book_depth = 1
+            elif "discover" in classes:
+                self._discover_depth = 1
+            return
+        book = self._book
+        if book is None:
+            return
+        if tag == "a":
+            href = attrs.get("href")
+            if href is not None and not book["_link_seen"]:
+                book["_link_seen"] = True
+                if "/book/" in href:
+                    book["id"] = href.split("/book/")[-1].split("?")[0].split("#")[0] or None
+            if self._in_author and "author-name" in classes and self._author_text is None:
+                self._author_text = []
+        elif tag == "img" and book["cover"] is None and attrs.get("src"):
+            book["cover"] = attrs["src"]  # This will be like /cover/4396/og?c=1748679572
+        elif tag == "p":
+            if "title" in classes:
+                book["title"] = (attrs.get("title") or "").strip()
+            elif "author" in classes:
+                self._in_author = True
+
+    def handle_data(self, data):
+        if self._author_text is not None:
+            self._author_text.append(data)
+
+    def handle_endtag(self, tag):
+        if tag == "a" and self._author_text is not None:
+            if self._book is not None and self._book["author"] == "Unknown Author":
+                self._book["author"] = "".join(self._author_text).strip() or "Unknown Author"
+            self._author_text = None
+        elif tag == "p":
+            self._in_author = False
+        elif tag == "div" and self._discover_depth:
+            self._discover_depth -= 1
+            if self._book is not None:
+                self._book_depth -= 1
+                if self._book_depth == 0:
+                    self._finish_book()
+
+    def _finish_book(self):
+        book, self._book = self._book, None
+        del book["_link_seen"]
+        if not book["id"]:
+            print(f"--- CalibreWebAdapter Debug: Skipping book due to missing ID: {book['title']} ---")
+            return
+        self.books.append(book)
+        if self.limit is not None and len(self.books) >= self.limit:
+            raise _EnoughBooks()
+
+
+class _EnoughBooks(Exception):
+    pass
+
+
+def parse_search_html(html: str, limit: Optional[int] = None) -> List[dict]:
+    parser = _SearchPageParser(limit)
+    try:
+        parser.feed(html)
+        parser.close()
+    except _EnoughBooks:
+        pass
+    return parser.books
+
+
+def parse_opds_feed(content: bytes, limit: Optional[int] = None) -> List[dict]:
+    # iterparse lets us stop after `limit` entries and drop each entry once read.
+    books = []
+    for _, elem in ET.iterparse(BytesIO(content), events=("end",)):
+        if elem.tag != f"{ATOM}entry":
+            continue
+        book_id = None
+        cover = None
+        for link in elem.iter(f"{ATOM}link"):
+            href = link.get("href", "")
+            match = OPDS_BOOK_ID.search(href)
+            if match and book_id is None:
+                book_id = match.group(1)
+            if link.get("rel") == "http://opds-spec.org/image":
+                cover = href
+        title = (elem.findtext(f"{ATOM}title") or "").strip() or "Untitled Book"
+        author = (elem.findtext(f"{ATOM}author/{ATOM}name") or "").strip() or "Unknown Author"
+        content_elem = elem.find(f"{ATOM}content")
+        summary = elem.findtext(f"{ATOM}summary")
+        if summary is None and content_elem is not None:
+            summary = "".join(content_elem.itertext())
+        elem.clear()
+        if book_id:
+            books.append({"id": book_id, "title": title, "author": author,
+                          "description": summary.strip() if summary else None, "cover": cover})
+            if limit is not None and len(books) >= limit:
+                break
+    return books
+
 
 class CalibreWebAdapter(DataSourceAdapter):
+    name = "CalibreWeb"
+    # /cover/<id>/<size>?c=<stamp> from the web UI, /opds/cover[_<w>_<h>]/<id> from the OPDS feed
+    thumbnail_path = re.compile(r"/cover/\d+(/\w+)?(\?c=\d+)?|/opds/cover(_\d+_\d+)?/\d+")
+
     def __init__(self, config: dict):
         super().__init__(config)
         self.username = config.get("username")
         self.password = config.get("password")
         self._is_logged_in = False
-        # Re-enable follow_redirects=True for the client
-        # This allows it to automatically follow redirects during login and search
-        self.client = httpx.AsyncClient(base_url=self.web_base_url, follow_redirects=True, timeout=10)
+        self._login_lock = asyncio.Lock()
+        self._login_epoch = 0  # bumped on every successful login
+        # "opds" parses the OPDS Atom feed, "html" scrapes the web UI, "auto" tries OPDS and
+        # falls back to HTML: for good if there is no feed (404, not a feed), otherwise
+        # for OPDS_RETRY_SECONDS.
+        self.search_mode = config.get("search_mode", "auto")
+        self._opds_retry_at = 0.0
+
+    def _client_options(self) -> dict:
+        # Follow redirects during login and search; the client's cookie jar holds the session.
+        return {"base_url": self.web_base_url or "", "follow_redirects": True, "timeout": self.timeout}
+
+    async def shutdown(self):
+        await super().shutdown()
+        self._is_logged_in = False
+
+    async def warmup(self):
+        # OPDS uses basic auth per request; only HTML scraping needs the session cookie.
+        if self.search_mode == "html":
+            await self._login()
+        else:
+            await self.probe()
+
+    async def probe(self):
+        # Everything here goes through the web UI; api_base_url is unused and, left at
+        # its default, a placeholder host that would keep the breaker open forever.
+        if self.web_base_url:
+            await self.client.get(f"{self.web_base_url}/", timeout=self.timeout)
+
+    async def _parse(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(_PARSE_POOL, func, *args)
 
     async def _login(self):
         if self._is_logged_in:
             return
+        # One login at a time; searches waiting here reuse the session it creates.
+        async with self._login_lock:
+            if not self._is_logged_in:
+                await self._do_login()
+
+    def _session_expired(self, response: httpx.Response) -> bool:
+        # An expired session cookie gets redirected to the login form (or a 401).
+        return response.status_code == 401 or str(response.url).split("?")[0] == f"{self.web_base_url}/login"
+
+    def _expire_session(self, epoch: int):
+        # Ignore reports about a session that a concurrent search has already replaced.
+        if self._is_logged_in and epoch == self._login_epoch:
+            print("CalibreWebAdapter: session expired, logging in again.")
+            self._is_logged_in = False
+
+    async def _session_get(self, url: str, **kwargs) -> httpx.Response:
+        await self._login()
+        epoch = self._login_epoch
+        response = await self.client.get(url, **kwargs)
+        if self._session_expired(response):
+            self._expire_session(epoch)
+            await self._login()
+            response = await self.client.get(url, **kwargs)
+        return response
 
+    async def _do_login(self):
         login_url = f"{self.web_base_url}/login"
 
         try:
             get_response = await self.client.get(login_url)
             get_response.raise_for_status()
 
-            soup = BeautifulSoup(get_response.text, 'html.parser')
-            csrf_token_field = soup.find('input', {'name': 'csrf_token'})
-            csrf_token = csrf_token_field['value'] if csrf_token_field else None
+            csrf_token = await self._parse(parse_csrf_token, get_response.text)
 
             login_data = {
                 "username": self.username,
@@ -42,6 +255,7 @@ class CalibreWebAdapter(DataSourceAdapter):
             
             if str(response.url) == f"{self.web_base_url}/":
                 self._is_logged_in = True
+                self._login_epoch += 1
             elif "Incorrect username or password" in response.text:
                 self._is_logged_in = False
             else:
@@ -58,107 +272,95 @@ class CalibreWebAdapter(DataSourceAdapter):
             raise Exception("CalibreWebAdapter: Failed to log in. Check credentials, CSRF token, and server status.")
 
 
-    async def search(self, query: str) -> List[SearchResult]:
-        if not self.enabled: return []
-        results = []
-        try:
-            if not self.web_base_url:
-                print("CalibreWebAdapter: web_base_url is not set for the adapter.")
-                return results
+    async def _search_html(self, query: str, limit: Optional[int]) -> List[dict]:
+        search_url = f"{self.web_base_url}/search"
 
-            await self._login()
+        headers = {
+            "Referer": self.web_base_url + "/"
+        }
 
-            search_url = f"{self.web_base_url}/search"
+        response = await self._session_get(
+            search_url,
+            params={"query": query},
+            headers=headers
+        )
+        response.raise_for_status()
 
-            headers = {
-                "Referer": self.web_base_url + "/"
-            }
+        if 'text/html' not in response.headers.get('Content-Type', ''):
+            return []
 
-            response = await self.client.get(
-                search_url,
-                params={"query": query},
-                headers=headers
-            )
-            response.raise_for_status()
-
-            if 'text/html' not in response.headers.get('Content-Type', ''):
-                return results
+        return await self._parse(parse_search_html, response.text, limit)
 
-            soup = BeautifulSoup(response.text, 'html.parser')
+    async def _search_opds(self, query: str, limit: Optional[int]) -> List[dict]:
+        response = await self.client.get(
+            f"{self.web_base_url}/opds/search/{urllib.parse.quote(query, safe='')}",
+            auth=(self.username or "", self.password or "")
+        )
+        response.raise_for_status()
+        if 'xml' not in response.headers.get('Content-Type', ''):
+            raise ET.ParseError("OPDS search did not return an XML feed")
+        return await self._parse(parse_opds_feed, response.content, limit)
 
-            discover_div = soup.find('div', class_='discover')
-            if not discover_div:
+    async def search(self, query: str, limit: Optional[int] = None, offset: int = 0, fields: Optional[FrozenSet[str]] = None) -> List[SearchResult]:
+        if not self.enabled: return []
+        results = []
+        try:
+            if not self.web_base_url:
+                print("CalibreWebAdapter: web_base_url is not set for the adapter.")
                 return results
 
-            book_divs = discover_div.find_all('div', class_=['book', 'session'])
-
-            if not book_divs:
-                row_div = discover_div.find('div', class_='row display-flex')
-
-            for book_div in book_divs:
-                title_tag = book_div.find('p', class_='title')
-                title = title_tag.get('title', '').strip() if title_tag else "Untitled Book"
-
-                detail_link_tag = book_div.find('a', href=True)
-                book_id = None
-                if detail_link_tag and '/book/' in detail_link_tag['href']:
-                    try:
-                        book_id = detail_link_tag['href'].split('/book/')[-1].split('?')[0].split('#')[0]
-                    except Exception as e:
-                        print(f"--- CalibreWebAdapter Debug: Could not parse book_id from URL: {detail_link_tag['href']}, Error: {e} ---")
+            # Neither endpoint has paging parameters; parsing stops once enough books are collected.
+            wanted = None if limit is None else offset + limit
+            books = None
+            if self.search_mode == "opds" or (self.search_mode == "auto" and time.monotonic() >= self._opds_retry_at):
+                try:
+                    books = await self._search_opds(query, wanted)
+                except (httpx.HTTPStatusError, ET.ParseError) as e:
+                    if self.search_mode == "opds":
+                        raise
+                    if isinstance(e, ET.ParseError) or e.response.status_code == 404:
+                        print(f"CalibreWebAdapter: no usable OPDS feed ({e}), using HTML scraping from now on.")
+                        self.search_mode = "html"
+                    else:
+                        # A server error or a rejected login may pass; keep trying the feed now and then.
+                        print(f"CalibreWebAdapter: OPDS search failed ({e}), using HTML scraping "
+                              f"for the next {OPDS_RETRY_SECONDS:.0f}s.")
+                        self._opds_retry_at = time.monotonic() + OPDS_RETRY_SECONDS
+            if books is None:
+                books = await self._search_html(query, wanted)
 
-                img_tag = book_div.find('img', src=True)
-                # Extract the base cover path and the 'c' parameter
-                relative_cover_path = None
-                if img_tag and 'src' in img_tag.attrs:
-                    relative_cover_path = img_tag['src'] # This will be like /cover/4396/og?c=1748679572
-
-                # *** NEW LOGIC FOR thumbnail_url ***
-                # Point to your backend's proxy endpoint, passing the book_id and cover_path
-                # The frontend will request this URL from your backend, which will then fetch it from Calibre-Web
+            for book in books[offset:]:
+                # Covers need the session cookie (or OPDS basic auth), so they can only be served through the proxy.
                 thumbnail_url = None
-                # if book_id and relative_cover_path:
-                #     # Encode the 'c' parameter for URL safety if it exists, or just pass the full path.
-                #     # For simplicity, let's just pass the whole relative path.
-                #     # This assumes your backend will parse the relative path to reconstruct the full Calibre-Web URL
-                #     # Let's refine this: the backend proxy endpoint will need the *exact* path and query params.
-                #     # So we send the full relative path, and the proxy will append it to calibreweb_base_url
-                #     thumbnail_url = f"/api/calibreweb/cover_proxy?path={httpx.URL(relative_cover_path).path}&query_params={httpx.URL(relative_cover_path).query}"
-                #     # Or, more robustly, just pass the book_id and a size parameter, and reconstruct on the backend.
-                #     # Given the "og" for original size, let's just pass book_id and assume original size for now.
-                #     thumbnail_url = f"/api/calibreweb/cover_proxy/{book_id}" # Simplified for now, we'll get the actual size logic in proxy
-                #     # For precise path with 'c' parameter, it's better to pass the entire relative path as a single encoded query param.
-                #     thumbnail_url = f"/api/calibreweb/cover_proxy?relative_path={relative_cover_path}"
-                #     # Make sure the relative_path is URL-encoded when added as a query param.
-                #     import urllib.parse
-                #     encoded_relative_path = urllib.parse.quote_plus(relative_cover_path)
-                #     thumbnail_url = f"/api/calibreweb/cover_proxy?relative_path={encoded_relative_path}"
-                
-                author_tag = book_div.find('p', class_='author')
-                author = author_tag.find('a', class_='author-name').text.strip() if author_tag and author_tag.find('a', class_='author-name') else "Unknown Author"
-
-                description = None
-
-                if book_id:
-                    results.append(SearchResult(
-                        id=book_id,
-                        source="CalibreWeb",
-                        title=title,
-                        description=description,
-                        thumbnail_url=thumbnail_url, # This will be the new proxied URL
-                        detail_url=self._build_detail_url(book_id),
-                        type="Book",
-                        author=author
-                    ))
-                else:
-                    print(f"--- CalibreWebAdapter Debug: Skipping book due to missing ID: {title} ---")
+                if book["cover"] and self.thumbnail_proxy and wants(fields, "thumbnail_url"):
+                    thumbnail_url = self._thumbnail_url(book["cover"])
+                results.append(SearchResult(
+                    id=book["id"],
+                    source=self.name,
+                    title=book["title"],
+                    description=book["description"] if wants(fields, "description") else None,
+                    thumbnail_url=thumbnail_url,
+                    detail_url=self._build_detail_url(book["id"]),
+                    type="Book" if wants(fields, "type") else None,
+                    author=book["author"] if wants(fields, "author") else None
+                ))
 
         except httpx.HTTPStatusError as e:
             print(f"CalibreWebAdapter error: HTTP Error {e.response.status_code} during search. Response: {e.response.text[:500]}")
+            raise
         except Exception as e:
             print(f"CalibreWebAdapter error during search: {e}")
+            raise
         return results
 
+    def _thumbnail_base(self) -> Optional[str]:
+        return self.web_base_url
+
+    async def fetch_thumbnail(self, path: str) -> httpx.Response:
+        if path.startswith("/opds/"):
+            return await self.client.get(f"{self.web_base_url}{path}", auth=(self.username or "", self.password or ""))
+        return await self._session_get(f"{self.web_base_url}{path}")
+
     def _build_detail_url(self, book_id: str) -> Optional[str]:
         if self.web_base_url and book_id:
             return f"{self.web_base_url}/book/{book_id}"
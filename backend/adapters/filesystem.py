@@ -1,41 +1,235 @@
-from adapters.base import DataSourceAdapter
+from adapters.base import DataSourceAdapter, wants
 from models.search_result import SearchResult
+from models.search_filters import SearchFilters
+from indexing.trigram import TrigramIndex
+from indexing.snapshot import IndexSnapshot
+from indexing.content import ContentIndex
+from indexing.filestore import FileStore
+from indexing.shared import SharedIndexPublisher, SharedIndexReader, serialize
+from indexing.pinyin import AVAILABLE as PINYIN_AVAILABLE, VariantIndex, variant_query
+from services.metrics import INDEX_BUILD_SECONDS
+import asyncio
 import os
-from typing import List
+import sqlite3
+from collections import defaultdict
+from typing import Dict, FrozenSet, List, Optional, Tuple
 from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler, FileCreatedEvent, FileDeletedEvent, FileMovedEvent
+from watchdog.events import FileSystemEventHandler
+import fcntl
+import heapq
+import queue
+import stat
 import threading
 import time
 
+def _suggestion(rel_path: str) -> str:
+    # Completions offer the file name without its extension.
+    return os.path.splitext(os.path.basename(rel_path))[0]
+
 class _IndexUpdateHandler(FileSystemEventHandler):
+    """Forwards raw watchdog events to the adapter's batching queue."""
+
     def __init__(self, adapter):
         self.adapter = adapter
 
     def on_created(self, event):
-        if not event.is_directory:
-            rel_path = os.path.relpath(event.src_path, self.adapter.root_path)
-            self.adapter.index[rel_path] = event.src_path
+        self.adapter._events.put((event.src_path, event.is_directory))
 
     def on_deleted(self, event):
+        self.adapter._events.put((event.src_path, event.is_directory))
+
+    def on_modified(self, event):
+        # A directory's own modification only means its children changed,
+        # and those arrive as separate events.
         if not event.is_directory:
-            rel_path = os.path.relpath(event.src_path, self.adapter.root_path)
-            self.adapter.index.pop(rel_path, None)
+            self.adapter._events.put((event.src_path, False))
 
     def on_moved(self, event):
-        if not event.is_directory:
-            old_rel = os.path.relpath(event.src_path, self.adapter.root_path)
-            new_rel = os.path.relpath(event.dest_path, self.adapter.root_path)
-            self.adapter.index.pop(old_rel, None)
-            self.adapter.index[new_rel] = event.dest_path
+        self.adapter._events.put((event.src_path, event.is_directory))
+        self.adapter._events.put((event.dest_path, event.is_directory))
 
 class FileSystemAdapter(DataSourceAdapter):
+    name = "filesystem"
+    supports_filters = True
+    warmup_timeout_factor = None  # a full scan of a large tree can take minutes
+
     def __init__(self, config: dict):
         super().__init__(config)
         self.root_path = config.get("search_path", "/data/search_root")
         self.backend_base_url = config.get("backend_base_url", "http://localhost:8000")
-        self.index = {}  # key: rel_path, value: abs_path
-        self.build_index()
+        self.name_index = TrigramIndex()  # basename n-grams -> rel_path
+        self.variant_index = VariantIndex()  # pinyin / simplified forms of Chinese basenames -> rel_path
+        if not PINYIN_AVAILABLE:
+            print("FileSystemAdapter: pypinyin / opencc not installed, pinyin and traditional-Chinese matching disabled.")
+        self.files = FileStore()  # rel_path -> size, mtime, extension, directory
+        self.dir_mtimes: Dict[str, float] = {}  # key: rel dir ("" is the root), value: mtime
+        snapshot_path = config.get("index_snapshot_path")
+        self.snapshot = IndexSnapshot(snapshot_path) if snapshot_path else None
+        self.snapshot_interval = config.get("index_snapshot_interval", 300)
+        self._dirty = False
+        # Writers (event batches, reconcile) and readers (search, snapshot) share this lock.
+        self._lock = threading.RLock()
+        self._events: "queue.Queue[Tuple[str, bool]]" = queue.Queue()
+        self.watch_debounce = config.get("watch_debounce", 0.5)
+        self.watch_max_delay = config.get("watch_max_delay", 5.0)
+        self.content = None
+        # shared: with several uvicorn workers, the worker holding the lock in
+        # shared_index_dir indexes and watches; the others map what it publishes.
+        self.reader: Optional[SharedIndexReader] = None
+        self.publisher: Optional[SharedIndexPublisher] = None
+        self.variant_reader: Optional[SharedIndexReader] = None
+        self.variant_publisher: Optional[SharedIndexPublisher] = None
+        self.publish_interval = config.get("shared_publish_interval", 2.0)
+        self._publish_needed = threading.Event()
+        # Set once name_index holds a complete scan or snapshot; until then search is not served.
+        self._index_loaded = threading.Event()
+
+    @property
+    def serving(self) -> bool:
+        reader = self.reader
+        if reader is not None:
+            return reader.version > 0
+        return self._index_loaded.is_set()
+
+    async def warmup(self):
+        # Indexing runs in a worker thread so the app accepts requests right away.
+        await asyncio.to_thread(self._initialize)
+        while not self.serving:
+            # A follower started before the indexing worker published its first version.
+            await asyncio.sleep(0.5)
+
+    def _initialize(self):
+        if self.config.get("index_mode") == "shared":
+            shared_dir = self.config.get("shared_index_dir", "/data/index/shared")
+            os.makedirs(shared_dir, exist_ok=True)
+            self._lock_file = open(os.path.join(shared_dir, "indexer.lock"), "a")
+            try:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self._start_follower(shared_dir)
+                return
+            self.publisher = SharedIndexPublisher(shared_dir)
+            self.variant_publisher = SharedIndexPublisher(shared_dir, "pinyin")
+        self._start_indexing()
+
+    def _open_content_index(self, readonly: bool = False):
+        if not self.config.get("content_index_enabled"):
+            return None
+        try:
+            return ContentIndex(
+                self.config.get("content_index_path", "/data/index/content.db"),
+                self.root_path,
+                workers=self.config.get("content_index_workers", 2),
+                max_file_bytes=self.config.get("content_max_file_bytes", 50 * 1024 * 1024),
+                readonly=readonly,
+            )
+        except (OSError, sqlite3.Error) as e:
+            print(f"FileSystemAdapter: content index disabled: {e}")
+            return None
+
+    def _start_follower(self, shared_dir: str):
+        self.reader = SharedIndexReader(shared_dir)
+        self.reader.refresh()
+        self.variant_reader = SharedIndexReader(shared_dir, "pinyin")
+        self.variant_reader.refresh()
+        self.content = self._open_content_index(readonly=True)
+        print(f"FileSystemAdapter: following the shared index in {shared_dir} (version {self.reader.version})")
+        threading.Thread(target=self._follow_loop, daemon=True).start()
+        threading.Thread(target=self._wait_for_indexer_lock, args=(shared_dir,), daemon=True).start()
+
+    def _follow_loop(self):
+        while self.reader is not None:
+            reader, variant_reader = self.reader, self.variant_reader
+            changed = reader.refresh()
+            if variant_reader is not None and variant_reader.refresh():
+                self.cache.invalidate()
+            if changed:
+                self.cache.invalidate()
+            time.sleep(0.5)
+
+    def _wait_for_indexer_lock(self, shared_dir: str):
+        # Blocks until the indexing worker exits (the kernel drops its lock), then takes over.
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        print("FileSystemAdapter: indexing worker is gone, taking over indexing")
+        self.publisher = SharedIndexPublisher(shared_dir)
+        self.variant_publisher = SharedIndexPublisher(shared_dir, "pinyin")
+        self.content = None
+        self._start_indexing()
+        self.reader = None
+        self.variant_reader = None
+        self.cache.invalidate()
+
+    def _start_indexing(self):
+        self.content = self._open_content_index()
+        loaded = self._load_snapshot()
+        if not loaded:
+            self.build_index()
+            self.save_snapshot()
+        self._index_loaded.set()
+        if self.content:
+            with self._lock:
+                files = {rel_path: st for rel_path, st in self.files.items() if ContentIndex.supports(rel_path)}
+            self.content.start(files)
         self._start_watchdog()
+        if loaded:
+            threading.Thread(target=self.reconcile, daemon=True).start()
+        if self.snapshot:
+            threading.Thread(target=self._snapshot_loop, daemon=True).start()
+        if self.publisher:
+            # A snapshot-loaded index is only republished once reconcile finds changes,
+            # so followers never drop back from a newer published version to the snapshot.
+            if not loaded or self.publisher.version == 0:
+                self.publish_index()
+            threading.Thread(target=self._publish_loop, daemon=True).start()
+
+    @property
+    def indexed_files(self) -> int:
+        reader = self.reader
+        return len(reader) if reader is not None else len(self.files)
+
+    def complete_names(self, prefix: str, limit: int) -> List[str]:
+        """File names without extension that start with `prefix`, from the sorted name index.
+
+        A SuggestIndex source; it takes the index lock, so call it off the event loop.
+        """
+        reader = self.reader
+        if reader is not None:
+            paths = reader.complete(prefix, limit)
+        elif self._index_loaded.is_set():
+            with self._lock:
+                paths = self.name_index.prefix(prefix, limit)
+        else:
+            return []
+        names = (_suggestion(rel_path) for rel_path in paths)
+        # The prefix may reach into the extension ("report.p"); completions are names without it.
+        return [name for name in names if name.lower().startswith(prefix)]
+
+    def publish_index(self):
+        start = time.time()
+        # Only the export holds the lock (list and flat buffer copies); encoding can take
+        # over a second on a large tree and runs while event batches proceed.
+        with self._lock:
+            names = self.name_index.export()
+            files = self.files.copy()
+            variants = self.variant_index.index.export()
+        serialized = serialize(names, files)
+        variants = serialize(variants)
+        try:
+            self.variant_publisher.publish(variants)
+            version = self.publisher.publish(serialized)
+        except OSError as e:
+            print(f"FileSystemAdapter: failed to publish the shared index: {e}")
+            return
+        print(f"FileSystemAdapter: published shared index version {version} "
+              f"({serialized.live_count} files) in {time.time() - start:.1f}s")
+
+    def _publish_loop(self):
+        # At most one publish per interval, however many batches arrive in between.
+        while True:
+            self._publish_needed.wait()
+            self._publish_needed.clear()
+            self.publish_index()
+            time.sleep(self.publish_interval)
 
     def _start_watchdog(self):
         event_handler = _IndexUpdateHandler(self)
@@ -43,28 +237,413 @@ class FileSystemAdapter(DataSourceAdapter):
         observer.schedule(event_handler, self.root_path, recursive=True)
         t = threading.Thread(target=observer.start, daemon=True)
         t.start()
+        threading.Thread(target=self._watch_loop, daemon=True).start()
+
+    def _watch_loop(self):
+        # Drain events until the tree has been quiet for `watch_debounce`
+        # seconds (or `watch_max_delay` has passed), then apply them as one batch.
+        while True:
+            path, is_dir = self._events.get()
+            touched = {path: is_dir}
+            received = 1
+            deadline = time.monotonic() + self.watch_max_delay
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    path, is_dir = self._events.get(timeout=min(self.watch_debounce, remaining))
+                except queue.Empty:
+                    break
+                received += 1
+                touched[path] = touched.get(path, False) or is_dir
+            try:
+                self._apply_events(touched)
+            except Exception as e:
+                print(f"FileSystemAdapter: failed to apply {len(touched)} file events: {e}")
+            for _ in range(received):
+                # reconcile() joins the queue to learn when its paths have been applied.
+                self._events.task_done()
+
+    def _apply_events(self, touched: Dict[str, bool]):
+        """Apply a coalesced batch of watchdog events.
+
+        Events only say which paths to look at; the disk is the source of truth
+        at apply time, so a create/modify/delete sequence on one path collapses
+        into a single stat. Touched directories are re-walked and diffed against
+        the index, which covers directory creates, moves and deletes; paths
+        below a touched directory are subsumed by that walk.
+        """
+        dirs, files = set(), set()
+        for abs_path, is_dir in touched.items():
+            rel_path = os.path.relpath(abs_path, self.root_path)
+            if rel_path == os.curdir or rel_path.split(os.sep, 1)[0] == os.pardir:
+                continue
+            (dirs if is_dir or rel_path in self.dir_mtimes else files).add(rel_path)
+
+        puts, drops = [], []
+        for rel_path in files:
+            try:
+                st = os.stat(os.path.join(self.root_path, rel_path))
+            except OSError:
+                drops.append(rel_path)
+                continue
+            if stat.S_ISDIR(st.st_mode):
+                if not os.path.islink(os.path.join(self.root_path, rel_path)):
+                    dirs.add(rel_path)
+                continue
+            puts.append((rel_path, st.st_mtime, st.st_size))
+
+        dirs = {d for d in dirs if not self._under(d, dirs)}
+        if dirs:
+            puts = [p for p in puts if not self._under(p[0], dirs)]
+            drops = [d for d in drops if not self._under(d, dirs)]
+
+        scanned_dirs: Dict[str, float] = {}
+        for rel_dir in dirs:
+            if os.path.islink(os.path.join(self.root_path, rel_dir)):
+                continue
+            pending = [rel_dir]
+            while pending:
+                current = pending.pop()
+                mtime = self._dir_mtime(current)
+                if mtime is None:
+                    continue
+                listing = self._scan_dir(current)
+                if listing is None:
+                    continue
+                scanned_dirs[current] = mtime
+                files_here, subdirs = listing
+                for fname, file_mtime, size in files_here:
+                    puts.append((os.path.join(current, fname), file_mtime, size))
+                pending.extend(os.path.join(current, d) for d in subdirs)
+
+        with self._lock:
+            if dirs:
+                # The directory table finds everything that used to live
+                # under the touched directories.
+                prefixes = tuple(d + os.sep for d in dirs)
+                seen = {p[0] for p in puts}
+                drops.extend(rel_path for rel_path in self.files.paths_under(dirs) if rel_path not in seen)
+                drops.extend(rel_path for rel_path in dirs if rel_path in self.files)
+                gone_dirs = [d for d in self.dir_mtimes
+                             if (d in dirs or d.startswith(prefixes)) and d not in scanned_dirs]
+            else:
+                gone_dirs = []
+            puts = [p for p in puts if self.files.get(p[0]) != (p[1], p[2])]
+            drops = [d for d in drops if d in self.files]
+            self._apply_changes(puts, drops, scanned_dirs, gone_dirs)
+
+    @staticmethod
+    def _under(rel_path: str, dirs: set) -> bool:
+        parent = os.path.dirname(rel_path)
+        while parent:
+            if parent in dirs:
+                return True
+            parent = os.path.dirname(parent)
+        return False
+
+    def _scan_dir(self, rel_dir: str) -> Optional[Tuple[List[Tuple[str, float, int]], List[str]]]:
+        # Mirrors os.walk: symlinked directories are listed but not followed.
+        files, subdirs = [], []
+        try:
+            with os.scandir(os.path.join(self.root_path, rel_dir)) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir():
+                            if not entry.is_symlink():
+                                subdirs.append(entry.name)
+                            continue
+                        st = entry.stat()
+                        files.append((entry.name, st.st_mtime, st.st_size))
+                    except OSError:
+                        files.append((entry.name, 0.0, 0))
+        except OSError as e:
+            print(f"FileSystemAdapter: cannot list {rel_dir or self.root_path}: {e}")
+            return None
+        return files, subdirs
+
+    def _dir_mtime(self, rel_dir: str) -> Optional[float]:
+        try:
+            return os.stat(os.path.join(self.root_path, rel_dir)).st_mtime
+        except OSError:
+            return None
 
     def build_index(self):
-        self.index = {}
-        for dirpath, _, filenames in os.walk(self.root_path):
-            for fname in filenames:
-                rel_path = os.path.relpath(os.path.join(dirpath, fname), self.root_path)
-                self.index[rel_path] = os.path.join(dirpath, fname)
+        start = time.time()
+        files, dir_mtimes = FileStore(), {}
+        name_index = TrigramIndex()
+        variant_index = VariantIndex()
+        pending = [""]
+        while pending:
+            rel_dir = pending.pop()
+            mtime = self._dir_mtime(rel_dir)
+            listing = self._scan_dir(rel_dir)
+            if mtime is None or listing is None:
+                continue
+            dir_mtimes[rel_dir] = mtime
+            entries, subdirs = listing
+            for fname, file_mtime, size in entries:
+                rel_path = os.path.join(rel_dir, fname)
+                files.put(rel_path, file_mtime, size)
+                name_index.add(rel_path, fname)
+                variant_index.add(rel_path, fname)
+            pending.extend(os.path.join(rel_dir, d) for d in subdirs)
+        name_index.track_order()
+        self.files = files
+        self.dir_mtimes = dir_mtimes
+        self.name_index = name_index
+        self.variant_index = variant_index
+        INDEX_BUILD_SECONDS.set(time.time() - start, phase="scan")
+        print(f"FileSystemAdapter: indexed {len(files)} files in {time.time() - start:.1f}s")
+
+    def _load_snapshot(self) -> bool:
+        if not self.snapshot:
+            return False
+        start = time.time()
+        loaded = self.snapshot.load(self.root_path)
+        if loaded is None:
+            return False
+        stats, self.dir_mtimes = loaded
+        name_index = TrigramIndex()
+        variant_index = VariantIndex()
+        files = FileStore()
+        for rel_path, (mtime, size) in stats.items():
+            files.put(rel_path, mtime, size)
+            name_index.add(rel_path, os.path.basename(rel_path))
+            variant_index.add(rel_path, os.path.basename(rel_path))
+        name_index.track_order()
+        self.files = files
+        self.name_index = name_index
+        self.variant_index = variant_index
+        INDEX_BUILD_SECONDS.set(time.time() - start, phase="snapshot")
+        print(f"FileSystemAdapter: loaded {len(files)} files from snapshot in {time.time() - start:.1f}s")
+        return True
+
+    def save_snapshot(self):
+        if not self.snapshot:
+            return
+        self._dirty = False
+        with self._lock:
+            files = [(rel_path, mtime, size) for rel_path, (mtime, size) in self.files.items()]
+            dirs = list(self.dir_mtimes.items())
+        # The snapshot only speeds up the next boot, so no failure here may stop indexing.
+        try:
+            self.snapshot.save(self.root_path, files, dirs)
+        except Exception as e:
+            self._dirty = True
+            print(f"FileSystemAdapter: failed to save index snapshot: {type(e).__name__} - {e}")
+
+    def _snapshot_loop(self):
+        while True:
+            time.sleep(self.snapshot_interval)
+            if self._dirty:
+                self.save_snapshot()
+
+    def reconcile(self):
+        """Bring a snapshot-loaded index up to date with the tree on disk.
+
+        A directory whose mtime matches the snapshot has the same entries as
+        before, so only its subdirectories (known from the snapshot) are
+        visited; changed directories are re-listed and diffed.
 
-    async def search(self, query: str) -> List[SearchResult]:
+        The walk only finds which paths changed. They go through the watch
+        thread's event queue like any watchdog event, so they are stat'ed
+        again at apply time and a file deleted during the walk is never
+        indexed from a stale listing. New directories are queued whole.
+        """
+        start = time.time()
+        with self._lock:
+            known_dirs = dict(self.dir_mtimes)
+            known_files = dict(self.files.items())
+        children = defaultdict(list)
+        for rel_dir in known_dirs:
+            if rel_dir:
+                children[os.path.dirname(rel_dir)].append(rel_dir)
+        files_by_dir = defaultdict(list)
+        for rel_path in known_files:
+            files_by_dir[os.path.dirname(rel_path)].append(rel_path)
+        changed, dir_updates = [], {}
+
+        seen_dirs = set()
+        rescanned = 0
+        pending = [""]
+        while pending:
+            rel_dir = pending.pop()
+            mtime = self._dir_mtime(rel_dir)
+            if mtime is None:
+                continue
+            seen_dirs.add(rel_dir)
+            if known_dirs.get(rel_dir) == mtime:
+                pending.extend(children.get(rel_dir, ()))
+                continue
+            if rel_dir not in known_dirs:
+                # The event batch walks and records a new directory itself.
+                changed.append((rel_dir, True))
+                rescanned += 1
+                continue
+            listing = self._scan_dir(rel_dir)
+            if listing is None:
+                continue
+            rescanned += 1
+            files, subdirs = listing
+            current = set()
+            for fname, file_mtime, size in files:
+                rel_path = os.path.join(rel_dir, fname)
+                current.add(rel_path)
+                if known_files.get(rel_path) != (file_mtime, size):
+                    changed.append((rel_path, False))
+            for rel_path in files_by_dir.get(rel_dir, ()):
+                if rel_path not in current:
+                    changed.append((rel_path, False))
+            dir_updates[rel_dir] = mtime
+            pending.extend(os.path.join(rel_dir, d) for d in subdirs)
+
+        changed.extend((rel_dir, True) for rel_dir in set(known_dirs) - seen_dirs)
+        for rel_path, is_dir in changed:
+            self._events.put((os.path.join(self.root_path, rel_path), is_dir))
+        # Record the re-listed directories' mtimes only once their changes are
+        # in, so a snapshot never pairs a new mtime with the old entries.
+        self._events.join()
+        with self._lock:
+            for rel_dir, mtime in dir_updates.items():
+                if rel_dir in self.dir_mtimes:
+                    self.dir_mtimes[rel_dir] = mtime
+                    self._dirty = True
+        INDEX_BUILD_SECONDS.set(time.time() - start, phase="reconcile")
+        print(f"FileSystemAdapter: reconciled snapshot in {time.time() - start:.1f}s "
+              f"({rescanned} of {len(seen_dirs)} directories changed)")
+
+    def _apply_changes(self, puts: List[Tuple[str, float, int]], drops: List[str],
+                       dir_updates: Dict[str, float] = None, gone_dirs=()):
+        """Apply a batch of index changes under the writer lock.
+
+        Searches take the same lock, so they see either none or all of a
+        batch, and the result cache is invalidated once per batch.
+        """
+        with self._lock:
+            for rel_path in drops:
+                self.files.remove(rel_path)
+                self.name_index.remove(rel_path)
+                self.variant_index.remove(rel_path)
+            for rel_path, mtime, size in puts:
+                self.files.put(rel_path, mtime, size)
+                if rel_path not in self.name_index:
+                    self.name_index.add(rel_path, os.path.basename(rel_path))
+                    self.variant_index.add(rel_path, os.path.basename(rel_path))
+            for rel_dir in gone_dirs:
+                self.dir_mtimes.pop(rel_dir, None)
+            if dir_updates:
+                self.dir_mtimes.update(dir_updates)
+        if puts or drops:
+            self._dirty = True
+            self.cache.invalidate()
+            if self.publisher:
+                self._publish_needed.set()
+            if self.content:
+                self.content.submit(puts, drops)
+
+    def _name_matches(self, reader: Optional[SharedIndexReader], query: str, fetch: Optional[int]) -> List[str]:
+        # Pinyin, initials and traditional/simplified matches follow the plain name matches.
+        variant = variant_query(query)
+        if reader is not None:
+            variant_reader = self.variant_reader
+            matches = reader.search(query, fetch)
+            variant_matches = variant_reader.search(variant, fetch) if variant and variant_reader else []
+        else:
+            with self._lock:
+                matches = self.name_index.search(query, fetch)
+                variant_matches = self.variant_index.index.search(variant, fetch) if variant else []
+        if variant_matches:
+            name_hits = set(matches)
+            matches.extend(rel_path for rel_path in variant_matches if rel_path not in name_hits)
+        return matches
+
+    def _page(self, reader: Optional[SharedIndexReader], matches: List[str], filters: Optional[SearchFilters],
+              offset: int, wanted: Optional[int]) -> List[Tuple[str, Optional[Tuple[float, int]]]]:
+        if reader is not None:
+            # Followers read the metadata columns of the published index; only
+            # paths it does not have yet (fresh content hits) are stat'ed.
+            if filters is None:
+                page = [(rel_path, reader.get(rel_path)) for rel_path in matches[offset:wanted]]
+                unknown = self._stat_store([rel_path for rel_path, meta in page if meta is None])
+                return [(rel_path, meta or unknown.get(rel_path)) for rel_path, meta in page]
+            selected, unknown_paths = reader.select(matches, filters)
+            unknown = self._stat_store(unknown_paths)
+
+            def meta(rel_path: str) -> Optional[Tuple[float, int]]:
+                return reader.get(rel_path) or unknown.get(rel_path)
+
+            if unknown_paths:
+                selected = self._merge_selected(selected, unknown.select(unknown_paths, filters), matches, meta, filters)
+            return [(rel_path, meta(rel_path)) for rel_path in selected[offset:wanted]]
+        with self._lock:
+            if filters is not None:
+                matches = self.files.select(matches, filters)
+            return [(rel_path, self.files.get(rel_path)) for rel_path in matches[offset:wanted]]
+
+    async def search(self, query: str, limit: Optional[int] = None, offset: int = 0, fields: Optional[FrozenSet[str]] = None,
+                     filters: Optional[SearchFilters] = None) -> List[SearchResult]:
         results = []
-        for rel_path, abs_path in self.index.items():
-            if query.lower() in os.path.basename(rel_path).lower():
-                results.append(SearchResult(
-                    id=rel_path,
-                    source="filesystem",
-                    title=os.path.basename(rel_path),
-                    description=rel_path,
-                    thumbnail_url=None,
-                    detail_url=f"{self.backend_base_url}/download/filesystem/{rel_path}",
-                    type="file"
-                ))
+        wanted = None if limit is None else offset + limit
+        # Filtering or sorting needs every match, not just the first `wanted`.
+        fetch = wanted if filters is None else None
+        # Index lookups run in a worker thread: the lock they take is also held
+        # by event batches, which must never stall the event loop.
+        reader = self.reader
+        matches = await asyncio.to_thread(self._name_matches, reader, query, fetch)
+        with_description = wants(fields, "description")
+        with_type = wants(fields, "type")
+        descriptions = {}
+        if self.content:
+            # Name matches come first; content hits that are not also name hits follow,
+            # with the matching passage as their description.
+            name_hits = set(matches)
+            content_limit = max(wanted or 0, 500) if filters is not None else wanted or 500
+            for rel_path, snippet in await asyncio.to_thread(self.content.search, query, content_limit):
+                if rel_path not in name_hits:
+                    matches.append(rel_path)
+                    descriptions[rel_path] = snippet
+        page = await asyncio.to_thread(self._page, reader, matches, filters, offset, wanted)
+        with_size = wants(fields, "size")
+        with_modified = wants(fields, "modified")
+        for rel_path, meta in page:
+            results.append(SearchResult(
+                id=rel_path,
+                source="filesystem",
+                title=os.path.basename(rel_path),
+                description=descriptions.get(rel_path, rel_path) if with_description else None,
+                thumbnail_url=None,
+                detail_url=f"{self.backend_base_url}/download/filesystem/{rel_path}",
+                type="file" if with_type else None,
+                size=meta[1] if meta and with_size else None,
+                modified=meta[0] if meta and with_modified else None
+            ))
         return results
 
+    @staticmethod
+    def _merge_selected(published: List[str], stated: List[str], matches: List[str], meta,
+                        filters: SearchFilters) -> List[str]:
+        # Both lists are already in `filters.sort` order; interleave them into one.
+        if filters.sort == "relevance":
+            position = {rel_path: i for i, rel_path in enumerate(matches)}
+            return list(heapq.merge(published, stated, key=position.__getitem__))
+        if filters.sort == "name":
+            key = lambda rel_path: os.path.basename(rel_path).lower()
+        else:
+            column = 1 if filters.sort == "size" else 0
+            key = lambda rel_path: (meta(rel_path) or (0.0, 0))[column]
+        return list(heapq.merge(published, stated, key=key, reverse=filters.descending))
+
+    def _stat_store(self, rel_paths: List[str]) -> FileStore:
+        store = FileStore()
+        for rel_path in rel_paths:
+            try:
+                st = os.stat(os.path.join(self.root_path, rel_path))
+            except OSError:
+                continue
+            store.put(rel_path, st.st_mtime, st.st_size)
+        return store
+
     def _build_detail_url(self, item_id: str, item_type: str = None, original_query: str = None) -> str:
         return f"{self.backend_base_url}/download/filesystem/{item_id}"
@@ -1,57 +1,112 @@
-import httpx
-from typing import List, Optional
+import re
+from datetime import datetime
+from typing import AsyncIterator, FrozenSet, List, Optional
 from models.search_result import SearchResult
-from .base import DataSourceAdapter
+from .base import DataSourceAdapter, wants
+
+ITEM_TYPES = "Movie,Series,Episode,Audio,Photo,Book"
 
 class JellyfinAdapter(DataSourceAdapter):
-    async def search(self, query: str) -> List[SearchResult]:
+    name = "Jellyfin"
+    supports_mirror = True
+    thumbnail_path = re.compile(r"/Items/[\w-]+/Images/Primary(\?quality=\d+)?")
+
+    def _is_configured(self) -> bool:
+        if not self.api_base_url:
+            print("JellyfinAdapter: api_base_url is not set for the adapter.")
+            return False
+        if "api_key" not in self.config or not self.config["api_key"]:
+            print("JellyfinAdapter: API key is not set in config.")
+            return False
+        if "user_id" not in self.config or not self.config["user_id"]:
+            print("JellyfinAdapter: User ID is not set in config.")
+            return False
+        return True
+
+    async def _get_items(self, params: dict) -> dict:
+        headers = {"X-MediaBrowser-Token": self.config["api_key"]}
+        user_id = self.config["user_id"]
+        request_url = f"{self.api_base_url}/Users/{user_id}/Items"
+        response = await self.client.get(
+            request_url,
+            params=params,
+            headers=headers,
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def _to_result(self, item: dict, fields: Optional[FrozenSet[str]] = None) -> SearchResult:
+        thumbnail_url = None
+        if wants(fields, "thumbnail_url") and item.get("ImageTags", {}).get("Primary"):
+            thumbnail_url = self._thumbnail_url(f"/Items/{item['Id']}/Images/Primary?quality=90")
+
+        return SearchResult(
+            id=item["Id"],
+            source=self.name,
+            title=item.get("Name", "Untitled"),
+            description=item.get("Overview") if wants(fields, "description") else None,
+            thumbnail_url=thumbnail_url,
+            detail_url=self._build_detail_url(item["Id"]),
+            type=item.get("Type") if wants(fields, "type") else None
+        )
+
+    async def search(self, query: str, limit: Optional[int] = None, offset: int = 0, fields: Optional[FrozenSet[str]] = None) -> List[SearchResult]:
         if not self.enabled: return []
         results = []
         try:
-            if not self.api_base_url:
-                print("JellyfinAdapter: api_base_url is not set for the adapter.")
-                return results
-            if "api_key" not in self.config or not self.config["api_key"]:
-                print("JellyfinAdapter: API key is not set in config.")
-                return results
-            if "user_id" not in self.config or not self.config["user_id"]:
-                print("JellyfinAdapter: User ID is not set in config.")
+            if not self._is_configured():
                 return results
 
-            async with httpx.AsyncClient() as client:
-                headers = {"X-MediaBrowser-Token": self.config["api_key"]}
-                user_id = self.config["user_id"]
-                params = {
-                    "searchTerm": query,
-                    "Recursive": "true",
-                    "IncludeItemTypes": "Movie,Series,Episode,Audio,Photo,Book"
-                }
-                request_url = f"{self.api_base_url}/Users/{user_id}/Items"
-                response = await client.get(
-                    request_url,
-                    params=params,
-                    headers=headers,
-                    timeout=10
-                )
-                response.raise_for_status()
-                data = response.json()
-                for item in data.get("Items", []):
-                    thumbnail_url = None
-                    if item.get("ImageTags", {}).get("Primary"):
-                        thumbnail_url = f"{self.api_base_url}/Items/{item['Id']}/Images/Primary?quality=90"
-
-                    results.append(SearchResult(
-                        id=item["Id"],
-                        source="Jellyfin",
-                        title=item.get("Name", "Untitled"),
-                        description=item.get("Overview"),
-                        thumbnail_url=thumbnail_url,
-                        detail_url=self._build_detail_url(item["Id"]),
-                        type=item.get("Type")
-                    ))
+            params = {
+                "searchTerm": query,
+                "Recursive": "true",
+                "IncludeItemTypes": ITEM_TYPES,
+                "StartIndex": offset,
+                "EnableUserData": "false",
+                "EnableTotalRecordCount": "false"
+            }
+            if limit is not None:
+                params["Limit"] = limit
+            if wants(fields, "description"):
+                params["Fields"] = "Overview"
+            if wants(fields, "thumbnail_url"):
+                params["EnableImageTypes"] = "Primary"
+                params["ImageTypeLimit"] = 1
+            else:
+                params["EnableImages"] = "false"
+            data = await self._get_items(params)
+            for item in data.get("Items", []):
+                results.append(self._to_result(item, fields))
         except Exception as e:
             print(f"JellyfinAdapter error: {e}")
+            raise
         return results
 
+    async def fetch_catalog(self, since: Optional[datetime] = None) -> AsyncIterator[List[SearchResult]]:
+        if not self.enabled or not self._is_configured():
+            return
+        page_size = self.config.get("mirror_page_size", 500)
+        start = 0
+        while True:
+            params = {
+                "Recursive": "true",
+                "IncludeItemTypes": ITEM_TYPES,
+                "Fields": "Overview",
+                "StartIndex": start,
+                "Limit": page_size
+            }
+            if since is not None:
+                params["MinDateLastSaved"] = since.isoformat()
+            data = await self._get_items(params)
+            items = data.get("Items", [])
+            yield [self._to_result(item) for item in items]
+            start += len(items)
+            if len(items) < page_size or start >= data.get("TotalRecordCount", 0):
+                break
+
+    def _thumbnail_headers(self) -> dict:
+        return {"X-MediaBrowser-Token": self.config.get("api_key", "")}
+
     def _build_detail_url(self, item_id: str, item_type: Optional[str] = None, original_query: Optional[str] = None) -> str:
-        return f"{self.web_base_url}/web/index.html#!/details?id={item_id}"
\ No newline at end of file
+        return f"{self.web_base_url}/web/index.html#!/details?id={item_id}"
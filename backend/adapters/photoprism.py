@@ -1,10 +1,36 @@
-import httpx
-from typing import List, Optional
+import re
+from datetime import datetime
+from typing import AsyncIterator, FrozenSet, List, Optional
 from models.search_result import SearchResult
-from .base import DataSourceAdapter
+from .base import DataSourceAdapter, wants
 
 class PhotoPrismAdapter(DataSourceAdapter):
-    async def search(self, query: str) -> List[SearchResult]:
+    name = "PhotoPrism"
+    supports_mirror = True
+    mirror_incremental = False
+    thumbnail_path = re.compile(r"/api/v1/t/[0-9a-f]+/public/tile_500")
+
+    def _to_result(self, photo: dict, fields: Optional[FrozenSet[str]] = None) -> SearchResult:
+        photo_hash = photo.get("Hash")
+        if not wants(fields, "thumbnail_url"):
+            thumbnail_url = None
+        elif photo_hash:
+            thumbnail_url = self._thumbnail_url(f"/api/v1/t/{photo_hash}/public/tile_500")
+        else:
+            thumbnail_url = ""
+            print(f"Warning: Photo {photo.get('UID')} has no 'Hash' for thumbnail generation.")
+
+        return SearchResult(
+            id=photo["UID"],
+            source=self.name,
+            title=photo.get("Title") or photo.get("FileName", "Untitled Photo"),
+            description=photo.get("Description") if wants(fields, "description") else None,
+            thumbnail_url=thumbnail_url,
+            detail_url=self._build_detail_url(photo["Hash"]),
+            type="Photo" if wants(fields, "type") else None
+        )
+
+    async def search(self, query: str, limit: Optional[int] = None, offset: int = 0, fields: Optional[FrozenSet[str]] = None) -> List[SearchResult]:
         if not self.enabled: return []
         results = []
         try:
@@ -12,52 +38,67 @@ class PhotoPrismAdapter(DataSourceAdapter):
                 print("PhotoPrismAdapter: api_base_url is not set for the adapter.")
                 return results
 
-            async with httpx.AsyncClient() as client:
-                params = {
-                    "q": query,
-                    "count": 100,
-                    "offset": 0,
-                    "merged": True,
-                    "country": "",
-                    "camera": 0,
-                    "lens": 0,
-                    "label": "",
-                    "latlng": "",
-                    "year": 0,
-                    "month": 0,
-                    "color": "",
-                    "order": "newest",
-                    "public": True,
-                    "quality": 3
-                }
-                request_url = f"{self.api_base_url}/photos"
-                response = await client.get(
-                    request_url,
-                    params=params,
-                    timeout=10
-                )
-                response.raise_for_status()
-                data = response.json()
-                for photo in data:
-                    photo_hash = photo.get("Hash")
-                    if photo_hash:
-                        thumbnail_url = f"{self.web_base_url}/api/v1/t/{photo_hash}/public/tile_500"
-                    else:
-                        thumbnail_url = ""
-                        print(f"Warning: Photo {photo.get('UID')} has no 'Hash' for thumbnail generation.")
-
-                    results.append(SearchResult(
-                        id=photo["UID"],
-                        source="PhotoPrism",
-                        title=photo.get("Title") or photo.get("FileName", "Untitled Photo"),
-                        description=photo.get("Description"),
-                        thumbnail_url=thumbnail_url,
-                        detail_url=self._build_detail_url(photo["Hash"]),
-                        type="Photo"
-                    ))
+            params = {
+                "q": query,
+                "count": limit if limit is not None else 100,
+                "offset": offset,
+                "merged": True,
+                "country": "",
+                "camera": 0,
+                "lens": 0,
+                "label": "",
+                "latlng": "",
+                "year": 0,
+                "month": 0,
+                "color": "",
+                "order": "newest",
+                "public": True,
+                "quality": 3
+            }
+            request_url = f"{self.api_base_url}/photos"
+            response = await self.client.get(
+                request_url,
+                params=params,
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            data = response.json()
+            for photo in data:
+                results.append(self._to_result(photo, fields))
         except Exception as e:
             print(f"PhotoPrismAdapter error: {e}")
+            raise
         return results
 
+    async def fetch_catalog(self, since: Optional[datetime] = None) -> AsyncIterator[List[SearchResult]]:
+        # The photos API has no modified-since filter, so every sync pages through the whole library.
+        if not self.enabled or not self.api_base_url:
+            return
+        page_size = self.config.get("mirror_page_size", 500)
+        offset = 0
+        while True:
+            params = {
+                "count": page_size,
+                "offset": offset,
+                "merged": True,
+                "order": "added",
+                "public": True,
+                "quality": 3
+            }
+            response = await self.client.get(
+                f"{self.api_base_url}/photos",
+                params=params,
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            data = response.json()
+            yield [self._to_result(photo) for photo in data if photo.get("UID") and photo.get("Hash")]
+            offset += len(data)
+            if len(data) < page_size:
+                break
+
+    def _thumbnail_base(self) -> Optional[str]:
+        return self.web_base_url
+
     def _build_detail_url(self, item_id: str, item_type: Optional[str] = None, original_query: Optional[str] = None) -> str:
         return f"{self.web_base_url}/api/v1/dl/{item_id}"
\ No newline at end of file
@@ -0,0 +1,89 @@
+"""Compare Calibre-Web result-page parsing strategies.
+
+Pass captured pages (an HTML /search page and/or an OPDS /opds/search feed)
+or let the script synthesize ones shaped like Calibre-Web's templates:
+
+    python benchmarks/bench_calibre_parse.py --books 2000
+    python benchmarks/bench_calibre_parse.py --html search.html --opds search.xml
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup  # noqa: E402
+from adapters.calibreweb import parse_opds_feed, parse_search_html  # noqa: E402
+
+
+def synthetic_html(count: int) -> str:
+    books = "".join(
+        f'<div class="col-sm-3 col-lg-2 col-xs-6 book session"><div class="cover">'
+        f'<a href="/book/{i}"><span class="img"><img src="/cover/{i}/og?c=1748679572" alt="Book {i}"/></span></a></div>'
+        f'<div class="meta"><a href="/book/{i}"><p title="Book title {i}" class="title">Book title {i}</p></a>'
+        f'<p class="author"><a class="author-name" href="/author/{i % 50}">Author {i % 50}</a></p></div></div>'
+        for i in range(count)
+    )
+    nav = "".join(f'<li><a href="/category/{i}">Category {i}</a></li>' for i in range(300))
+    return (f'<html><head><title>Calibre-Web | search</title></head><body><ul class="nav">{nav}</ul>'
+            f'<div class="discover load-more"><h2>{count} Results</h2><div class="row display-flex">{books}</div></div>'
+            f'</body></html>')
+
+
+def synthetic_opds(count: int) -> bytes:
+    entries = "".join(
+        f'<entry><title>Book title {i}</title><id>urn:uuid:{i:032d}</id>'
+        f'<author><name>Author {i % 50}</name></author><summary>Summary of book {i}</summary>'
+        f'<link type="image/jpeg" href="/opds/cover/{i}" rel="http://opds-spec.org/image"/>'
+        f'<link rel="http://opds-spec.org/acquisition" href="/opds/download/{i}/epub/" type="application/epub+zip"/></entry>'
+        for i in range(count)
+    )
+    return (f'<?xml version="1.0" encoding="UTF-8"?><feed xmlns="http://www.w3.org/2005/Atom">'
+            f'<title>Calibre-Web</title>{entries}</feed>').encode()
+
+
+def legacy_parse(html: str) -> int:
+    # The previous implementation: full BeautifulSoup tree, then find() per field.
+    soup = BeautifulSoup(html, "html.parser")
+    count = 0
+    for book_div in soup.find('div', class_='discover').find_all('div', class_=['book', 'session']):
+        book_div.find('p', class_='title')
+        book_div.find('a', href=True)
+        book_div.find('img', src=True)
+        author_tag = book_div.find('p', class_='author')
+        if author_tag:
+            author_tag.find('a', class_='author-name')
+        count += 1
+    return count
+
+
+def timed(label, fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = fn()
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:>28}: {best * 1000:9.2f}ms  ({count} books)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--books", type=int, default=1000)
+    parser.add_argument("--html", help="captured Calibre-Web /search page")
+    parser.add_argument("--opds", help="captured Calibre-Web /opds/search feed")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    html = open(args.html, encoding="utf-8").read() if args.html else synthetic_html(args.books)
+    opds = open(args.opds, "rb").read() if args.opds else synthetic_opds(args.books)
+
+    timed("beautifulsoup tree", lambda: legacy_parse(html), args.repeat)
+    timed("streaming html", lambda: len(parse_search_html(html)), args.repeat)
+    timed("streaming html, limit 100", lambda: len(parse_search_html(html, 100)), args.repeat)
+    timed("opds iterparse", lambda: len(parse_opds_feed(opds)), args.repeat)
+    timed("opds iterparse, limit 100", lambda: len(parse_opds_feed(opds, 100)), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Memory and lookup cost of the filesystem metadata store.
+
+Compares FileStore against a plain dict of (mtime, size) tuples. The path
+strings are created up front and kept alive by the caller, as the name
+index does, so only the store's own allocations are counted.
+
+    python benchmarks/bench_filestore.py --files 300000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_name_index import synthetic_paths  # noqa: E402
+from indexing.filestore import FileStore  # noqa: E402
+from models.search_filters import SearchFilters  # noqa: E402
+
+
+def measured(build):
+    # Timed untraced; tracemalloc slows allocation-heavy code down severalfold.
+    start = time.perf_counter()
+    build()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    store = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return store, size, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=300_000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    rows = [(rel_path, rng.uniform(1.5e9, 1.8e9), rng.randrange(1 << 30))
+            for rel_path, _ in synthetic_paths(args.files)]
+    print(f"{len(rows):,} files")
+
+    baseline, size, elapsed = measured(lambda: {rel_path: (mtime, size) for rel_path, mtime, size in rows})
+    print(f"dict of tuples: {size / 2**20:7.1f} MB  built in {elapsed:.2f}s")
+    store, size, elapsed = measured(lambda: FileStore(rows))
+    print(f"FileStore:      {size / 2**20:7.1f} MB  built in {elapsed:.2f}s")
+
+    sample = [rel_path for rel_path, _, _ in rng.sample(rows, 100_000)]
+    start = time.perf_counter()
+    for rel_path in sample:
+        assert store.get(rel_path) == baseline[rel_path]
+    print(f"get: {(time.perf_counter() - start) / len(sample) * 1e6:.2f}us per lookup")
+    start = time.perf_counter()
+    selected = store.select(sample, SearchFilters(extensions=frozenset({"pdf"}), sort="size", descending=True))
+    print(f"select 100,000 candidates, pdf by size: {len(selected):,} kept in "
+          f"{(time.perf_counter() - start) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Latency of a fresh httpx.AsyncClient per request versus the pooled client.
+
+Runs a keep-alive HTTP/1.1 stand-in upstream on localhost:
+
+    python benchmarks/bench_http_pool.py --requests 500
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+from adapters.base import create_http_client  # noqa: E402
+
+BODY = b'{"Items": []}'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def report(label, samples):
+    print(f"{label:>12}: mean {statistics.mean(samples) * 1000:7.3f}ms  "
+          f"p50 {percentile(samples, 50) * 1000:7.3f}ms  p99 {percentile(samples, 99) * 1000:7.3f}ms")
+
+
+async def run(url, count):
+    fresh = []
+    for _ in range(count):
+        start = time.perf_counter()
+        async with httpx.AsyncClient() as client:
+            (await client.get(url)).raise_for_status()
+        fresh.append(time.perf_counter() - start)
+
+    pooled = []
+    client = create_http_client({})
+    try:
+        for _ in range(count):
+            start = time.perf_counter()
+            (await client.get(url)).raise_for_status()
+            pooled.append(time.perf_counter() - start)
+    finally:
+        await client.aclose()
+
+    report("fresh client", fresh)
+    report("pooled", pooled)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        asyncio.run(run(f"http://127.0.0.1:{server.server_port}/Items", args.requests))
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
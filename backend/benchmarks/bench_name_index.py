@@ -0,0 +1,75 @@
+"""Compare the trigram name index against the old linear basename scan.
+
+Two-character and single CJK-character queries (a typical Chinese word) are
+answered from bigram and per-character postings, in memory and from the
+shared index file alike.
+
+    python benchmarks/bench_name_index.py --files 2000000
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indexing.shared import SharedIndexPublisher, SharedIndexReader, serialize  # noqa: E402
+from indexing.trigram import TrigramIndex  # noqa: E402
+
+WORDS = ["holiday", "report", "invoice", "photo", "draft", "final", "scan", "backup",
+         "movie", "season", "episode", "notes", "budget", "family", "travel", "project",
+         "旅行", "照片", "报告", "合同", "电影", "音乐", "笔记", "备份"]
+EXTS = [".pdf", ".jpg", ".mp4", ".docx", ".txt", ".mkv", ".png", ".xlsx"]
+
+
+def synthetic_paths(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    for i in range(count):
+        parts = [rng.choice(WORDS) for _ in range(rng.randint(1, 3))]
+        suffix = "".join(rng.choices(string.ascii_lowercase + string.digits, k=4))
+        name = "_".join(parts) + f"_{suffix}{rng.choice(EXTS)}"
+        yield f"dir{i % 997}/sub{i % 31}/{name}", name
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    entries = list(synthetic_paths(args.files))
+    index = {rel: "/data/search_root/" + rel for rel, _ in entries}
+
+    start = time.perf_counter()
+    names = TrigramIndex(entries)
+    print(f"built trigram index over {len(names):,} names in {time.perf_counter() - start:.2f}s")
+
+    with tempfile.TemporaryDirectory() as shared_dir:
+        SharedIndexPublisher(shared_dir).publish(serialize(names.export()))
+        shared = SharedIndexReader(shared_dir)
+        shared.refresh()
+        for query in ["invoice_fin", "k3x9", "season_episode", "旅行_照片", "zzzq", "pdf",
+                      "旅行", "照片", "k3", "zq", "旅", "x"]:
+            scan_time, scan_hits = timed(
+                lambda: [rel for rel in index if query.lower() in os.path.basename(rel).lower()], 1)
+            index_time, index_hits = timed(lambda: names.search(query), args.repeat)
+            shared_time, shared_hits = timed(lambda: shared.search(query), args.repeat)
+            assert sorted(scan_hits) == sorted(index_hits) == sorted(shared_hits), query
+            print(f"{query!r:>18}: {len(index_hits):>8,} hits  scan {scan_time * 1000:9.2f}ms  "
+                  f"index {index_time * 1000:8.2f}ms  shared {shared_time * 1000:8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
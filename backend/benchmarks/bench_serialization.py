@@ -0,0 +1,95 @@
+"""Compare /search response serialization: the old pydantic path against the
+dataclass records with the fast encoder, as objects and as columns.
+
+    python benchmarks/bench_serialization.py --results 10000 50000 100000
+
+The old path is what FastAPI did with response_model=List[SearchResult] and
+pydantic results: build each model (validated), validate the list again for
+the response, dump it to JSON-able dicts and json.dumps them.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic import BaseModel, TypeAdapter  # noqa: E402
+from models.search_result import SearchResult  # noqa: E402
+from services import serialization  # noqa: E402
+
+
+class LegacySearchResult(BaseModel):
+    id: str
+    source: str
+    title: str
+    description: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+    detail_url: str
+    type: Optional[str] = None
+    size: Optional[int] = None
+    modified: Optional[float] = None
+
+
+LEGACY_LIST = TypeAdapter(List[LegacySearchResult])
+
+
+def synthetic_rows(count: int):
+    # Shaped like filesystem results for a broad query.
+    for i in range(count):
+        rel = f"dir{i % 997}/sub{i % 31}/holiday_photo_{i:06d}.jpg"
+        yield {"id": rel, "source": "filesystem", "title": os.path.basename(rel), "description": os.path.dirname(rel),
+               "thumbnail_url": None, "detail_url": f"http://localhost:8000/download/filesystem/{rel}", "type": "jpg",
+               "size": 1000 + i * 37, "modified": 1.7e9 + i}
+
+
+def legacy(rows) -> bytes:
+    results = [LegacySearchResult(**row) for row in rows]
+    content = LEGACY_LIST.dump_python(LEGACY_LIST.validate_python(results, from_attributes=True), mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def records(rows) -> bytes:
+    return serialization.dumps([SearchResult(**row) for row in rows])
+
+
+def columns(rows) -> bytes:
+    return serialization.dumps(serialization.to_columns([SearchResult(**row) for row in rows]))
+
+
+def timed(fn, repeat: int):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--results", type=int, nargs="+", default=[10_000, 50_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"encoder: {serialization.ENCODER}, brotli: {'yes' if serialization.brotli is not None else 'no'}")
+    for count in args.results:
+        rows = list(synthetic_rows(count))
+        print(f"{count:,} results")
+        baseline = None
+        for name, fn in [("pydantic + response_model", legacy), ("records", records), ("records, columns", columns)]:
+            elapsed, body = timed(lambda: fn(rows), args.repeat)
+            baseline = baseline or elapsed
+            gzip_time, gzipped = timed(lambda: serialization.compress(body, "gzip"), 1)
+            sizes = f"{len(body) / 1e6:6.2f} MB  gzip {len(gzipped) / 1e6:5.2f} MB ({gzip_time * 1000:5.0f}ms)"
+            if serialization.brotli is not None:
+                br_time, compressed = timed(lambda: serialization.compress(body, "br"), 1)
+                sizes += f"  br {len(compressed) / 1e6:5.2f} MB ({br_time * 1000:5.0f}ms)"
+            print(f"  {name:>26}: {elapsed * 1000:8.1f}ms  {count / elapsed / 1000:7.0f}k/s  "
+                  f"x{baseline / elapsed:4.1f}  {sizes}")
+
+
+if __name__ == "__main__":
+    main()
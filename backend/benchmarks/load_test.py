@@ -0,0 +1,179 @@
+"""Concurrent load test for /search, reporting throughput and p50/p95/p99.
+
+Against an already running backend:
+
+    python benchmarks/load_test.py --url http://localhost:8000 --concurrency 32 --requests 2000
+
+Self-contained: start the stub upstreams, generate (or reuse) a synthetic tree
+and launch the backend under uvicorn with everything pointed at them:
+
+    python benchmarks/load_test.py --spawn --files 1000000 --latency 80 --jitter 40 --failure-rate 0.02
+
+Per-source timings come from the Server-Timing header. With --max-p95 the
+script exits non-zero when the overall p95 is above the budget, so it can gate
+a deployment.
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx  # noqa: E402
+from bench_name_index import WORDS  # noqa: E402
+from make_tree import generate  # noqa: E402
+from stub_upstreams import add_arguments, backend_env, settings_from_args, start_stubs  # noqa: E402
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TIMING = re.compile(r'([\w-]+);dur=([\d.]+)(?:;desc="(\w+)")?')
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summary(samples) -> str:
+    if not samples:
+        return "no samples"
+    return (f"p50 {percentile(samples, 50):8.1f}ms  p95 {percentile(samples, 95):8.1f}ms  "
+            f"p99 {percentile(samples, 99):8.1f}ms  max {max(samples):8.1f}ms")
+
+
+async def run_load(url: str, queries, total: int, concurrency: int, limit: int, report: bool = True):
+    latencies = []
+    per_source = defaultdict(list)
+    statuses = Counter()
+    failures = Counter()
+    issued = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        async def worker():
+            nonlocal issued
+            while issued < total:
+                issued += 1
+                query = random.choice(queries)
+                start = time.perf_counter()
+                try:
+                    response = await client.get("/search", params={"query": query, "limit": limit})
+                except httpx.HTTPError as e:
+                    failures[type(e).__name__] += 1
+                    continue
+                latencies.append((time.perf_counter() - start) * 1000)
+                if response.status_code != 200:
+                    failures[f"HTTP {response.status_code}"] += 1
+                    continue
+                for name, dur, desc in TIMING.findall(response.headers.get("Server-Timing", "")):
+                    per_source[name].append(float(dur))
+                    if desc:
+                        statuses[f"{name}={desc}"] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    if not report:
+        return latencies
+    print(f"\n{len(latencies)} requests in {elapsed:.1f}s -> {len(latencies) / elapsed:.1f} req/s "
+          f"(concurrency {concurrency})")
+    print(f"{'/search':>16}: {summary(latencies)}")
+    for name in sorted(per_source):
+        print(f"{name:>16}: {summary(per_source[name])}")
+    if statuses:
+        print("source outcomes: " + ", ".join(f"{k} {v}" for k, v in sorted(statuses.items())))
+    if failures:
+        print("client failures: " + ", ".join(f"{k} {v}" for k, v in failures.items()))
+    return latencies
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def spawn_backend(args) -> (subprocess.Popen, str):
+    _, stub_url = start_stubs(settings_from_args(args))
+    tree = args.tree or os.path.join(tempfile.gettempdir(), f"anticlockwise_bench_{args.files}")
+    generate(tree, args.files)
+    port = free_port()
+    env = dict(os.environ, **backend_env(stub_url))
+    env.update({
+        "FILESYSTEM_SEARCH_PATH": tree,
+        "FILESYSTEM_INDEX_SNAPSHOT": "",
+        "THUMBNAIL_CACHE_DIR": os.path.join(tempfile.gettempdir(), "anticlockwise_bench_thumbnails"),
+        "BACKEND_BASE_URL": f"http://127.0.0.1:{port}",
+    })
+    if args.no_cache:
+        env["CACHE_MAX_ENTRIES"] = "0"
+    command = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+               "--workers", str(args.workers), "--log-level", "warning"]
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env)
+    url = f"http://127.0.0.1:{port}"
+    # The backend accepts requests at once but indexes in the background; measure only once it is ready.
+    deadline = time.monotonic() + 1800
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit("backend exited during startup")
+        try:
+            httpx.get(f"{url}/readyz", timeout=1).raise_for_status()
+            break
+        except httpx.HTTPError:
+            time.sleep(0.5)
+    else:
+        process.terminate()
+        raise SystemExit("backend did not become ready")
+    metrics = httpx.get(f"{url}/metrics").text
+    for line in metrics.splitlines():
+        if line.startswith(("anticlockwise_filesystem_index_build_seconds{", "anticlockwise_filesystem_index_files{")):
+            print(line)
+    return process, url
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--queries", nargs="*", help="defaults to words used in the synthetic tree")
+    parser.add_argument("--warmup", type=int, default=20, help="requests sent before measuring")
+    parser.add_argument("--max-p95", type=float, help="fail if the /search p95 exceeds this many ms")
+    parser.add_argument("--spawn", action="store_true", help="run stubs, a synthetic tree and the backend locally")
+    parser.add_argument("--files", type=int, default=10000, help="synthetic tree size with --spawn")
+    parser.add_argument("--tree", help="existing or cached synthetic tree directory with --spawn")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers with --spawn")
+    parser.add_argument("--no-cache", action="store_true", help="disable the result cache with --spawn")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    queries = args.queries or WORDS
+    process = None
+    url = args.url
+    if args.spawn:
+        process, url = spawn_backend(args)
+    try:
+        if args.warmup:
+            asyncio.run(run_load(url, queries, args.warmup, min(args.concurrency, args.warmup), args.limit, report=False))
+        latencies = asyncio.run(run_load(url, queries, args.requests, args.concurrency, args.limit))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    if args.max_p95 is not None and latencies and percentile(latencies, 95) > args.max_p95:
+        print(f"FAIL: p95 {percentile(latencies, 95):.1f}ms exceeds budget {args.max_p95:.1f}ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
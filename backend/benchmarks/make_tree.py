@@ -0,0 +1,59 @@
+"""Generate a synthetic directory tree for FileSystemAdapter benchmarks.
+
+Files are empty and named like bench_name_index.py's synthetic paths
+(~1000 top-level directories, 31 subdirectories each). 5M files need 5M
+free inodes, so prefer a tmpfs or a scratch filesystem:
+
+    python benchmarks/make_tree.py /tmp/bench_tree --files 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_name_index import synthetic_paths  # noqa: E402
+
+MARKER = ".bench_tree"
+
+
+def existing_count(root: str) -> int:
+    try:
+        with open(os.path.join(root, MARKER)) as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def generate(root: str, count: int, seed: int = 0) -> str:
+    """Create `count` files under `root`, reusing a tree generated earlier with the same size."""
+    if existing_count(root) == count:
+        return root
+    start = time.time()
+    made_dirs = set()
+    for i, (rel_path, _) in enumerate(synthetic_paths(count, seed)):
+        parent = os.path.dirname(rel_path)
+        if parent not in made_dirs:
+            os.makedirs(os.path.join(root, parent), exist_ok=True)
+            made_dirs.add(parent)
+        os.close(os.open(os.path.join(root, rel_path), os.O_CREAT | os.O_WRONLY, 0o644))
+        if i and i % 100000 == 0:
+            print(f"  {i} files ({time.time() - start:.0f}s)")
+    with open(os.path.join(root, MARKER), "w") as f:
+        f.write(str(count))
+    print(f"Generated {count} files in {len(made_dirs)} directories under {root} in {time.time() - start:.1f}s")
+    return root
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("root")
+    parser.add_argument("--files", type=int, default=10000, help="e.g. 10000, 1000000 or 5000000")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    generate(args.root, args.files, args.seed)
+
+
+if __name__ == "__main__":
+    main()
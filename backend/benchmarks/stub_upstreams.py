@@ -0,0 +1,207 @@
+"""Local stand-ins for Jellyfin, Audiobookshelf, PhotoPrism and Calibre-Web.
+
+One threaded HTTP server answers the endpoints each adapter calls, under a
+per-service path prefix, with configurable latency, payload size and failure
+rate. Run it on its own and paste the printed environment into the backend's:
+
+    python benchmarks/stub_upstreams.py --port 9000 --latency 50 --jitter 20 --failure-rate 0.01
+
+load_test.py --spawn starts it in-process.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import urllib.parse
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_calibre_parse import synthetic_html, synthetic_opds  # noqa: E402
+
+
+@dataclass
+class StubSettings:
+    latency: float = 0.05  # seconds added to every response
+    jitter: float = 0.0  # extra uniform random delay, seconds
+    items: int = 50  # upper bound on results per search, before the caller's limit
+    payload: int = 200  # characters of description per result
+    failure_rate: float = 0.0  # share of requests answered with 503
+    libraries: int = 3  # Audiobookshelf libraries listed, searched concurrently by the adapter
+    broken_libraries: int = 0  # of those, how many (the last ones) answer searches with 500
+    # Per-service overrides, e.g. {"jellyfin": 0.5} to make one source slow.
+    latency_overrides: Optional[Dict[str, float]] = None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    settings = StubSettings()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        self._dispatch("POST")
+
+    def _dispatch(self, method: str):
+        url = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        service, _, rest = url.path.lstrip("/").partition("/")
+        settings = self.settings
+        latency = (settings.latency_overrides or {}).get(service, settings.latency)
+        time.sleep(latency + random.uniform(0, settings.jitter))
+        if random.random() < settings.failure_rate:
+            return self._send(503, b"stub failure", "text/plain")
+        handler = getattr(self, f"_{service}", None)
+        if handler is None:
+            return self._send(404, b"not found", "text/plain")
+        handler(method, "/" + rest, params)
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: Tuple[Tuple[str, str], ...] = ()):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, data):
+        self._send(200, json.dumps(data).encode(), "application/json")
+
+    def _count(self, params: dict, key: str, default: int) -> int:
+        return max(0, min(self.settings.items, int(params.get(key, default))))
+
+    def _text(self, i: int) -> str:
+        return (f"Description {i} " * (self.settings.payload // 14 + 1))[:self.settings.payload]
+
+    def _jellyfin(self, method, path, params):
+        if not re.fullmatch(r"/Users/[^/]+/Items", path):
+            return self._send(404, b"", "text/plain")
+        query = params.get("searchTerm", "item")
+        start = int(params.get("StartIndex", 0))
+        count = self._count(params, "Limit", self.settings.items)
+        self._json({"Items": [{"Id": f"jf{start + i}", "Name": f"{query} movie {start + i}", "Type": "Movie",
+                               "Overview": self._text(i), "ImageTags": {"Primary": "tag"}}
+                              for i in range(count)],
+                    "TotalRecordCount": start + count})
+
+    def _photoprism(self, method, path, params):
+        if path != "/api/v1/photos":
+            return self._send(404, b"", "text/plain")
+        query = params.get("q", "photo")
+        offset = int(params.get("offset", 0))
+        count = self._count(params, "count", self.settings.items)
+        self._json([{"UID": f"pp{offset + i}", "Hash": f"{offset + i:040x}", "Title": f"{query} photo {offset + i}",
+                     "Description": self._text(i)} for i in range(count)])
+
+    def _abs(self, method, path, params):
+        if method == "POST" and path == "/login":
+            return self._json({"user": {"token": "bench-token"}, "userDefaultLibraryId": "lib1"})
+        libraries = self.settings.libraries
+        if path == "/api/libraries":
+            return self._json({"libraries": [{"id": f"lib{n}", "name": f"Library {n}"}
+                                             for n in range(1, libraries + 1)]})
+        match = re.fullmatch(r"/api/libraries/lib(\d+)/search", path)
+        if match and 1 <= int(match.group(1)) <= libraries:
+            n = int(match.group(1))
+            if n > libraries - self.settings.broken_libraries:
+                return self._send(500, b"library unavailable", "text/plain")
+            query = params.get("q", "book")
+            count = self._count(params, "limit", self.settings.items)
+            return self._json({"books": [
+                {"libraryItem": {"id": f"abs{n}-{i}", "media": {"metadata": {
+                    "title": f"{query} audiobook {n}-{i}", "author": f"Author {i % 20}",
+                    "description": self._text(i)}}}}
+                for i in range(count)]})
+        self._send(404, b"", "text/plain")
+
+    def _calibre(self, method, path, params):
+        if path.startswith("/opds/search/"):
+            return self._send(200, synthetic_opds(self.settings.items), "application/atom+xml")
+        if path == "/login":
+            if method == "POST":
+                return self._send(302, b"", "text/plain", (("Location", "/calibre/"),))
+            return self._send(200, b'<form><input name="csrf_token" value="bench"></form>', "text/html")
+        if path == "/":
+            return self._send(200, b"<html></html>", "text/html")
+        if path == "/search":
+            return self._send(200, synthetic_html(self.settings.items).encode(), "text/html")
+        self._send(404, b"", "text/plain")
+
+
+def start_stubs(settings: StubSettings, port: int = 0) -> Tuple[ThreadingHTTPServer, str]:
+    handler = type("StubHandler", (_Handler,), {"settings": settings})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def backend_env(base_url: str) -> Dict[str, str]:
+    """Environment that points every remote adapter at the stubs."""
+    return {
+        "JELLYFIN_API_BASE_URL": f"{base_url}/jellyfin",
+        "JELLYFIN_WEB_BASE_URL": f"{base_url}/jellyfin",
+        "JELLYFIN_API_KEY": "bench",
+        "JELLYFIN_USER_ID": "bench",
+        "PHOTOPRISM_API_BASE_URL": f"{base_url}/photoprism/api/v1",
+        "PHOTOPRISM_WEB_BASE_URL": f"{base_url}/photoprism",
+        "AUDIOBOOKSHELF_API_BASE_URL": f"{base_url}/abs/api",
+        "AUDIOBOOKSHELF_WEB_BASE_URL": f"{base_url}/abs",
+        "AUDIOBOOKSHELF_USERNAME": "bench",
+        "AUDIOBOOKSHELF_PASSWORD": "bench",
+        "CALIBREWEB_WEB_BASE_URL": f"{base_url}/calibre",
+        "CALIBREWEB_USERNAME": "bench",
+        "CALIBREWEB_PASSWORD": "bench",
+    }
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", type=float, default=50, help="ms added to every upstream response")
+    parser.add_argument("--jitter", type=float, default=0, help="extra random ms per response")
+    parser.add_argument("--items", type=int, default=50, help="max results per upstream search")
+    parser.add_argument("--payload", type=int, default=200, help="description length per result")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of upstream requests failing with 503")
+    parser.add_argument("--slow", action="append", default=[], metavar="SERVICE=MS",
+                        help="latency override for one of jellyfin, photoprism, abs, calibre")
+
+
+def settings_from_args(args) -> StubSettings:
+    overrides = {}
+    for spec in args.slow:
+        service, _, ms = spec.partition("=")
+        overrides[service] = float(ms) / 1000
+    return StubSettings(latency=args.latency / 1000, jitter=args.jitter / 1000, items=args.items,
+                        payload=args.payload, failure_rate=args.failure_rate, latency_overrides=overrides)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=9000)
+    add_arguments(parser)
+    args = parser.parse_args()
+    server, base_url = start_stubs(settings_from_args(args), args.port)
+    for name, value in backend_env(base_url).items():
+        print(f"{name}={value}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,176 @@
 import os
+import re
 from dotenv import load_dotenv
 
 load_dotenv()
 
-DATA_SOURCE_CONFIGS = {
-    "jellyfin": {
+BACKEND_BASE_URL = os.getenv("BACKEND_BASE_URL", "http://localhost:8000")
+
+# 缩略图代理：缩略图经后端 /thumbnail 转发并缓存到磁盘（按内容寻址，LRU 淘汰），Calibre-Web 封面只能通过代理显示
+# 默认关闭：开启后缩略图地址指向 BACKEND_BASE_URL，需先把它设为浏览器能访问的地址
+THUMBNAIL_PROXY = os.getenv("THUMBNAIL_PROXY", "false").lower() in ("1", "true", "yes")
+THUMBNAIL_SETTINGS = {
+    "cache_dir": os.getenv("THUMBNAIL_CACHE_DIR", "/data/index/thumbnails"),
+    "max_bytes": int(float(os.getenv("THUMBNAIL_CACHE_MAX_MB", "512")) * 1024 * 1024),
+    "ttl": float(os.getenv("THUMBNAIL_CACHE_TTL", "604800")),
+    "max_size": int(os.getenv("THUMBNAIL_MAX_SIZE", "0")),  # 大于 0 时按该边长缩小（需要 Pillow）
+    "max_age": int(os.getenv("THUMBNAIL_BROWSER_MAX_AGE", "86400")),
+}
+
+def _http_options(prefix: str) -> dict:
+    # 每个数据源可单独覆盖连接池参数，例如 JELLYFIN_HTTP_MAX_CONNECTIONS，否则使用全局 HTTP_* 设置
+    def get(name, default):
+        return os.getenv(f"{prefix}_{name}", os.getenv(name, default))
+    return {
+        "http_max_connections": int(get("HTTP_MAX_CONNECTIONS", "20")),
+        "http_max_keepalive": int(get("HTTP_MAX_KEEPALIVE", "10")),
+        "http_keepalive_expiry": float(get("HTTP_KEEPALIVE_EXPIRY", "30")),
+        "http2": get("HTTP2", "false").lower() in ("1", "true", "yes"),
+        "backend_base_url": BACKEND_BASE_URL,
+        "thumbnail_proxy": THUMBNAIL_PROXY,
+    }
+
+def _cache_options(prefix: str, default_ttl: str) -> dict:
+    # 结果缓存：TTL 内直接返回；过期后 STALE_TTL 内先返回旧结果并在后台刷新
+    return {
+        "cache_max_entries": int(os.getenv("CACHE_MAX_ENTRIES", "256")),
+        "cache_ttl": float(os.getenv(f"{prefix}_CACHE_TTL", default_ttl)),
+        "cache_stale_ttl": float(os.getenv(f"{prefix}_CACHE_STALE_TTL", os.getenv("CACHE_STALE_TTL", "300"))),
+    }
+
+def _resilience_options(prefix: str) -> dict:
+    # 单个数据源的时间预算，以及熔断：连续失败若干次后跳过该数据源，并在后台探测恢复
+    return {
+        "timeout": float(os.getenv(f"{prefix}_TIMEOUT", os.getenv("SOURCE_TIMEOUT", "8"))),
+        "breaker_failure_threshold": int(os.getenv("BREAKER_FAILURE_THRESHOLD", "3")),
+        "breaker_reset_timeout": float(os.getenv("BREAKER_RESET_TIMEOUT", "30")),
+        # 跨数据源排序时该数据源得分的权重
+        "rank_weight": float(os.getenv(f"{prefix}_RANK_WEIGHT", "1.0")),
+    }
+
+def _mirror_options(prefix: str) -> dict:
+    # 本地镜像：后台定期把远程数据源的元数据同步到本地索引，镜像新鲜时搜索不再访问上游
+    def get(name, default):
+        return os.getenv(f"{prefix}_{name}", os.getenv(name, default))
+    return {
+        "mirror_enabled": get("MIRROR_ENABLED", "false").lower() in ("1", "true", "yes"),
+        "mirror_interval": float(get("MIRROR_INTERVAL", "900")),
+        "mirror_max_age": float(get("MIRROR_MAX_AGE", "3600")),
+        "mirror_full_sync_interval": float(get("MIRROR_FULL_SYNC_INTERVAL", "86400")),
+    }
+
+# 整个搜索请求的总时限（秒），超时的数据源在响应头 X-Search-Sources 中标记为 timeout
+SEARCH_DEADLINE = float(os.getenv("SEARCH_DEADLINE", "10"))
+# 在 /search 响应中附带 Server-Timing 头（各数据源及排序耗时），浏览器开发者工具可直接查看
+SERVER_TIMING = os.getenv("SERVER_TIMING", "true").lower() in ("1", "true", "yes")
+# /suggest 输入联想：本地文件名加上最近远程结果中出现过的标题
+SUGGEST_SETTINGS = {
+    "recent_titles": int(os.getenv("SUGGEST_RECENT_TITLES", "5000")),  # 记住多少个远程标题
+}
+
+# 上游并发上限：所有数据源合计、以及每个主机（同一台 NAS 上的多个数据源共用），0 表示不限制
+UPSTREAM_CONCURRENCY = int(os.getenv("UPSTREAM_CONCURRENCY", "32"))
+UPSTREAM_HOST_CONCURRENCY = int(os.getenv("UPSTREAM_HOST_CONCURRENCY", "8"))
+
+def _jellyfin_config(prefix: str) -> dict:
+    return {
+        "type": "jellyfin",
         "enabled": True,
-        "api_base_url": os.getenv("JELLYFIN_API_BASE_URL", "http://your-jellyfin-ip:8096"),
-        "web_base_url": os.getenv("JELLYFIN_WEB_BASE_URL", "http://your-jellyfin-ip"),
-        "api_key": os.getenv("JELLYFIN_API_KEY", ""),
-        "user_id": os.getenv("JELLYFIN_USER_ID", "")
-    },
-    "photoprism": {
+        "api_base_url": os.getenv(f"{prefix}_API_BASE_URL", "http://your-jellyfin-ip:8096"),
+        "web_base_url": os.getenv(f"{prefix}_WEB_BASE_URL", "http://your-jellyfin-ip"),
+        "api_key": os.getenv(f"{prefix}_API_KEY", ""),
+        "user_id": os.getenv(f"{prefix}_USER_ID", ""),
+        **_http_options(prefix),
+        **_cache_options(prefix, "60"),
+        **_resilience_options(prefix),
+        **_mirror_options(prefix)
+    }
+
+def _photoprism_config(prefix: str) -> dict:
+    return {
+        "type": "photoprism",
         "enabled": True,
-        "api_base_url": os.getenv("PHOTOPRISM_API_BASE_URL", "http://your-photoprism-ip:2342/api/v1"),
-        "web_base_url": os.getenv("PHOTOPRISM_WEB_BASE_URL", "http://your-photoprism-ip:2342"),
-        "api_key": os.getenv("PHOTOPRISM_API_KEY", "")
-    },
-    "audiobookshelf": {
+        "api_base_url": os.getenv(f"{prefix}_API_BASE_URL", "http://your-photoprism-ip:2342/api/v1"),
+        "web_base_url": os.getenv(f"{prefix}_WEB_BASE_URL", "http://your-photoprism-ip:2342"),
+        "api_key": os.getenv(f"{prefix}_API_KEY", ""),
+        **_http_options(prefix),
+        **_cache_options(prefix, "60"),
+        **_resilience_options(prefix),
+        **_mirror_options(prefix)
+    }
+
+def _audiobookshelf_config(prefix: str) -> dict:
+    return {
+        "type": "audiobookshelf",
         "enabled": True,
-        "api_base_url": os.getenv("AUDIOBOOKSHELF_API_BASE_URL", "http://your-audiobookshelf-ip:80/api"),
-        "web_base_url": os.getenv("AUDIOBOOKSHELF_WEB_BASE_URL", "http://your-audiobookshelf-ip"),
-        "username": os.getenv("AUDIOBOOKSHELF_USERNAME", ""),
-        "password": os.getenv("AUDIOBOOKSHELF_PASSWORD", "")
-    },
-    "calibreweb": {
+        "api_base_url": os.getenv(f"{prefix}_API_BASE_URL", "http://your-audiobookshelf-ip:80/api"),
+        "web_base_url": os.getenv(f"{prefix}_WEB_BASE_URL", "http://your-audiobookshelf-ip"),
+        "username": os.getenv(f"{prefix}_USERNAME", ""),
+        "password": os.getenv(f"{prefix}_PASSWORD", ""),
+        # 搜索哪些库：all 为全部（并发搜索），default 为用户默认库，或逗号分隔的库 ID / 库名
+        "libraries": os.getenv(f"{prefix}_LIBRARIES", "all"),
+        **_http_options(prefix),
+        **_cache_options(prefix, "300"),
+        **_resilience_options(prefix),
+        **_mirror_options(prefix)
+    }
+
+def _calibreweb_config(prefix: str) -> dict:
+    return {
+        "type": "calibreweb",
         "enabled": True,
-        "api_base_url": os.getenv("CALIBREWEB_API_BASE_URL", "http://your-calibreweb-ip:8083/api"),
-        "web_base_url": os.getenv("CALIBREWEB_WEB_BASE_URL", "http://your-calibreweb-ip:8083"),
-        "username": os.getenv("CALIBREWEB_USERNAME", ""),
-        "password": os.getenv("CALIBREWEB_PASSWORD", "")
-    },
+        "api_base_url": os.getenv(f"{prefix}_API_BASE_URL", "http://your-calibreweb-ip:8083/api"),
+        "web_base_url": os.getenv(f"{prefix}_WEB_BASE_URL", "http://your-calibreweb-ip:8083"),
+        "username": os.getenv(f"{prefix}_USERNAME", ""),
+        "password": os.getenv(f"{prefix}_PASSWORD", ""),
+        # auto：优先使用 OPDS 订阅源（XML，解析更快），不可用时回退到网页抓取；也可固定为 opds 或 html
+        "search_mode": os.getenv(f"{prefix}_SEARCH_MODE", "auto"),
+        **_http_options(prefix),
+        **_cache_options(prefix, "300"),
+        **_resilience_options(prefix)
+    }
+
+def _instances(kind: str, prefix: str, build) -> dict:
+    # 同类数据源多个实例：JELLYFIN_INSTANCES="home,office" 时分别读取 JELLYFIN_HOME_*、JELLYFIN_OFFICE_* 配置，
+    # 结果的 source 标记为 Jellyfin:home、Jellyfin:office；未设置时只有一个实例，读取 JELLYFIN_*
+    names = [name.strip() for name in os.getenv(f"{prefix}_INSTANCES", "").split(",") if name.strip()]
+    if not names:
+        return {kind: build(prefix)}
+    return {f"{kind}:{name}": dict(build(f"{prefix}_{re.sub(r'[^A-Za-z0-9]', '_', name).upper()}"), instance=name)
+            for name in names}
+
+DATA_SOURCE_CONFIGS = {
+    **_instances("jellyfin", "JELLYFIN", _jellyfin_config),
+    **_instances("photoprism", "PHOTOPRISM", _photoprism_config),
+    **_instances("audiobookshelf", "AUDIOBOOKSHELF", _audiobookshelf_config),
+    **_instances("calibreweb", "CALIBREWEB", _calibreweb_config),
     "filesystem": {
+        "type": "filesystem",
         "enabled": True,
         "search_path": os.getenv("FILESYSTEM_SEARCH_PATH", "/data/search_root"),
-        "backend_base_url": os.getenv("BACKEND_BASE_URL", "http://localhost:8000")
+        "backend_base_url": BACKEND_BASE_URL,
+        # 下载方式：direct 由后端直接发送；x-accel 只校验路径，再通过 X-Accel-Redirect 交给 nginx 发送
+        "download_mode": os.getenv("FILESYSTEM_DOWNLOAD_MODE", "direct"),
+        "x_accel_prefix": os.getenv("FILESYSTEM_X_ACCEL_PREFIX", "/protected-files/"),
+        # 索引快照：启动时直接加载，再在后台按目录 mtime 对账；留空则每次启动全量扫描
+        "index_snapshot_path": os.getenv("FILESYSTEM_INDEX_SNAPSHOT", "/data/index/filesystem.db"),
+        "index_snapshot_interval": int(os.getenv("FILESYSTEM_INDEX_SNAPSHOT_INTERVAL", "300")),
+        # 索引模式：local 每个进程各自建索引；shared 用于 uvicorn --workers N，只有一个进程扫描和监听目录，
+        # 把只读索引发布到 shared_index_dir，其余进程通过 mmap 共享读取（该目录最好在 tmpfs 上，例如 /dev/shm）
+        "index_mode": os.getenv("FILESYSTEM_INDEX_MODE", "local"),
+        "shared_index_dir": os.getenv("FILESYSTEM_SHARED_INDEX_DIR", "/data/index/shared"),
+        "shared_publish_interval": float(os.getenv("FILESYSTEM_SHARED_PUBLISH_INTERVAL", "2")),
+        # 文件变更事件合并：目录安静 watch_debounce 秒后（最多等 watch_max_delay 秒）批量更新索引
+        "watch_debounce": float(os.getenv("FILESYSTEM_WATCH_DEBOUNCE", "0.5")),
+        "watch_max_delay": float(os.getenv("FILESYSTEM_WATCH_MAX_DELAY", "5")),
+        # 全文索引（可选）：提取文本/EPUB/PDF（需安装 pypdf）内容写入 SQLite FTS5，后台进程池提取
+        "content_index_enabled": os.getenv("FILESYSTEM_CONTENT_INDEX", "false").lower() in ("1", "true", "yes"),
+        "content_index_path": os.getenv("FILESYSTEM_CONTENT_INDEX_PATH", "/data/index/content.db"),
+        "content_index_workers": int(os.getenv("FILESYSTEM_CONTENT_INDEX_WORKERS", "2")),
+        "content_max_file_bytes": int(os.getenv("FILESYSTEM_CONTENT_MAX_FILE_MB", "50")) * 1024 * 1024,
+        # 文件系统结果由 watchdog 事件失效，不按 TTL 过期
+        "cache_max_entries": int(os.getenv("CACHE_MAX_ENTRIES", "256")),
+        "cache_ttl": None,
+        **_resilience_options("FILESYSTEM")
     }
 }
\ No newline at end of file
@@ -0,0 +1,361 @@
+import codecs
+import importlib.util
+import multiprocessing
+import os
+import posixpath
+import queue
+import sqlite3
+import threading
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from html.parser import HTMLParser
+from typing import Dict, Iterable, List, Optional, Tuple
+
+SCHEMA_VERSION = "2"  # 2: paths stored as bytes
+
+TEXT_EXTENSIONS = frozenset({
+    ".txt", ".md", ".markdown", ".rst", ".csv", ".log", ".json", ".xml", ".yaml", ".yml",
+    ".ini", ".srt", ".ass", ".vtt", ".lrc", ".html", ".htm", ".nfo",
+})
+# PDF support needs 'pypdf', a backend dependency; without it PDFs are skipped.
+HAS_PDF = importlib.util.find_spec("pypdf") is not None
+SUPPORTED_EXTENSIONS = TEXT_EXTENSIONS | {".epub"} | ({".pdf"} if HAS_PDF else frozenset())
+
+# FTS5's trigram tokenizer (SQLite 3.34+) matches any substring, CJK included.
+# Older SQLite falls back to unicode61, which matches whole words and word
+# prefixes only; the tokenizer in use is recorded in the database.
+TOKENIZER = "trigram" if sqlite3.sqlite_version_info >= (3, 34, 0) else "unicode61"
+# Queries too short for a trigram scan the stored text; this bounds how long.
+SHORT_QUERY_SCAN_SECONDS = 1.0
+
+# Files are sent to the pool in small waves so a bulk ingest never queues
+# thousands of futures and drops stay ordered after the puts before them.
+_WAVE = 32
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("script", "style", "head"):
+            self._skip += 1
+
+    def handle_endtag(self, tag):
+        if tag in ("script", "style", "head") and self._skip:
+            self._skip -= 1
+
+    def handle_data(self, data):
+        if not self._skip and not data.isspace():
+            self.parts.append(data.strip())
+
+
+def _strip_html(markup: str) -> str:
+    parser = _TextExtractor()
+    parser.feed(markup)
+    parser.close()
+    return "\n".join(parser.parts)
+
+
+def _decode(raw: bytes) -> str:
+    # `raw` may be cut mid-character at the read limit; the incremental
+    # decoder drops an incomplete tail instead of failing on it.
+    for encoding in ("utf-8-sig", "gb18030"):
+        try:
+            return codecs.getincrementaldecoder(encoding)().decode(raw, final=False)
+        except UnicodeDecodeError:
+            continue
+    return raw.decode("utf-8", errors="replace")
+
+
+def _read_text(abs_path: str, max_chars: int) -> str:
+    with open(abs_path, "rb") as f:
+        text = _decode(f.read(max_chars * 4))
+    if abs_path.lower().endswith((".html", ".htm")):
+        text = _strip_html(text)
+    return text
+
+
+def _read_pdf(abs_path: str, max_chars: int) -> str:
+    from pypdf import PdfReader
+
+    parts, total = [], 0
+    for page in PdfReader(abs_path).pages:
+        text = page.extract_text() or ""
+        parts.append(text)
+        total += len(text)
+        if total >= max_chars:
+            break
+    return "\n".join(parts)
+
+
+def _read_epub(abs_path: str, max_chars: int) -> str:
+    with zipfile.ZipFile(abs_path) as book:
+        documents = []
+        try:
+            container = ET.fromstring(book.read("META-INF/container.xml"))
+            rootfile = container.find(".//{urn:oasis:names:tc:opendocument:xmlns:container}rootfile")
+            opf_path = rootfile.get("full-path")
+            opf = ET.fromstring(book.read(opf_path))
+            ns = {"opf": "http://www.idpf.org/2007/opf"}
+            manifest = {item.get("id"): item.get("href") for item in opf.iterfind(".//opf:manifest/opf:item", ns)}
+            base = posixpath.dirname(opf_path)
+            for itemref in opf.iterfind(".//opf:spine/opf:itemref", ns):
+                href = manifest.get(itemref.get("idref"))
+                if href:
+                    documents.append(posixpath.normpath(posixpath.join(base, href)))
+        except (KeyError, AttributeError, ET.ParseError):
+            # No usable package document: fall back to every XHTML file in archive order.
+            documents = [name for name in book.namelist() if name.lower().endswith((".xhtml", ".html", ".htm"))]
+
+        parts, total = [], 0
+        for name in documents:
+            try:
+                text = _strip_html(_decode(book.read(name)))
+            except KeyError:
+                continue
+            parts.append(text)
+            total += len(text)
+            if total >= max_chars:
+                break
+    return "\n".join(parts)
+
+
+def extract_text(abs_path: str, max_chars: int) -> Optional[str]:
+    """Extract up to `max_chars` characters of plain text, or None on failure.
+
+    Runs in a worker process, so it must stay a module-level function.
+    """
+    ext = os.path.splitext(abs_path)[1].lower()
+    try:
+        if ext == ".pdf":
+            text = _read_pdf(abs_path, max_chars)
+        elif ext == ".epub":
+            text = _read_epub(abs_path, max_chars)
+        else:
+            text = _read_text(abs_path, max_chars)
+    except Exception as e:
+        print(f"ContentIndex: cannot extract text from {abs_path}: {e}")
+        return None
+    return text[:max_chars]
+
+
+def _path_key(rel_path: str) -> bytes:
+    # Paths are stored as bytes: undecodable bytes in file names come back
+    # from os.scandir as surrogates, which SQLite cannot bind as text.
+    return rel_path.encode("utf-8", "surrogateescape")
+
+
+def _path_str(key: bytes) -> str:
+    return key.decode("utf-8", "surrogateescape")
+
+
+def _fts_query(query: str, prefix: bool = False) -> str:
+    # Treat the whole query as one phrase so FTS5 operators in user input are inert.
+    return '"' + query.replace('"', '""') + '"' + (" *" if prefix else "")
+
+
+def _like_pattern(query: str) -> str:
+    return "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+class ContentIndex:
+    """Opt-in full-text index over file contents, stored in SQLite FTS5.
+
+    `docs` keeps the (mtime, size) fingerprint of every file considered, even
+    ones whose extraction failed, so unchanged files are never re-extracted.
+    The FTS table uses the trigram tokenizer where SQLite has it, which
+    matches substrings and therefore works for CJK text without word
+    segmentation; see TOKENIZER.
+
+    A single indexer thread owns the write connection and feeds a process
+    pool; searches open their own read connections, and WAL mode keeps them
+    from ever waiting on an in-progress write.
+    """
+
+    def __init__(self, path: str, root_path: str, workers: int = 2,
+                 max_file_bytes: int = 50 * 1024 * 1024, max_chars: int = 1_000_000, readonly: bool = False):
+        self.path = path
+        self.root_path = root_path
+        self.workers = workers
+        self.max_file_bytes = max_file_bytes
+        self.max_chars = max_chars
+        self._queue: "queue.Queue[Tuple[List[Tuple[str, float, int]], List[str]]]" = queue.Queue()
+        self._local = threading.local()
+        self._fingerprints: Dict[str, Tuple[float, int]] = {}
+        self.tokenizer: Optional[str] = None  # read from the database by read-only instances
+        # Read-only instances only search a database another process maintains.
+        self.readonly = readonly
+        if not readonly:
+            self._init_db()
+
+    def count(self) -> int:
+        """Files in the index, including ones whose text could not be extracted."""
+        if not self.readonly:
+            return len(self._fingerprints)
+        # The writer is another process, so its fingerprints are not in this one.
+        try:
+            return self._reader().execute("SELECT count(*) FROM docs").fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+    @staticmethod
+    def supports(rel_path: str) -> bool:
+        return os.path.splitext(rel_path)[1].lower() in SUPPORTED_EXTENSIONS
+
+    def _init_db(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID")
+            meta = dict(conn.execute("SELECT key, value FROM meta"))
+            # Databases from before the tokenizer was recorded always used trigram.
+            if meta and (meta.get("version") != SCHEMA_VERSION or meta.get("root_path") != self.root_path
+                         or meta.get("tokenizer", "trigram") != TOKENIZER):
+                conn.execute("DROP TABLE IF EXISTS docs")
+                conn.execute("DROP TABLE IF EXISTS content")
+            if TOKENIZER != "trigram":
+                print(f"ContentIndex: SQLite {sqlite3.sqlite_version} has no FTS5 trigram tokenizer (needs 3.34+); "
+                      f"content search falls back to whole words and word prefixes")
+            conn.execute("CREATE TABLE IF NOT EXISTS docs (id INTEGER PRIMARY KEY, path BLOB UNIQUE, mtime REAL, size INTEGER)")
+            conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS content USING fts5(body, tokenize='{TOKENIZER}')")
+            conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                             [("version", SCHEMA_VERSION), ("root_path", self.root_path), ("tokenizer", TOKENIZER)])
+            self.tokenizer = TOKENIZER
+            conn.commit()
+            self._fingerprints = {_path_str(path): (mtime, size) for path, mtime, size in conn.execute("SELECT path, mtime, size FROM docs")}
+        finally:
+            conn.close()
+
+    def start(self, files: Dict[str, Tuple[float, int]]):
+        """Start the indexer thread and queue everything that changed since the last run."""
+        puts = [(rel_path, mtime, size) for rel_path, (mtime, size) in files.items()]
+        drops = [rel_path for rel_path in self._fingerprints if rel_path not in files]
+        self._queue.put((puts, drops))
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, puts: Iterable[Tuple[str, float, int]], drops: Iterable[str]):
+        puts = [p for p in puts if self.supports(p[0])]
+        drops = [d for d in drops if self.supports(d)]
+        if puts or drops:
+            self._queue.put((puts, drops))
+
+    def _run(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        pool = self._new_pool()
+        try:
+            while True:
+                puts, drops = self._queue.get()
+                try:
+                    self._apply(conn, pool, puts, drops)
+                except BrokenProcessPool:
+                    # A worker died (e.g. a malformed PDF exhausted memory); start a fresh pool.
+                    print(f"ContentIndex: extraction worker crashed, skipping a batch of {len(puts)} files")
+                    pool.shutdown(cancel_futures=True)
+                    pool = self._new_pool()
+                except Exception as e:
+                    print(f"ContentIndex: failed to index a batch of {len(puts)} files: {e}")
+        finally:
+            pool.shutdown(cancel_futures=True)
+            conn.close()
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        # spawn, not fork: the parent is multi-threaded (watchdog, uvicorn).
+        return ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def _apply(self, conn: sqlite3.Connection, pool: ProcessPoolExecutor,
+               puts: List[Tuple[str, float, int]], drops: List[str]):
+        start = time.time()
+        if drops:
+            with conn:
+                for rel_path in drops:
+                    self._delete(conn, rel_path)
+        pending = [(rel_path, mtime, size) for rel_path, mtime, size in puts
+                   if self.supports(rel_path) and self._fingerprints.get(rel_path) != (mtime, size)]
+        for i in range(0, len(pending), _WAVE):
+            submitted = []
+            for rel_path, mtime, size in pending[i:i + _WAVE]:
+                # Oversized files are fingerprinted without text so they are not retried.
+                future = None if size > self.max_file_bytes else pool.submit(
+                    extract_text, os.path.join(self.root_path, rel_path), self.max_chars)
+                submitted.append(((rel_path, mtime, size), future))
+            rows = [(entry, future.result() if future is not None else None) for entry, future in submitted]
+            with conn:
+                for (rel_path, mtime, size), text in rows:
+                    self._write(conn, rel_path, mtime, size, text)
+        if pending:
+            print(f"ContentIndex: indexed {len(pending)} files in {time.time() - start:.1f}s")
+
+    def _delete(self, conn: sqlite3.Connection, rel_path: str):
+        row = conn.execute("SELECT id FROM docs WHERE path = ?", (_path_key(rel_path),)).fetchone()
+        if row:
+            conn.execute("DELETE FROM content WHERE rowid = ?", row)
+            conn.execute("DELETE FROM docs WHERE id = ?", row)
+        self._fingerprints.pop(rel_path, None)
+
+    def _write(self, conn: sqlite3.Connection, rel_path: str, mtime: float, size: int, text: Optional[str]):
+        self._delete(conn, rel_path)
+        cursor = conn.execute("INSERT INTO docs (path, mtime, size) VALUES (?, ?, ?)", (_path_key(rel_path), mtime, size))
+        if text:
+            conn.execute("INSERT INTO content (rowid, body) VALUES (?, ?)", (cursor.lastrowid, text))
+        self._fingerprints[rel_path] = (mtime, size)
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            self._local.conn = conn
+        return conn
+
+    def search(self, query: str, limit: int) -> List[Tuple[str, str]]:
+        """Return up to `limit` (rel_path, snippet) pairs, best match first."""
+        query = query.strip()
+        if not query:
+            return []
+        try:
+            conn = self._reader()
+            if self.tokenizer is None:
+                row = conn.execute("SELECT value FROM meta WHERE key = 'tokenizer'").fetchone()
+                self.tokenizer = row[0] if row else "trigram"
+            if self.tokenizer == "trigram" and len(query) < 3:
+                return self._scan(conn, query, limit)
+            # Without trigrams, the query's last word may be the start of a longer one.
+            rows = conn.execute(
+                "SELECT docs.path, snippet(content, 0, '', '', '…', 32) FROM content "
+                "JOIN docs ON docs.id = content.rowid WHERE content MATCH ? ORDER BY rank LIMIT ?",
+                (_fts_query(query, prefix=self.tokenizer != "trigram"), limit),
+            )
+            return [(_path_str(path), snippet) for path, snippet in rows]
+        except sqlite3.Error as e:
+            print(f"ContentIndex: search failed: {e}")
+            return []
+
+    def _scan(self, conn: sqlite3.Connection, query: str, limit: int) -> List[Tuple[str, str]]:
+        # Trigrams cannot match fewer than three characters, so short queries
+        # scan the stored text in rowid order, for at most SHORT_QUERY_SCAN_SECONDS.
+        deadline = time.monotonic() + SHORT_QUERY_SCAN_SECONDS
+        conn.set_progress_handler(lambda: time.monotonic() > deadline, 10000)
+        rows = []
+        try:
+            cursor = conn.execute(
+                "SELECT docs.path, substr(content.body, max(instr(lower(content.body), ?) - 40, 1), 100) FROM content "
+                "JOIN docs ON docs.id = content.rowid WHERE content.body LIKE ? ESCAPE '\\' LIMIT ?",
+                (query.lower(), _like_pattern(query), limit),
+            )
+            for path, passage in cursor:
+                rows.append((_path_str(path), "…" + passage.replace("\n", " ") + "…"))
+        except sqlite3.OperationalError as e:
+            if "interrupted" not in str(e):
+                raise
+        finally:
+            conn.set_progress_handler(None, 0)
+        return rows
@@ -0,0 +1,255 @@
+import os
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from models.search_filters import SearchFilters
+
+_DEAD = 0xFFFFFFFF  # directory id of a removed row
+_EMPTY, _DELETED = -1, -2  # lookup slots that hold no row
+
+
+def extension(name: str) -> str:
+    return os.path.splitext(name)[1][1:].lower()
+
+
+def _encode(name: str) -> bytes:
+    # Undecodable bytes in file names come back from os.scandir as surrogates.
+    return name.encode("utf-8", "surrogateescape")
+
+
+def select_rows(rows: List[int], sizes: Sequence[int], mtimes: Sequence[float], ext_col: Sequence[int],
+                ext_ids: Optional[List[int]], filters: SearchFilters) -> List[int]:
+    """Keep the rows that pass `filters`, ordered by size or mtime when asked.
+
+    The columns are any buffers indexed by row (typed arrays, or memoryviews
+    of a shared index file); filters and sorts run as NumPy operations on
+    zero-copy views of them. Name ordering is left to the caller.
+    """
+    # The views only live for this call, so the arrays can still grow afterwards.
+    rows = np.fromiter(rows, dtype=np.int64, count=len(rows))
+    sizes = np.frombuffer(sizes, dtype=np.int64)[rows]
+    mtimes = np.frombuffer(mtimes, dtype=np.float64)[rows]
+    keep = np.ones(len(rows), dtype=bool)
+    if ext_ids is not None:
+        keep &= np.isin(np.frombuffer(ext_col, dtype=np.uint32)[rows], ext_ids)
+    if filters.min_size is not None:
+        keep &= sizes >= filters.min_size
+    if filters.modified_after is not None:
+        keep &= mtimes > filters.modified_after
+    rows, sizes, mtimes = rows[keep], sizes[keep], mtimes[keep]
+    if filters.sort in ("size", "modified"):
+        column = sizes if filters.sort == "size" else mtimes
+        order = np.argsort(-column if filters.descending else column, kind="stable")
+        rows = rows[order]
+    return rows.tolist()
+
+
+def sort_by_name(rel_paths: List[str], descending: bool) -> List[str]:
+    return sorted(rel_paths, key=lambda rel_path: os.path.basename(rel_path).lower(), reverse=descending)
+
+
+class FileStore:
+    """Per-file metadata for the filesystem index, one row per file.
+
+    Sizes, mtimes, extension ids and directory ids live in parallel typed
+    arrays instead of a tuple per file. They are stdlib arrays rather than
+    NumPy arrays because they grow one file at a time (NumPy would reallocate
+    on every append); NumPy works on zero-copy views of them. directories and extensions are
+    interned in small tables, and basenames are UTF-8 in one shared blob.
+    A path is found through an open-addressing table of row numbers keyed
+    by (directory id, basename), so no per-file Python object is kept.
+    Removed rows are tombstoned and compacted like TrigramIndex ids. Callers
+    serialize access with the adapter's lock.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, float, int]] = ()):
+        self._dirs: List[str] = []
+        self._dir_ids: Dict[str, int] = {}
+        self._exts: List[str] = []
+        self._ext_ids: Dict[str, int] = {}
+        self._names = bytearray()
+        self._name_starts = array("Q", (0,))  # row r's basename is _names[starts[r]:starts[r + 1]]
+        self._dir_col = array("I")
+        self._ext_col = array("I")
+        self._sizes = array("q")
+        self._mtimes = array("d")
+        self._slots = array("i", (_EMPTY,)) * 8
+        self._used = 0  # slots holding a row or a deletion marker
+        self._live = 0
+        self._dead = 0
+        for rel_path, mtime, size in entries:
+            self.put(rel_path, mtime, size)
+
+    def __len__(self) -> int:
+        return self._live
+
+    def __contains__(self, rel_path: str) -> bool:
+        return self._row(rel_path) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        for row in self._rows():
+            yield self._path(row)
+
+    def copy(self) -> "FileStore":
+        """An independent copy; the columns and the blob are copied as flat buffers."""
+        other = FileStore.__new__(FileStore)
+        other.__dict__.update(self.__dict__)
+        for attr in ("_dirs", "_exts", "_names", "_name_starts", "_dir_col", "_ext_col", "_sizes", "_mtimes", "_slots"):
+            setattr(other, attr, getattr(self, attr)[:])
+        other._dir_ids = dict(self._dir_ids)
+        other._ext_ids = dict(self._ext_ids)
+        return other
+
+    def get(self, rel_path: str) -> Optional[Tuple[float, int]]:
+        row = self._row(rel_path)
+        return None if row is None else (self._mtimes[row], self._sizes[row])
+
+    def items(self) -> Iterator[Tuple[str, Tuple[float, int]]]:
+        mtimes, sizes = self._mtimes, self._sizes
+        for row in self._rows():
+            yield self._path(row), (mtimes[row], sizes[row])
+
+    def put(self, rel_path: str, mtime: float, size: int):
+        rel_dir, _, name = rel_path.rpartition(os.sep)
+        dir_id = self._dir_ids.get(rel_dir)
+        if dir_id is None:
+            dir_id = self._dir_ids[rel_dir] = len(self._dirs)
+            self._dirs.append(rel_dir)
+        encoded = _encode(name)
+        slot, row = self._find(dir_id, encoded)
+        if row is not None:
+            self._mtimes[row] = mtime
+            self._sizes[row] = size
+            return
+        ext = extension(name)
+        ext_id = self._ext_ids.get(ext)
+        if ext_id is None:
+            ext_id = self._ext_ids[ext] = len(self._exts)
+            self._exts.append(ext)
+        if self._slots[slot] == _EMPTY:
+            self._used += 1
+        self._slots[slot] = len(self._dir_col)
+        self._names += encoded
+        self._name_starts.append(len(self._names))
+        self._dir_col.append(dir_id)
+        self._ext_col.append(ext_id)
+        self._sizes.append(size)
+        self._mtimes.append(mtime)
+        self._live += 1
+        if self._used * 3 > len(self._slots) * 2:
+            self._rehash()
+
+    def remove(self, rel_path: str) -> bool:
+        rel_dir, _, name = rel_path.rpartition(os.sep)
+        dir_id = self._dir_ids.get(rel_dir)
+        if dir_id is None:
+            return False
+        slot, row = self._find(dir_id, _encode(name))
+        if row is None:
+            return False
+        self._slots[slot] = _DELETED
+        self._dir_col[row] = _DEAD
+        self._live -= 1
+        self._dead += 1
+        if self._dead > 1024 and self._dead * 4 > len(self._dir_col):
+            self._compact()
+        return True
+
+    def _find(self, dir_id: int, name: bytes) -> Tuple[int, Optional[int]]:
+        """(slot, row) of an existing entry, or (free slot to insert at, None)."""
+        slots, dir_col, names, starts = self._slots, self._dir_col, self._names, self._name_starts
+        mask = len(slots) - 1
+        slot = hash((dir_id, name)) & mask
+        free = None
+        while True:
+            row = slots[slot]
+            if row == _EMPTY:
+                return (slot if free is None else free), None
+            if row == _DELETED:
+                if free is None:
+                    free = slot
+            elif dir_col[row] == dir_id and names[starts[row]:starts[row + 1]] == name:
+                return slot, row
+            slot = (slot + 1) & mask
+
+    def _row(self, rel_path: str) -> Optional[int]:
+        rel_dir, _, name = rel_path.rpartition(os.sep)
+        dir_id = self._dir_ids.get(rel_dir)
+        return None if dir_id is None else self._find(dir_id, name.encode("utf-8", "surrogateescape"))[1]
+
+    def _rows(self) -> Iterator[int]:
+        return (row for row, dir_id in enumerate(self._dir_col) if dir_id != _DEAD)
+
+    def _path(self, row: int) -> str:
+        name = self._names[self._name_starts[row]:self._name_starts[row + 1]].decode("utf-8", "surrogateescape")
+        rel_dir = self._dirs[self._dir_col[row]]
+        return os.path.join(rel_dir, name) if rel_dir else name
+
+    def _rehash(self):
+        size = 8
+        while size < self._live * 2:
+            size *= 2
+        slots = array("i", (_EMPTY,)) * size
+        mask = size - 1
+        names, starts = self._names, self._name_starts
+        for row in self._rows():
+            slot = hash((self._dir_col[row], bytes(names[starts[row]:starts[row + 1]]))) & mask
+            while slots[slot] != _EMPTY:
+                slot = (slot + 1) & mask
+            slots[slot] = row
+        self._slots = slots
+        self._used = self._live
+
+    def _compact(self):
+        self.__init__([(self._path(row), self._mtimes[row], self._sizes[row]) for row in self._rows()])
+
+    @property
+    def extensions(self) -> List[str]:
+        """Extension names by id."""
+        return self._exts
+
+    def columns(self, rel_paths: Iterable[Optional[str]]) -> Tuple[array, array, array]:
+        """Sizes, mtimes and extension ids aligned with `rel_paths`; unknown or None paths get zeros and id _DEAD."""
+        sizes, mtimes, ext_ids = array("q"), array("d"), array("I")
+        for rel_path in rel_paths:
+            row = None if rel_path is None else self._row(rel_path)
+            if row is None:
+                sizes.append(0)
+                mtimes.append(0.0)
+                ext_ids.append(_DEAD)
+            else:
+                sizes.append(self._sizes[row])
+                mtimes.append(self._mtimes[row])
+                ext_ids.append(self._ext_col[row])
+        return sizes, mtimes, ext_ids
+
+    def paths_under(self, rel_dirs: Iterable[str]) -> List[str]:
+        """Files in or below any of `rel_dirs`, found through the directory table."""
+        rel_dirs = set(rel_dirs)
+        prefixes = tuple(d + os.sep for d in rel_dirs)
+        dir_ids = [i for i, d in enumerate(self._dirs) if d in rel_dirs or d.startswith(prefixes)]
+        if not dir_ids:
+            return []
+        rows = np.flatnonzero(np.isin(np.frombuffer(self._dir_col, dtype=np.uint32), dir_ids)).tolist()
+        return [self._path(row) for row in rows]
+
+    def select(self, rel_paths: Iterable[str], filters: SearchFilters) -> List[str]:
+        """Keep the paths that pass `filters`, ordered by `filters.sort`.
+
+        Relevance keeps the given order; paths not in the store are dropped.
+        """
+        ext_ids = None
+        if filters.extensions is not None:
+            ext_ids = [self._ext_ids[e] for e in filters.extensions if e in self._ext_ids]
+            if not ext_ids:
+                return []
+        paths_by_row = {}
+        for rel_path in rel_paths:
+            row = self._row(rel_path)
+            if row is not None:
+                paths_by_row[row] = rel_path
+        rows = select_rows(list(paths_by_row), self._sizes, self._mtimes, self._ext_col, ext_ids, filters)
+        selected = [paths_by_row[row] for row in rows]
+        return sort_by_name(selected, filters.descending) if filters.sort == "name" else selected
@@ -0,0 +1,116 @@
+import importlib.util
+import re
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+
+from indexing.trigram import TrigramIndex, normalize
+
+# pypinyin supplies full pinyin and initials, OpenCC folds traditional
+# characters to simplified. Both are backend dependencies; an install without
+# them still works and indexes names as-is.
+if importlib.util.find_spec("pypinyin") is not None:
+    from pypinyin import lazy_pinyin
+else:
+    lazy_pinyin = None
+
+_to_simplified = None
+if importlib.util.find_spec("opencc") is not None:
+    import opencc
+
+    for _profile in ("t2s", "t2s.json"):
+        try:
+            _to_simplified = opencc.OpenCC(_profile).convert
+            break
+        except Exception:
+            continue
+
+AVAILABLE = lazy_pinyin is not None or _to_simplified is not None
+
+_HAN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]")
+_RAW = "\x01"  # marks the non-Chinese runs lazy_pinyin passes through
+
+
+def has_han(text: str) -> bool:
+    return _HAN.search(text) is not None
+
+
+def to_simplified(text: str) -> str:
+    return _to_simplified(text) if _to_simplified is not None else text
+
+
+def variant_forms(text: str) -> List[str]:
+    """Other spellings a query may use for `text`, normalized like index names.
+
+    For text containing Chinese characters: the simplified form, full pinyin
+    and pinyin initials, with whitespace removed from the pinyin forms
+    ("三體 2.epub" -> "三体 2.epub", "santi2.epub", "st2.epub"). Empty for
+    text without Chinese characters.
+    """
+    if not AVAILABLE or not has_han(text):
+        return []
+    simplified = normalize(to_simplified(text))
+    forms = [simplified]
+    if lazy_pinyin is not None:
+        full, initials = [], []
+        for item in lazy_pinyin(simplified, errors=lambda chars: [_RAW + chars]):
+            if item.startswith(_RAW):
+                full.append(item[1:])
+                initials.append(item[1:])
+            else:
+                full.append(item)
+                initials.append(item[:1])
+        forms.append("".join("".join(full).split()))
+        forms.append("".join("".join(initials).split()))
+    return forms
+
+
+@lru_cache(maxsize=65536)
+def variant_text(text: str) -> str:
+    """variant_forms joined into one string for substring tests, cached for remote titles that repeat."""
+    return "\0".join(variant_forms(text))
+
+
+def variant_query(query: str) -> Optional[str]:
+    """The query as it should be matched against variant forms, or None when
+    they cannot match anything the plain name did not."""
+    if not AVAILABLE:
+        return None
+    q = normalize(query).strip()
+    if has_han(q):
+        return normalize(to_simplified(q)) if _to_simplified is not None else None
+    compact = "".join(q.split())
+    if lazy_pinyin is None or len(compact) < 2 or not compact.isascii():
+        return None
+    return compact
+
+
+class VariantIndex:
+    """Secondary index from pinyin and simplified spellings of names to keys.
+
+    Only names containing Chinese characters get an entry, so it stays small
+    next to the name index it complements. Forms are computed once when a key
+    is added, never per query; all of a key's forms share one entry,
+    separated by NUL, which no query can contain.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, str]] = ()):
+        self.index = TrigramIndex()
+        for key, name in entries:
+            self.add(key, name)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def add(self, key: str, name: str):
+        forms = variant_forms(name)
+        if forms:
+            self.index.add(key, "\0".join(forms))
+        else:
+            self.index.remove(key)
+
+    def remove(self, key: str):
+        self.index.remove(key)
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[str]:
+        q = variant_query(query)
+        return self.index.search(q, limit) if q else []
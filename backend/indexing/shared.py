@@ -0,0 +1,414 @@
+import bisect
+import heapq
+import mmap
+import os
+import struct
+import zlib
+from array import array
+from itertools import accumulate
+from typing import List, NamedTuple, Optional, Tuple
+
+from indexing.filestore import FileStore, select_rows, sort_by_name
+from indexing.trigram import IndexExport, normalize, query_grams
+from models.search_filters import SearchFilters
+
+# File layout: header, then fifteen sections, each starting on an 8-byte boundary:
+#   name_offsets (u64, n+1)  names (NUL-joined normalized basenames, UTF-8)
+#   path_offsets (u64, n+1)  paths (NUL-joined relative paths, UTF-8)
+#   gram_offsets (u64, g+1)  grams (sorted UTF-8 grams of 1 to 3 characters, concatenated)
+#   posting_offsets (u64, g+1)  postings (u32 doc ids)
+#   sizes (i64, n)  mtimes (f64, n)  ext_ids (u32, n)
+#   ext_offsets (u64, e+1)  exts (NUL-joined extension names)
+#   path_slots (u32, s): open-addressing table of doc ids keyed by crc32(path)
+#   order (u32, o): live doc ids sorted by name, for prefix completion
+# Removed entries keep their id with an empty name and path, as in TrigramIndex.
+# The metadata sections (sizes through path_slots) and the order are only
+# written for the name index, so followers filter, sort and complete without
+# a stat() per file or a copy of the names.
+# Each series (the name index, the pinyin variant index) has its own versioned
+# files, "<series>.<version>", and its own pointer file.
+MAGIC = b"ACSIDX04"
+HEADER = struct.Struct("<8s6Q15Q")  # magic, ids, live entries, grams, extensions, path slots, order, section starts
+_NO_DOC = 0xFFFFFFFF
+CURRENT = "CURRENT"
+
+
+def _pointer(series: str) -> str:
+    return CURRENT if series == "index" else f"{CURRENT}.{series}"
+
+
+def _u64(values) -> bytes:
+    return struct.pack(f"<{len(values)}Q", *values) if values else b""
+
+
+def _encode(text: str) -> bytes:
+    # Undecodable bytes in file names come back from os.scandir as surrogates.
+    return text.encode("utf-8", "surrogateescape")
+
+
+def _decode(raw: bytes) -> str:
+    return raw.decode("utf-8", "surrogateescape")
+
+
+def _offsets(parts: List[bytes]) -> List[int]:
+    # Part i of the NUL-joined blob is blob[offsets[i]:offsets[i + 1] - 1].
+    return [0] + list(accumulate(len(p) + 1 for p in parts))
+
+
+class SerializedIndex(NamedTuple):
+    sections: List[bytes]
+    doc_count: int
+    live_count: int
+    gram_count: int
+    ext_count: int
+    slot_count: int
+    order_count: int
+
+
+def _path_hash(path: bytes) -> int:
+    # crc32 rather than hash(): every worker process must agree on the slot.
+    return zlib.crc32(path)
+
+
+def _path_slots(path_parts: List[bytes], live_count: int) -> array:
+    size = 8
+    while size < live_count * 2:
+        size *= 2
+    slots = array("I", (_NO_DOC,)) * size
+    mask = size - 1
+    for doc_id, path in enumerate(path_parts):
+        if path:
+            slot = _path_hash(path) & mask
+            while slots[slot] != _NO_DOC:
+                slot = (slot + 1) & mask
+            slots[slot] = doc_id
+    return slots
+
+
+def serialize(index: IndexExport, files: Optional[FileStore] = None) -> SerializedIndex:
+    """Encode an exported TrigramIndex as the sections of a shared index file.
+
+    Ids are kept as they are, so posting lists are copied verbatim instead of
+    being renumbered. With `files` (a copy taken together with the export),
+    each entry's size, mtime and extension are written as well. Only the
+    export and the copy need the index's lock; encoding runs without it.
+    """
+    keys, names, postings, live_count, order, fresh = index
+    doc_count = len(keys)
+    name_parts = [_encode(name) for name in names]
+    path_parts = [_encode(key or "") for key in keys]
+    gram_items = sorted((_encode(gram), ids) for gram, ids in postings.items())
+    gram_items = [(gram, ids) for gram, ids in gram_items if ids]
+    gram_parts = [gram for gram, _ in gram_items]
+    posting_counts = [len(ids) for _, ids in gram_items]
+    sections = [
+        _u64(_offsets(name_parts)),
+        b"\0".join(name_parts),
+        _u64(_offsets(path_parts)),
+        b"\0".join(path_parts),
+        _u64([0] + list(accumulate(len(g) for g in gram_parts))),
+        b"".join(gram_parts),
+        _u64([0] + list(accumulate(posting_counts))),
+        b"".join(ids.tobytes() for _, ids in gram_items),
+    ]
+    if files is None:
+        sections.extend([b""] * 7)
+        return SerializedIndex(sections, doc_count, live_count, len(gram_items), 0, 0, 0)
+    sizes, mtimes, ext_ids = files.columns(keys)
+    ext_parts = [_encode(ext) for ext in files.extensions]
+    slots = _path_slots(path_parts, live_count)
+    sections.extend([
+        sizes.tobytes(),
+        mtimes.tobytes(),
+        ext_ids.tobytes(),
+        _u64(_offsets(ext_parts)),
+        b"\0".join(ext_parts),
+        slots.tobytes(),
+    ])
+    if order is None:
+        sorted_ids = array("I")
+    else:
+        # Removed ids have an empty name in the export and drop out here.
+        settled = (doc_id for doc_id in order if names[doc_id])
+        merged = heapq.merge(settled, (doc_id for _, doc_id in fresh), key=names.__getitem__)
+        # Followers bisect the encoded names. UTF-8 bytes sort like the strings
+        # except for surrogate-escaped bytes, so the (already nearly sorted)
+        # ids are re-sorted by their encoded name, which costs a single pass otherwise.
+        sorted_ids = array("I", sorted(merged, key=name_parts.__getitem__))
+    sections.append(sorted_ids.tobytes())
+    return SerializedIndex(sections, doc_count, live_count, len(gram_items), len(ext_parts), len(slots),
+                           len(sorted_ids))
+
+
+class SharedIndexPublisher:
+    """Writes versioned index files into `directory` and flips CURRENT to the newest.
+
+    Readers that still map an older version keep it alive (the kernel keeps
+    unlinked mmapped files), so old versions are removed right after a swap.
+    """
+
+    def __init__(self, directory: str, series: str = "index"):
+        self.directory = directory
+        self.series = series
+        os.makedirs(directory, exist_ok=True)
+        self.version = 0
+        current = _read_current(directory, series)
+        if current is not None:
+            self.version = current[0]
+
+    def publish(self, index: SerializedIndex) -> int:
+        version = self.version + 1
+        name = f"{self.series}.{version}"
+        tmp_path = os.path.join(self.directory, f"{name}.tmp")
+        padded, offsets, position = [], [], HEADER.size
+        for section in index.sections:
+            pad = -position % 8
+            padded.append(b"\0" * pad)
+            position += pad
+            offsets.append(position)
+            padded.append(section)
+            position += len(section)
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, index.doc_count, index.live_count, index.gram_count,
+                                index.ext_count, index.slot_count, index.order_count, *offsets))
+            f.writelines(padded)
+        os.replace(tmp_path, os.path.join(self.directory, name))
+        _write_current(self.directory, self.series, version, name)
+        self.version = version
+        for entry in os.listdir(self.directory):
+            if entry.startswith(f"{self.series}.") and entry != name:
+                try:
+                    os.remove(os.path.join(self.directory, entry))
+                except OSError:
+                    pass
+        return version
+
+
+def _read_current(directory: str, series: str) -> Optional[Tuple[int, str]]:
+    try:
+        with open(os.path.join(directory, _pointer(series))) as f:
+            version, name = f.read().split()
+        return int(version), name
+    except (OSError, ValueError):
+        return None
+
+
+def _write_current(directory: str, series: str, version: int, name: str):
+    pointer = _pointer(series)
+    tmp_path = os.path.join(directory, f"{pointer}.tmp")
+    with open(tmp_path, "w") as f:
+        f.write(f"{version} {name}\n")
+    os.replace(tmp_path, os.path.join(directory, pointer))
+
+
+class _IndexView:
+    """Read-only view over one mapped index file."""
+
+    def __init__(self, path: str, version: int):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.version = version
+        if len(self._mm) < HEADER.size or self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a shared index file")
+        _, self.doc_count, self.live_count, self.gram_count, ext_count, self.slot_count, order_count, *starts = \
+            HEADER.unpack_from(self._mm)
+        view = memoryview(self._mm)
+        self._name_offsets = view[starts[0]:starts[0] + 8 * (self.doc_count + 1)].cast("Q")
+        self._names_start = starts[1]
+        self._path_offsets = view[starts[2]:starts[2] + 8 * (self.doc_count + 1)].cast("Q")
+        self._paths_start = starts[3]
+        self._gram_offsets = view[starts[4]:starts[4] + 8 * (self.gram_count + 1)].cast("Q")
+        self._grams_start = starts[5]
+        self._posting_offsets = view[starts[6]:starts[6] + 8 * (self.gram_count + 1)].cast("Q")
+        self._postings = view[starts[7]:starts[7] + 4 * self._posting_offsets[self.gram_count]].cast("I")
+        columns = self.doc_count if self.slot_count else 0
+        self.sizes = view[starts[8]:starts[8] + 8 * columns].cast("q")
+        self.mtimes = view[starts[9]:starts[9] + 8 * columns].cast("d")
+        self.ext_col = view[starts[10]:starts[10] + 4 * columns].cast("I")
+        ext_offsets = view[starts[11]:starts[11] + 8 * (ext_count + 1)].cast("Q") if ext_count else []
+        self.ext_ids = {_decode(self._mm[starts[12] + ext_offsets[i]:starts[12] + ext_offsets[i + 1] - 1]): i
+                        for i in range(ext_count)}
+        self._slots = view[starts[13]:starts[13] + 4 * self.slot_count].cast("I")
+        self._order = view[starts[14]:starts[14] + 4 * order_count].cast("I")
+
+    def __len__(self) -> int:
+        return self.live_count
+
+    def _path(self, doc_id: int) -> str:
+        start = self._paths_start + self._path_offsets[doc_id]
+        return _decode(self._mm[start:self._paths_start + self._path_offsets[doc_id + 1] - 1])
+
+    def _name(self, doc_id: int) -> bytes:
+        return self._mm[self._names_start + self._name_offsets[doc_id]:self._names_start + self._name_offsets[doc_id + 1] - 1]
+
+    def doc_id(self, rel_path: str) -> Optional[int]:
+        """Id of a live entry, through the path table; None if absent (or no table was written)."""
+        if not self.slot_count:
+            return None
+        path = _encode(rel_path)
+        slots, mask = self._slots, self.slot_count - 1
+        slot = _path_hash(path) & mask
+        while True:
+            doc_id = slots[slot]
+            if doc_id == _NO_DOC:
+                return None
+            start = self._paths_start + self._path_offsets[doc_id]
+            if self._mm[start:self._paths_start + self._path_offsets[doc_id + 1] - 1] == path:
+                return doc_id
+            slot = (slot + 1) & mask
+
+    def get(self, rel_path: str) -> Optional[Tuple[float, int]]:
+        doc_id = self.doc_id(rel_path)
+        return None if doc_id is None else (self.mtimes[doc_id], self.sizes[doc_id])
+
+    def _posting_range(self, gram: bytes) -> Optional[Tuple[int, int]]:
+        lo, hi = 0, self.gram_count
+        offsets, start = self._gram_offsets, self._grams_start
+        while lo < hi:
+            mid = (lo + hi) // 2
+            current = self._mm[start + offsets[mid]:start + offsets[mid + 1]]
+            if current < gram:
+                lo = mid + 1
+            elif current > gram:
+                hi = mid
+            else:
+                return self._posting_offsets[mid], self._posting_offsets[mid + 1]
+        return None
+
+    def complete(self, prefix: str, limit: int) -> List[str]:
+        # Same as TrigramIndex.prefix; UTF-8 byte order is code point order.
+        needle = _encode(normalize(prefix))
+        if not needle:
+            return []
+        order = self._order
+        lo, hi = 0, len(order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._name(order[mid]) < needle:
+                lo = mid + 1
+            else:
+                hi = mid
+        matches = []
+        for position in range(lo, min(lo + limit, len(order))):
+            doc_id = order[position]
+            if not self._name(doc_id).startswith(needle):
+                break
+            matches.append(self._path(doc_id))
+        return matches
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[str]:
+        # Same matching and ordering as TrigramIndex.search.
+        q = normalize(query)
+        if not q or "\0" in q:
+            return []
+        needle = _encode(q)
+        matches = []
+        grams = query_grams(q)
+        if grams is None:
+            # Single Latin characters scan the NUL-separated name blob with mmap.find.
+            end = self._names_start + max(self._name_offsets[self.doc_count] - 1, 0)
+            position = self._mm.find(needle, self._names_start, end)
+            while position != -1 and (limit is None or len(matches) < limit):
+                doc_id = bisect.bisect_right(self._name_offsets, position - self._names_start) - 1
+                matches.append(self._path(doc_id))
+                position = self._mm.find(needle, self._names_start + self._name_offsets[doc_id + 1], end)
+            return matches
+
+        smallest = None
+        for gram in grams:
+            bounds = self._posting_range(_encode(gram))
+            if bounds is None:
+                return []
+            if smallest is None or bounds[1] - bounds[0] < smallest[1] - smallest[0]:
+                smallest = bounds
+        for doc_id in self._postings[smallest[0]:smallest[1]]:
+            if needle in self._name(doc_id):
+                matches.append(self._path(doc_id))
+                if limit is not None and len(matches) >= limit:
+                    break
+        return matches
+
+
+class SharedIndexReader:
+    """Follows the newest index published into `directory`.
+
+    `refresh()` is one stat() when nothing changed; on a new version the file
+    is mapped and swapped in as a whole, so a search never sees a mix of two
+    versions.
+    """
+
+    def __init__(self, directory: str, series: str = "index"):
+        self.directory = directory
+        self.series = series
+        self._view: Optional[_IndexView] = None
+        self._current_stat = None
+
+    @property
+    def version(self) -> int:
+        return self._view.version if self._view else 0
+
+    def __len__(self) -> int:
+        view = self._view
+        return len(view) if view else 0
+
+    def refresh(self) -> bool:
+        """Map a newer version if one was published; True when the view changed."""
+        try:
+            st = os.stat(os.path.join(self.directory, _pointer(self.series)))
+        except OSError:
+            return False
+        key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if key == self._current_stat:
+            return False
+        current = _read_current(self.directory, self.series)
+        if current is None or (self._view and current[0] == self._view.version):
+            self._current_stat = key
+            return False
+        try:
+            view = _IndexView(os.path.join(self.directory, current[1]), current[0])
+        except (OSError, ValueError) as e:
+            # Most likely superseded and removed between reading CURRENT and opening it; retry next time.
+            print(f"SharedIndexReader: cannot map index version {current[0]}: {e}")
+            return False
+        self._view = view
+        self._current_stat = key
+        return True
+
+    def complete(self, prefix: str, limit: int) -> List[str]:
+        """Paths of up to `limit` entries whose name starts with `prefix`, in name order."""
+        view = self._view
+        return view.complete(prefix, limit) if view else []
+
+    def get(self, rel_path: str) -> Optional[Tuple[float, int]]:
+        """(mtime, size) as of the published version, or None."""
+        view = self._view
+        return view.get(rel_path) if view else None
+
+    def select(self, rel_paths: List[str], filters: SearchFilters) -> Tuple[List[str], List[str]]:
+        """FileStore.select over the published metadata columns.
+
+        Also returns the paths the published version does not know (content
+        hits indexed since), in their given order, for the caller to stat.
+        """
+        view = self._view
+        if view is None:
+            return [], list(rel_paths)
+        paths_by_doc, unknown = {}, []
+        for rel_path in rel_paths:
+            doc_id = view.doc_id(rel_path)
+            if doc_id is None:
+                unknown.append(rel_path)
+            else:
+                paths_by_doc[doc_id] = rel_path
+        ext_ids = None
+        if filters.extensions is not None:
+            ext_ids = [view.ext_ids[e] for e in filters.extensions if e in view.ext_ids]
+            if not ext_ids:
+                return [], unknown
+        docs = select_rows(list(paths_by_doc), view.sizes, view.mtimes, view.ext_col, ext_ids, filters)
+        selected = [paths_by_doc[doc_id] for doc_id in docs]
+        return (sort_by_name(selected, filters.descending) if filters.sort == "name" else selected), unknown
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[str]:
+        view = self._view
+        return view.search(query, limit) if view else []
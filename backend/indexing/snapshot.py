@@ -0,0 +1,65 @@
+import os
+import sqlite3
+from typing import Dict, Iterable, Optional, Tuple
+
+SCHEMA_VERSION = "2"  # 2: paths stored as bytes
+
+
+def _path_key(rel_path: str) -> bytes:
+    # Undecodable bytes in file names come back from os.scandir as surrogates,
+    # which SQLite cannot bind as text, so paths are stored as bytes.
+    return rel_path.encode("utf-8", "surrogateescape")
+
+
+def _path_str(key: bytes) -> str:
+    return key.decode("utf-8", "surrogateescape")
+
+
+class IndexSnapshot:
+    """SQLite snapshot of a filesystem index: files with (mtime, size) and the
+    mtime of every directory, used to skip unchanged directories on boot."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self, root_path: str) -> Optional[Tuple[Dict[str, Tuple[float, int]], Dict[str, float]]]:
+        if not os.path.isfile(self.path):
+            return None
+        try:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            try:
+                meta = dict(conn.execute("SELECT key, value FROM meta"))
+                if meta.get("version") != SCHEMA_VERSION or meta.get("root_path") != root_path:
+                    return None
+                files = {_path_str(rel): (mtime, size) for rel, mtime, size in conn.execute("SELECT path, mtime, size FROM files")}
+                dirs = {_path_str(rel): mtime for rel, mtime in conn.execute("SELECT path, mtime FROM dirs")}
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"IndexSnapshot: failed to load {self.path}: {e}")
+            return None
+        return files, dirs
+
+    def save(self, root_path: str, files: Iterable[Tuple[str, float, int]], dirs: Iterable[Tuple[str, float]]):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        conn = sqlite3.connect(tmp_path)
+        try:
+            conn.execute("PRAGMA journal_mode=OFF")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID")
+            conn.execute("CREATE TABLE files (path BLOB PRIMARY KEY, mtime REAL, size INTEGER) WITHOUT ROWID")
+            conn.execute("CREATE TABLE dirs (path BLOB PRIMARY KEY, mtime REAL) WITHOUT ROWID")
+            conn.executemany("INSERT INTO meta VALUES (?, ?)", [("version", SCHEMA_VERSION), ("root_path", root_path)])
+            conn.executemany("INSERT INTO files VALUES (?, ?, ?)",
+                             ((_path_key(rel), mtime, size) for rel, mtime, size in files))
+            conn.executemany("INSERT INTO dirs VALUES (?, ?)", ((_path_key(rel), mtime) for rel, mtime in dirs))
+            conn.commit()
+        finally:
+            conn.close()
+        # Write aside and swap in atomically so a crash never leaves half a snapshot.
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,73 @@
+import bisect
+import threading
+from collections import Counter, OrderedDict
+from typing import Callable, Iterable, List, Tuple
+
+from indexing.trigram import normalize
+
+# complete(prefix, window) -> titles of up to `window` entries starting with prefix; size() -> entry count
+Source = Tuple[Callable[[str, int], List[str]], Callable[[], int]]
+
+
+class SuggestIndex:
+    """Prefix completion over titles.
+
+    Local sources (the filesystem name index) answer from their own sorted
+    name data, so no title is copied in here. Titles seen in recent remote
+    results are kept in a bounded LRU with a sorted key list next to it.
+    Sources may take their own locks, so call `complete` off the event loop.
+    """
+
+    def __init__(self, max_recent: int = 5000):
+        self.max_recent = max_recent
+        self._lock = threading.Lock()
+        self._sources: List[Source] = []
+        self._recent: "OrderedDict[str, Tuple[int, str]]" = OrderedDict()  # normalized -> (times seen, title)
+        self._recent_keys: List[str] = []  # sorted keys of _recent
+
+    def __len__(self) -> int:
+        return len(self._recent) + sum(size() for _, size in self._sources)
+
+    def add_source(self, complete: Callable[[str, int], List[str]], size: Callable[[], int]):
+        self._sources.append((complete, size))
+
+    def remember(self, titles: Iterable[str]):
+        """Record titles seen in remote results, evicting the least recently seen."""
+        with self._lock:
+            for title in titles:
+                key = normalize(title or "").strip()
+                if not key:
+                    continue
+                seen, first_title = self._recent.pop(key, (0, title.strip()))
+                if not seen:
+                    bisect.insort(self._recent_keys, key)
+                self._recent[key] = (seen + 1, first_title)
+            while len(self._recent) > self.max_recent:
+                key, _ = self._recent.popitem(last=False)
+                del self._recent_keys[bisect.bisect_left(self._recent_keys, key)]
+
+    def complete(self, prefix: str, limit: int = 10) -> List[str]:
+        """Titles starting with `prefix`, most common first, then shortest."""
+        needle = normalize(prefix.strip())
+        if not needle:
+            return []
+        # Only the first few matches in sort order are ranked, which keeps long
+        # completion ranges (a one-letter prefix) as cheap as short ones.
+        window = limit * 8
+        counts, titles = Counter(), {}
+        for complete, _ in self._sources:
+            for title in complete(needle, window):
+                key = normalize(title)
+                counts[key] += 1
+                titles.setdefault(key, title)
+        with self._lock:
+            keys = self._recent_keys
+            start = bisect.bisect_left(keys, needle)
+            for key in keys[start:start + window]:
+                if not key.startswith(needle):
+                    break
+                seen, title = self._recent[key]
+                counts[key] += seen
+                titles.setdefault(key, title)
+        ranked = sorted(counts, key=lambda key: (-counts[key], len(key), key))
+        return [titles[key] for key in ranked[:limit]]
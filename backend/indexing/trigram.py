@@ -0,0 +1,211 @@
+import bisect
+import heapq
+import re
+from array import array
+from itertools import islice
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+# Scripts written without spaces (kana, Han, Hangul), where one or two
+# characters already make a word; each such character gets its own posting list.
+_WIDE = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]")
+
+
+def normalize(text: str) -> str:
+    return text.lower()
+
+
+def _grams(text: str, n: int = 3) -> set:
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def _index_grams(text: str) -> set:
+    grams = _grams(text, 3) | _grams(text, 2)
+    grams.update(_WIDE.findall(text))
+    return grams
+
+
+def query_grams(q: str) -> Optional[Set[str]]:
+    """Grams whose posting lists all contain every name matching `q`, or None
+    when `q` is a single Latin character and names have to be scanned."""
+    if len(q) >= 3:
+        return _grams(q)
+    if len(q) == 2 or _WIDE.match(q):
+        return {q}
+    return None
+
+
+class IndexExport(NamedTuple):
+    """Point-in-time copy of a TrigramIndex, for serialization outside its lock."""
+    keys: List[Optional[str]]
+    names: List[str]
+    postings: Dict[str, array]
+    live_count: int
+    order: Optional[array]  # ids sorted by name, may include removed ids; None when not tracked
+    fresh: List[Tuple[str, int]]  # (name, id) of inserts not merged into `order` yet
+
+
+class TrigramIndex:
+    """Substring index over pre-normalized names.
+
+    Every live entry gets a monotonically increasing integer id; each trigram
+    and bigram of its normalized name (and each CJK character) maps to a
+    compact posting list of those ids. A query only verifies the candidates of
+    its rarest gram instead of scanning every name; two-character queries,
+    the usual length of a Chinese word, are a single posting lookup. Removed
+    ids are tombstoned and the structure is compacted once a quarter of it is
+    dead.
+
+    After `track_order()`, ids are also kept sorted by name for prefix
+    completion: one compact array plus a small sorted list of recent
+    inserts that is merged into it in batches.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, str]] = ()):
+        self._keys: List[Optional[str]] = []
+        self._names: List[str] = []
+        self._ids: Dict[str, int] = {}
+        self._postings: Dict[str, array] = {}
+        self._dead = 0
+        self._order: Optional[array] = None
+        self._fresh: List[Tuple[str, int]] = []
+        self._removed_names: Dict[int, str] = {}  # names of removed ids still in _order, for bisecting
+        for key, name in entries:
+            self.add(key, name)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._ids
+
+    def export(self) -> IndexExport:
+        """Copy the id tables and posting lists; the posting copies are flat buffer copies."""
+        # The live posting arrays keep growing after the lock is released, so
+        # they are copied here rather than shared. _order is replaced, never
+        # modified in place, so it is shared as is.
+        return IndexExport(list(self._keys), list(self._names),
+                           {gram: ids[:] for gram, ids in self._postings.items()}, len(self._ids),
+                           self._order, list(self._fresh))
+
+    def track_order(self):
+        """Start keeping ids sorted by name, for `prefix()`."""
+        names = self._names
+        self._order = array("I", sorted((i for i, key in enumerate(self._keys) if key is not None),
+                                        key=names.__getitem__))
+        self._fresh = []
+        self._removed_names = {}
+
+    def prefix(self, prefix: str, limit: int) -> List[str]:
+        """Keys of up to `limit` entries whose name starts with `prefix`, in name order."""
+        needle = normalize(prefix)
+        if not needle or self._order is None:
+            return []
+        order, names, removed = self._order, self._names, self._removed_names
+        lo, hi = 0, len(order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            doc_id = order[mid]
+            if (names[doc_id] or removed[doc_id]) < needle:
+                lo = mid + 1
+            else:
+                hi = mid
+        settled = []
+        for position in range(lo, len(order)):
+            doc_id = order[position]
+            name = names[doc_id]
+            if not name:
+                if removed[doc_id].startswith(needle):
+                    continue
+                break
+            if not name.startswith(needle) or len(settled) >= limit:
+                break
+            settled.append((name, doc_id))
+        fresh = []
+        for name, doc_id in islice(self._fresh, bisect.bisect_left(self._fresh, (needle,)), None):
+            if not name.startswith(needle) or len(fresh) >= limit:
+                break
+            fresh.append((name, doc_id))
+        return [self._keys[doc_id] for _, doc_id in islice(heapq.merge(settled, fresh), limit)]
+
+    def add(self, key: str, name: str):
+        if key in self._ids:
+            self.remove(key)
+        self._insert(key, normalize(name))
+
+    def remove(self, key: str):
+        doc_id = self._ids.pop(key, None)
+        if doc_id is None:
+            return
+        if self._order is not None:
+            entry = (self._names[doc_id], doc_id)
+            position = bisect.bisect_left(self._fresh, entry)
+            if position < len(self._fresh) and self._fresh[position] == entry:
+                del self._fresh[position]
+            else:
+                self._removed_names[doc_id] = self._names[doc_id]
+        self._keys[doc_id] = None
+        # An empty name never matches a non-empty query, so stale postings
+        # pointing here are filtered out by the verification step for free.
+        self._names[doc_id] = ""
+        self._dead += 1
+        if self._dead > 1024 and self._dead * 4 > len(self._keys):
+            self._compact()
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[str]:
+        # With a limit the scan stops at the first `limit` matches, in insertion order.
+        q = normalize(query)
+        if not q:
+            return []
+        names = self._names
+        keys = self._keys
+        grams = query_grams(q)
+        if grams is None:
+            return list(islice((keys[i] for i, name in enumerate(names) if q in name), limit))
+
+        smallest = None
+        for gram in grams:
+            bucket = self._postings.get(gram)
+            if bucket is None:
+                return []
+            if smallest is None or len(bucket) < len(smallest):
+                smallest = bucket
+        return list(islice((keys[i] for i in smallest if q in names[i]), limit))
+
+    def _insert(self, key: str, norm: str):
+        doc_id = len(self._keys)
+        self._keys.append(key)
+        self._names.append(norm)
+        self._ids[key] = doc_id
+        postings = self._postings
+        for gram in _index_grams(norm):
+            bucket = postings.get(gram)
+            if bucket is None:
+                postings[gram] = array("I", (doc_id,))
+            else:
+                bucket.append(doc_id)
+        if self._order is not None:
+            bisect.insort(self._fresh, (norm, doc_id))
+            if len(self._fresh) > max(4096, len(self._order) // 8):
+                self._merge_fresh()
+
+    def _merge_fresh(self):
+        names, keys = self._names, self._keys
+        settled = (doc_id for doc_id in self._order if keys[doc_id] is not None)
+        fresh = (doc_id for _, doc_id in self._fresh)
+        self._order = array("I", heapq.merge(settled, fresh, key=names.__getitem__))
+        self._fresh = []
+        self._removed_names = {}
+
+    def _compact(self):
+        live = [(key, name) for key, name in zip(self._keys, self._names) if key is not None]
+        ordered = self._order is not None
+        self._keys = []
+        self._names = []
+        self._ids = {}
+        self._postings = {}
+        self._dead = 0
+        self._order = None
+        for key, name in live:
+            self._insert(key, name)
+        if ordered:
+            self.track_order()
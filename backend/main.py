@@ -1,8 +1,18 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routes import router
+from routes import router, ADAPTERS
 
-app = FastAPI(title="AnticlockwiseSearch Backend", version="0.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 启动时为各数据源建立共享连接池，关闭时统一释放；
+    # 索引构建与登录预热在后台并行进行，不阻塞服务启动
+    await asyncio.gather(*(adapter.startup() for adapter in ADAPTERS))
+    yield
+    await asyncio.gather(*(adapter.shutdown() for adapter in ADAPTERS))
+
+app = FastAPI(title="AnticlockwiseSearch Backend", version="0.1.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -10,6 +20,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Search-Sources", "X-Candidate-Count", "Server-Timing"],
 )
 
 app.include_router(router)
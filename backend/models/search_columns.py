@@ -0,0 +1,10 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+
+@dataclass
+class SearchColumns:
+    """/search?format=columns: one array per SearchResult field, aligned by
+    position. Fields that are null in every result are left out."""
+    count: int
+    columns: Dict[str, List[Any]]
@@ -0,0 +1,22 @@
+from dataclasses import dataclass
+from typing import FrozenSet, Optional
+
+SORT_KEYS = ("relevance", "name", "size", "modified")
+
+
+@dataclass(frozen=True)
+class SearchFilters:
+    """File-metadata filters and ordering; only sources with `supports_filters` honor them."""
+    extensions: Optional[FrozenSet[str]] = None  # lower-case, without the leading dot
+    min_size: Optional[int] = None  # bytes
+    modified_after: Optional[float] = None  # epoch seconds
+    sort: str = "relevance"
+    descending: bool = False
+
+    @property
+    def narrows(self) -> bool:
+        return self.extensions is not None or self.min_size is not None or self.modified_after is not None
+
+    def cache_key(self) -> str:
+        extensions = ",".join(sorted(self.extensions)) if self.extensions is not None else "*"
+        return f"{extensions}:{self.min_size}:{self.modified_after}:{self.sort}:{int(self.descending)}"
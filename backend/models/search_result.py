@@ -1,11 +1,19 @@
-from pydantic import BaseModel
+from dataclasses import dataclass
 from typing import Optional
 
-class SearchResult(BaseModel):
+# A plain dataclass rather than a pydantic model: adapters build tens of
+# thousands of these per broad query, and they are never parsed from untrusted
+# input. FastAPI still derives the response schema from it.
+@dataclass
+class SearchResult:
     id: str
     source: str
     title: str
+    detail_url: str
     description: Optional[str] = None
     thumbnail_url: Optional[str] = None
-    detail_url: str
-    type: Optional[str] = None
\ No newline at end of file
+    type: Optional[str] = None
+    size: Optional[int] = None  # bytes, filesystem results only
+    modified: Optional[float] = None  # epoch seconds, filesystem results only
+    library: Optional[str] = None  # library within the source instance, where it has several
+    author: Optional[str] = None  # book sources only
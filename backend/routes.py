@@ -1,43 +1,310 @@
-from fastapi import APIRouter, Query, HTTPException
-from fastapi.responses import FileResponse
-from typing import List
+from fastapi import APIRouter, Query, HTTPException, Request, Response
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, RedirectResponse, StreamingResponse
+from typing import FrozenSet, List, Optional, Union
+from datetime import datetime
 import asyncio
+import sqlite3
 import os
+import re
+import stat
+import time
 import urllib.parse
+from email.utils import parsedate_to_datetime
 
 from models.search_result import SearchResult
+from models.search_columns import SearchColumns
+from models.search_filters import SORT_KEYS, SearchFilters
 from adapters.jellyfin import JellyfinAdapter
 from adapters.audiobookshelf import AudiobookshelfAdapter
 from adapters.photoprism import PhotoPrismAdapter
 from adapters.calibreweb import CalibreWebAdapter
 from adapters.filesystem import FileSystemAdapter
-from config import DATA_SOURCE_CONFIGS
+from adapters.base import PROJECTABLE_FIELDS
+from services.resilience import guarded_search, format_statuses
+from services.ranking import rank_results, sort_results
+from services.thumbnails import ThumbnailProxy, ThumbnailStore
+from services import metrics
+from services.inflight import LatestRequests
+from services.concurrency import UpstreamLimiter
+from services.serialization import dumps, json_response, to_columns
+from indexing.suggest import SuggestIndex
+from config import (DATA_SOURCE_CONFIGS, SEARCH_DEADLINE, SERVER_TIMING, SUGGEST_SETTINGS, THUMBNAIL_PROXY, THUMBNAIL_SETTINGS,
+                    UPSTREAM_CONCURRENCY, UPSTREAM_HOST_CONCURRENCY)
 
 router = APIRouter()
 
-ADAPTERS = [
-    JellyfinAdapter(DATA_SOURCE_CONFIGS["jellyfin"]),
-    AudiobookshelfAdapter(DATA_SOURCE_CONFIGS["audiobookshelf"]),
-    PhotoPrismAdapter(DATA_SOURCE_CONFIGS["photoprism"]),
-    CalibreWebAdapter(DATA_SOURCE_CONFIGS["calibreweb"]),
-    FileSystemAdapter(DATA_SOURCE_CONFIGS["filesystem"]),
-]
+ADAPTER_TYPES = {
+    "jellyfin": JellyfinAdapter,
+    "audiobookshelf": AudiobookshelfAdapter,
+    "photoprism": PhotoPrismAdapter,
+    "calibreweb": CalibreWebAdapter,
+    "filesystem": FileSystemAdapter,
+}
+# 每个配置项一个适配器实例，同类数据源可以有多个（见 config._instances）
+ADAPTERS = [ADAPTER_TYPES[config["type"]](config) for config in DATA_SOURCE_CONFIGS.values()]
+ADAPTERS_BY_NAME = {adapter.name: adapter for adapter in ADAPTERS}
 
-@router.get("/search", response_model=List[SearchResult])
-async def unified_search(query: str = Query(..., min_length=1, max_length=100)):
+# 所有数据源共用的上游并发限制：全局上限，加上按主机的上限
+UPSTREAM = UpstreamLimiter(UPSTREAM_CONCURRENCY, UPSTREAM_HOST_CONCURRENCY)
+for adapter in ADAPTERS:
+    adapter.limiter = UPSTREAM
+
+# 输入联想索引：文件名直接查文件系统数据源的有序名称索引，远程数据源的标题在搜索后记录
+SUGGESTIONS = SuggestIndex(SUGGEST_SETTINGS["recent_titles"])
+for adapter in ADAPTERS:
+    if isinstance(adapter, FileSystemAdapter):
+        SUGGESTIONS.add_source(adapter.complete_names, lambda adapter=adapter: adapter.indexed_files)
+LATEST = LatestRequests()
+
+def _cache_requests():
+    for adapter in ADAPTERS:
+        cache = adapter.cache
+        yield (adapter.name, "hit"), cache.hits
+        yield (adapter.name, "stale"), cache.stale_hits
+        yield (adapter.name, "miss"), cache.misses
+
+def _cache_hit_ratio():
+    for adapter in ADAPTERS:
+        cache = adapter.cache
+        total = cache.hits + cache.stale_hits + cache.misses
+        yield (adapter.name,), (cache.hits + cache.stale_hits) / total if total else 0
+
+def _index_files():
+    for adapter in ADAPTERS:
+        if isinstance(adapter, FileSystemAdapter):
+            yield ("name",), adapter.indexed_files
+            if adapter.content:
+                yield ("content",), adapter.content.count()
+
+metrics.CallbackMetric("anticlockwise_cache_requests_total", "Result cache lookups per source (hit, stale, miss).",
+                       ["source", "result"], _cache_requests, type="counter")
+metrics.CallbackMetric("anticlockwise_cache_hit_ratio", "Share of result cache lookups served from the cache.",
+                       ["source"], _cache_hit_ratio)
+metrics.CallbackMetric("anticlockwise_filesystem_index_files", "Files in the filesystem name and content indexes.",
+                       ["index"], _index_files)
+metrics.CallbackMetric("anticlockwise_suggest_titles", "Distinct titles available to /suggest.",
+                       [], lambda: [((), len(SUGGESTIONS))])
+metrics.CallbackMetric("anticlockwise_upstream_in_flight", "Upstream requests holding a concurrency slot, per host.",
+                       ["host"], lambda: list(((host,), n) for host, n in UPSTREAM.in_flight.items()))
+metrics.CallbackMetric("anticlockwise_upstream_waiting", "Upstream requests queued for a concurrency slot, per host.",
+                       ["host"], lambda: list(((host,), n) for host, n in UPSTREAM.waiting.items()))
+metrics.CallbackMetric("anticlockwise_circuit_open", "1 while a source's circuit breaker is open.",
+                       ["source"], lambda: [((a.name,), 0 if a.breaker.allow() else 1) for a in ADAPTERS])
+
+THUMBNAILS = None
+if THUMBNAIL_PROXY:
+    try:
+        THUMBNAILS = ThumbnailProxy(
+            ThumbnailStore(THUMBNAIL_SETTINGS["cache_dir"], THUMBNAIL_SETTINGS["max_bytes"], THUMBNAIL_SETTINGS["ttl"]),
+            max_size=THUMBNAIL_SETTINGS["max_size"],
+        )
+    except (OSError, sqlite3.Error) as e:
+        print(f"Thumbnail cache unavailable ({e}), thumbnails will redirect to the upstream.")
+
+def _parse_fields(fields: Optional[str]) -> Optional[FrozenSet[str]]:
+    # fields=description,thumbnail_url：只向上游请求并返回这些可选字段，未列出的字段为 null
+    if fields is None:
+        return None
+    requested = frozenset(f.strip() for f in fields.split(",") if f.strip())
+    unknown = requested - PROJECTABLE_FIELDS
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return requested
+
+def _parse_filters(ext: Optional[str], min_size: Optional[int], modified_after: Optional[datetime],
+                   sort: str, order: Optional[str]) -> Optional[SearchFilters]:
+    # ext=epub,pdf&min_size=1048576&modified_after=2024-01-01&sort=size&order=desc
+    # 名称默认升序，大小和修改时间默认降序
+    extensions = None
+    if ext is not None:
+        extensions = frozenset(e.strip().lstrip(".").lower() for e in ext.split(",") if e.strip())
+    filters = SearchFilters(
+        extensions=extensions or None,
+        min_size=min_size,
+        modified_after=modified_after.timestamp() if modified_after is not None else None,
+        sort=sort,
+        descending=(order or ("asc" if sort == "name" else "desc")) == "desc",
+    )
+    return filters if filters.narrows or sort != "relevance" else None
+
+@router.get("/search", response_model=Union[List[SearchResult], SearchColumns])
+async def unified_search(
+    request: Request,
+    query: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0, le=10000),
+    fields: Optional[str] = Query(None, max_length=100),
+    session: Optional[str] = Query(None, max_length=64),
+    ext: Optional[str] = Query(None, max_length=200),
+    min_size: Optional[int] = Query(None, ge=0),
+    modified_after: Optional[datetime] = Query(None),
+    sort: str = Query("relevance", pattern=f"^({'|'.join(SORT_KEYS)})$"),
+    order: Optional[str] = Query(None, pattern="^(asc|desc)$"),
+    layout: str = Query("objects", alias="format", pattern="^(objects|columns)$"),
+):
+    requested_fields = _parse_fields(fields)
+    filters = _parse_filters(ext, min_size, modified_after, sort, order)
     if not query.strip():
         return []
 
-    tasks = [adapter.search(query) for adapter in ADAPTERS if adapter.enabled]
-    results_lists = await asyncio.gather(*tasks, return_exceptions=True)
+    # 每个数据源最多取 offset + limit 条，分页发生在跨数据源排序之后
+    started = time.monotonic()
+    deadline = started + SEARCH_DEADLINE
+    adapters = [adapter for adapter in ADAPTERS if adapter.enabled]
+    if filters is not None:
+        # 按扩展名、大小、修改时间过滤或排序时，只查询有文件元数据的数据源
+        adapters = [adapter for adapter in adapters if adapter.supports_filters]
+    searches = asyncio.gather(*(guarded_search(adapter, query, deadline, offset + limit, requested_fields, filters)
+                                for adapter in adapters))
+    outcomes = await _unless_superseded(searches, session)
+    if outcomes is None:
+        raise HTTPException(status_code=409, detail="Superseded by a newer query from the same session")
+    _remember_titles(outcomes)
+
+    # 所有数据源的结果统一打分，只保留前 offset + limit 条
+    batches = [(outcome.results, adapter.rank_weight) for adapter, outcome in zip(adapters, outcomes)]
+    ranking_started = time.monotonic()
+    if filters is not None and filters.sort != "relevance":
+        total, top = sort_results(batches, filters, offset + limit)
+    else:
+        total, top = rank_results(batches, query, offset + limit)
+    # 各数据源状态：ok / degraded（返回缓存的旧结果）/ timeout / error / skipped（熔断中）/ warming（索引加载中）
+    # X-Candidate-Count：参与排序的候选结果数。每个数据源最多返回 offset + limit 条，所以它不是匹配总数，不能用来计算总页数
+    headers = {"X-Search-Sources": format_statuses(outcomes), "X-Candidate-Count": str(total)}
+    if SERVER_TIMING:
+        headers["Server-Timing"] = _server_timing(outcomes, ranking_started, started)
+    # 结果直接编码为 JSON，不再逐条经过 response_model 校验；format=columns 时按字段返回数组（见 services/serialization.py），
+    # 客户端支持时用 br / gzip 压缩
+    page = top[offset:]
+    return json_response(request, to_columns(page) if layout == "columns" else page, headers)
+
+async def _unless_superseded(work: asyncio.Future, session: Optional[str]):
+    # session：同一客户端的新查询到达时，放弃本次仍在进行的上游请求并返回 None。
+    # 只在同一个 worker 进程内生效：多 worker 时新查询落到别的进程上，旧查询照常完成
+    if not session:
+        return await work
+    superseded = LATEST.claim(session)
+    waiter = asyncio.ensure_future(superseded.wait())
+    try:
+        done, _ = await asyncio.wait({work, waiter}, return_when=asyncio.FIRST_COMPLETED)
+        return work.result() if work in done else None
+    finally:
+        waiter.cancel()
+        if not work.done():
+            work.cancel()
+        LATEST.release(session, superseded)
+
+def _remember_titles(outcomes):
+    # 文件名由文件系统数据源的名称索引直接提供，这里只记录远程数据源的新鲜结果
+    for outcome in outcomes:
+        if outcome.status == "ok" and not isinstance(ADAPTERS_BY_NAME.get(outcome.source), FileSystemAdapter):
+            SUGGESTIONS.remember(result.title for result in outcome.results)
+
+def _server_timing(outcomes, ranking_started: float, started: float) -> str:
+    now = time.monotonic()
+    entries = [f'{re.sub(r"[^A-Za-z0-9_-]", "_", o.source)};dur={o.elapsed_ms};desc="{o.status}"' for o in outcomes]
+    entries.append(f"rank;dur={(now - ranking_started) * 1000:.1f}")
+    entries.append(f"total;dur={(now - started) * 1000:.1f}")
+    return ", ".join(entries)
+
+@router.get("/search/stream")
+async def stream_search(
+    query: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(100, ge=1, le=1000),
+    fields: Optional[str] = Query(None, max_length=100),
+    session: Optional[str] = Query(None, max_length=64),
+):
+    requested_fields = _parse_fields(fields)
+    # NDJSON：每个数据源完成后立即输出一行 {"source", "results"}（按相关度排序，最多 limit 条），最后一行为汇总 {"done": true, ...}
+    adapters = [adapter for adapter in ADAPTERS if adapter.enabled] if query.strip() else []
 
-    all_results: List[SearchResult] = []
-    for res_list in results_lists:
-        if isinstance(res_list, Exception):
-            print(f"Error during search for one adapter: {type(res_list).__name__} - {res_list}")
-            continue
-        all_results.extend(res_list)
-    return all_results
+    async def frames():
+        deadline = time.monotonic() + SEARCH_DEADLINE
+        pending = {asyncio.ensure_future(guarded_search(adapter, query, deadline, limit, requested_fields))
+                   for adapter in adapters}
+        weights = {adapter.name: adapter.rank_weight for adapter in adapters}
+        sources = {}
+        total = 0
+        # 同一 session 的新查询到达时以 {"done": true, "superseded": true} 提前结束
+        superseded = LATEST.claim(session) if session else None
+        watch = {asyncio.ensure_future(superseded.wait())} if superseded else set()
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending | watch, return_when=asyncio.FIRST_COMPLETED)
+                if done & watch:
+                    yield dumps({"done": True, "superseded": True, "total": total, "sources": sources}) + b"\n"
+                    return
+                pending -= done
+                for task in done:
+                    outcome = task.result()
+                    _remember_titles([outcome])
+                    count, top = rank_results([(outcome.results, weights[outcome.source])], query, limit)
+                    total += count
+                    sources[outcome.source] = {"status": outcome.status, "count": count, "elapsed_ms": outcome.elapsed_ms}
+                    frame = {"source": outcome.source, "status": outcome.status, "results": top}
+                    yield dumps(frame) + b"\n"
+            yield dumps({"done": True, "total": total, "sources": sources}) + b"\n"
+        finally:
+            # 客户端断开时取消仍在进行的上游请求
+            for task in pending | watch:
+                task.cancel()
+            if superseded:
+                LATEST.release(session, superseded)
+
+    return StreamingResponse(frames(), media_type="application/x-ndjson")
+
+@router.get("/suggest", response_model=List[str])
+async def suggest(query: str = Query(..., min_length=1, max_length=100), limit: int = Query(10, ge=1, le=50)):
+    # 输入联想：只查前缀索引，不访问任何上游；文件名索引带锁，放到线程里查
+    return await asyncio.to_thread(SUGGESTIONS.complete, query, limit)
+
+@router.get("/thumbnail/{source}")
+async def thumbnail(source: str, request: Request, path: str = Query(..., min_length=1, max_length=1000)):
+    adapter = ADAPTERS_BY_NAME.get(source)
+    if adapter is None or not adapter.enabled:
+        raise HTTPException(status_code=404, detail="Unknown source")
+    # path 只能是该数据源自己生成的缩略图路径：代理请求会带上数据源的凭据，不能转发到上游的任意接口
+    if adapter.thumbnail_path is None or not adapter.thumbnail_path.fullmatch(path):
+        raise HTTPException(status_code=400, detail="Invalid thumbnail path")
+    if THUMBNAILS is None:
+        return RedirectResponse(f"{adapter._thumbnail_base()}{path}")
+
+    try:
+        file_path, digest, content_type = await THUMBNAILS.get(adapter, path)
+    except Exception as e:
+        print(f"Thumbnail fetch failed for {source} {path}: {type(e).__name__} - {e}")
+        raise HTTPException(status_code=502, detail="Thumbnail unavailable")
+
+    headers = {"ETag": f'"{digest}"', "Cache-Control": f"public, max-age={THUMBNAIL_SETTINGS['max_age']}"}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(file_path, media_type=content_type, headers=headers)
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    # Prometheus 文本格式
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@router.get("/healthz")
+def healthz():
+    # 存活探针：进程能响应即可
+    return {"status": "ok"}
+
+@router.get("/readyz")
+def readyz():
+    # 就绪探针：所有启用的数据源都结束预热（成功或失败）后返回 200；
+    # 预热期间已可搜索，尚未就绪的数据源会以 warming 状态跳过
+    sources = {
+        adapter.name: {
+            "state": adapter.state,
+            "serving": adapter.enabled and adapter.serving,
+            "error": adapter.startup_error,
+            "circuit": adapter.breaker.state,
+        }
+        for adapter in ADAPTERS
+    }
+    ready = all(source["state"] != "starting" for source in sources.values())
+    return JSONResponse({"ready": ready, "sources": sources}, status_code=200 if ready else 503)
 
 @router.get("/config")
 async def get_config():
@@ -45,13 +312,49 @@ async def get_config():
                       for k, val in DATA_SOURCE_CONFIGS.items()}
     return display_config
 
-@router.get("/download/filesystem/{file_path:path}")
-def download_file(file_path: str):
-    root_path = DATA_SOURCE_CONFIGS["filesystem"]["search_path"]
+def _content_disposition(filename: str) -> str:
+    quoted = urllib.parse.quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+@router.api_route("/download/filesystem/{file_path:path}", methods=["GET", "HEAD"])
+def download_file(file_path: str, request: Request):
+    fs_config = DATA_SOURCE_CONFIGS["filesystem"]
+    root_path = os.path.abspath(fs_config["search_path"])
     abs_path = os.path.abspath(os.path.join(root_path, file_path))
     # 防止路径穿越攻击
-    if not abs_path.startswith(os.path.abspath(root_path)) or not os.path.isfile(abs_path):
+    if os.path.commonpath([root_path, abs_path]) != root_path:
+        raise HTTPException(status_code=404, detail="File not found")
+    try:
+        stat_result = os.stat(abs_path)
+    except OSError:
+        raise HTTPException(status_code=404, detail="File not found")
+    if not stat.S_ISREG(stat_result.st_mode):
         raise HTTPException(status_code=404, detail="File not found")
     filename = os.path.basename(abs_path)
-        
-    return FileResponse(abs_path, filename=filename, media_type="application/octet-stream")
\ No newline at end of file
+
+    if fs_config.get("download_mode") == "x-accel":
+        # 路径校验后交给前面的 nginx 发送文件（sendfile、Range、条件请求都由 nginx 处理）
+        rel_path = os.path.relpath(abs_path, root_path)
+        return Response(headers={
+            "X-Accel-Redirect": fs_config["x_accel_prefix"].rstrip("/") + "/" + urllib.parse.quote(rel_path),
+            "Content-Disposition": _content_disposition(filename),
+            "Content-Type": "application/octet-stream",
+        })
+
+    # 直接发送：FileResponse 处理 Range / If-Range，这里补充 If-None-Match / If-Modified-Since
+    response = FileResponse(abs_path, filename=filename, media_type="application/octet-stream", stat_result=stat_result)
+    etag = response.headers["etag"]
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        not_modified = if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]
+    else:
+        since = request.headers.get("if-modified-since")
+        try:
+            not_modified = since is not None and int(stat_result.st_mtime) <= parsedate_to_datetime(since).timestamp()
+        except (TypeError, ValueError):
+            not_modified = False
+    if not_modified:
+        return Response(status_code=304, headers={"ETag": etag, "Last-Modified": response.headers["last-modified"]})
+    return response
@@ -0,0 +1,89 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from models.search_result import SearchResult
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class ResultCache:
+    """Bounded LRU of search results keyed on the normalized query.
+
+    Entries younger than ``ttl`` are served as-is; entries within the
+    following ``stale_ttl`` seconds are served immediately while one
+    background refresh replaces them. ``ttl=None`` never expires, for sources
+    that invalidate explicitly instead. ``invalidate()`` only bumps a
+    generation counter, so it is safe to call from other threads.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: Optional[float] = 60.0, stale_ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries: "OrderedDict[str, Tuple[float, int, List[SearchResult]]]" = OrderedDict()
+        self._generation = 0
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def invalidate(self):
+        self._generation += 1
+
+    def peek(self, query: str, variant: str = "") -> Optional[List[SearchResult]]:
+        # Last known results regardless of age, used as a fallback when the source is down.
+        entry = self._entries.get(f"{normalize_query(query)}|{variant}")
+        if entry is None or entry[1] != self._generation:
+            return None
+        return entry[2]
+
+    async def get_or_fetch(self, query: str, fetch: Callable[[], Awaitable[List[SearchResult]]], variant: str = "") -> List[SearchResult]:
+        # `variant` distinguishes other request parameters (paging, projection) for the same query.
+        if self.max_entries <= 0:
+            self.misses += 1
+            return await fetch()
+        key = f"{normalize_query(query)}|{variant}"
+        entry = self._entries.get(key)
+        if entry is not None:
+            stored_at, generation, results = entry
+            age = time.monotonic() - stored_at
+            if generation == self._generation:
+                if self.ttl is None or age < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return results
+                if age < self.ttl + self.stale_ttl:
+                    self._entries.move_to_end(key)
+                    self.stale_hits += 1
+                    if key not in self._refreshing:
+                        task = asyncio.create_task(self._refresh(key, fetch))
+                        self._refreshing[key] = task
+                    return results
+            else:
+                del self._entries[key]
+        # Expired entries stay until replaced so peek() can still fall back to them.
+        self.misses += 1
+        return await self._fetch_and_store(key, fetch)
+
+    async def _refresh(self, key: str, fetch: Callable[[], Awaitable[List[SearchResult]]]):
+        try:
+            await self._fetch_and_store(key, fetch)
+        except Exception as e:
+            print(f"ResultCache: background refresh for '{key}' failed: {type(e).__name__} - {e}")
+        finally:
+            self._refreshing.pop(key, None)
+
+    async def _fetch_and_store(self, key: str, fetch: Callable[[], Awaitable[List[SearchResult]]]) -> List[SearchResult]:
+        generation = self._generation
+        results = await fetch()
+        # Drop results computed against data that changed while we were fetching.
+        if generation == self._generation:
+            self._entries[key] = (time.monotonic(), generation, results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return results
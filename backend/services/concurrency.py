@@ -0,0 +1,101 @@
+import asyncio
+from collections import Counter
+from typing import Dict, Optional
+
+import httpx
+
+
+class UpstreamLimiter:
+    """Caps concurrent upstream requests, globally and per host.
+
+    Sources on the same NAS share its host slots, so fanning out over several
+    libraries or instances queues requests instead of piling them onto one
+    box. A limit of 0 means unlimited. Time spent waiting for a slot counts
+    against the caller's search budget like any other latency.
+    """
+
+    def __init__(self, max_concurrency: int = 0, max_per_host: int = 0):
+        self.max_concurrency = max_concurrency
+        self.max_per_host = max_per_host
+        self._global = asyncio.Semaphore(max_concurrency) if max_concurrency > 0 else None
+        self._hosts: Dict[str, asyncio.Semaphore] = {}
+        self.in_flight: Counter = Counter()  # host -> requests holding a slot
+        self.waiting: Counter = Counter()  # host -> requests queued for a slot
+
+    def _host(self, host: str) -> Optional[asyncio.Semaphore]:
+        if self.max_per_host <= 0:
+            return None
+        semaphore = self._hosts.get(host)
+        if semaphore is None:
+            semaphore = self._hosts[host] = asyncio.Semaphore(self.max_per_host)
+        return semaphore
+
+    async def acquire(self, host: str):
+        # Host first: a request queued behind a busy NAS must not hold a global slot meanwhile.
+        host_slot = self._host(host)
+        self.waiting[host] += 1
+        try:
+            if host_slot is not None:
+                await host_slot.acquire()
+            if self._global is not None:
+                try:
+                    await self._global.acquire()
+                except BaseException:
+                    if host_slot is not None:
+                        host_slot.release()
+                    raise
+        finally:
+            self.waiting[host] -= 1
+        self.in_flight[host] += 1
+
+    def release(self, host: str):
+        self.in_flight[host] -= 1
+        if self._global is not None:
+            self._global.release()
+        host_slot = self._hosts.get(host)
+        if host_slot is not None:
+            host_slot.release()
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._release is not None:
+                self._release()
+                self._release = None
+
+
+class LimitedTransport(httpx.AsyncBaseTransport):
+    """Holds an UpstreamLimiter slot from sending a request until its body is closed."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, limiter: UpstreamLimiter):
+        self._transport = transport
+        self._limiter = limiter
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.netloc.decode("ascii")
+        await self._limiter.acquire(host)
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            self._limiter.release(host)
+            raise
+        if response.is_closed:
+            # Already read in full (a buffered body); nothing left to hold the slot for.
+            self._limiter.release(host)
+            return response
+        response.stream = _ReleasingStream(response.stream, lambda: self._limiter.release(host))
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
@@ -0,0 +1,32 @@
+import asyncio
+from typing import Dict
+
+
+class LatestRequests:
+    """Tracks the newest request per client session.
+
+    Claiming a session sets the event handed to the previous claimant, which
+    then cancels its upstream searches; search-as-you-type only ever needs the
+    answer to the latest keystroke.
+
+    Sessions are tracked per process. With several uvicorn workers, a newer
+    request that lands on another worker does not cancel the older one; the
+    older one simply runs to completion, as it would without a session.
+    """
+
+    def __init__(self):
+        self._latest: Dict[str, asyncio.Event] = {}
+
+    def claim(self, session: str) -> asyncio.Event:
+        previous = self._latest.get(session)
+        if previous is not None:
+            previous.set()
+        superseded = self._latest[session] = asyncio.Event()
+        return superseded
+
+    def release(self, session: str, superseded: asyncio.Event):
+        if self._latest.get(session) is superseded:
+            del self._latest[session]
+
+    def __len__(self) -> int:
+        return len(self._latest)
@@ -0,0 +1,176 @@
+import threading
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Prometheus' default buckets, in seconds.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # Per label set: [count per bucket (non-cumulative)..., sum, count]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(state)) for key, state in self._values.items())
+        lines = []
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                labels = _format_labels(self.labels + ("le",), key + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{labels} {state[-1]}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """Metric whose samples are read from live objects at scrape time, for
+    values the owning component already tracks (index sizes, cache stats)."""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str],
+                 collect: Callable[[], Iterable[Tuple[LabelValues, float]]], type: str = "gauge"):
+        super().__init__(name, documentation, labels)
+        self.collect = collect
+        self.type = type
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}" for key, value in self.collect()]
+
+
+REGISTRY: List[_Metric] = []
+
+
+def render() -> str:
+    """Render every registered metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        try:
+            samples = metric.samples()
+        except Exception as e:
+            print(f"metrics: failed to collect {metric.name}: {e}")
+            continue
+        lines.extend(metric.header())
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+
+SEARCH_DURATION = Histogram(
+    "anticlockwise_search_duration_seconds",
+    "Time each source took to answer a search, including cache and mirror hits.",
+    ["source"],
+)
+UPSTREAM_SEARCH_DURATION = Histogram(
+    "anticlockwise_upstream_search_duration_seconds",
+    "Time spent in searches that were not served from the cache or mirror.",
+    ["source"],
+)
+SEARCH_OUTCOMES = Counter(
+    "anticlockwise_search_total",
+    "Searches per source by outcome (ok, degraded, timeout, error, skipped, warming).",
+    ["source", "status"],
+)
+SEARCH_RESULTS = Counter(
+    "anticlockwise_search_results_total",
+    "Results returned per source.",
+    ["source"],
+)
+SEARCH_COALESCED = Counter(
+    "anticlockwise_search_coalesced_total",
+    "Searches that joined an identical upstream search already in flight instead of sending their own.",
+    ["source"],
+)
+UPSTREAM_BYTES = Counter(
+    "anticlockwise_upstream_response_bytes_total",
+    "Response body bytes received from each upstream.",
+    ["source"],
+)
+INDEX_BUILD_SECONDS = Gauge(
+    "anticlockwise_filesystem_index_build_seconds",
+    "Duration of the last filesystem index build, by phase (scan, snapshot, reconcile).",
+    ["phase"],
+)
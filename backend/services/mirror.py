@@ -0,0 +1,98 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from indexing.pinyin import VariantIndex
+from indexing.trigram import TrigramIndex
+from models.search_result import SearchResult
+
+# Upstream clocks may drift from ours; re-fetch a little before the last sync.
+WATERMARK_SKEW = timedelta(minutes=5)
+# Only the start of long descriptions is indexed, which bounds the gram count per item.
+TEXT_CHARS = 2000
+
+
+def _text(result: SearchResult) -> str:
+    return " ".join(part for part in (result.author, result.description) if part)[:TEXT_CHARS]
+
+
+class CatalogMirror:
+    """Local copy of a remote source's catalog, searched by title, author and description.
+
+    Full syncs rebuild the copy off to the side and swap it in; incremental
+    syncs upsert items the adapter reports as modified since the last
+    watermark. Deletions are only picked up by the periodic full sync.
+    """
+
+    def __init__(self, adapter, interval: float = 900.0, max_age: float = 3600.0, full_sync_interval: float = 86400.0):
+        self.adapter = adapter
+        self.interval = interval
+        self.max_age = max_age
+        self.full_sync_interval = full_sync_interval
+        self.items: Dict[str, SearchResult] = {}
+        self.titles = TrigramIndex()
+        self.variants = VariantIndex()  # pinyin / simplified forms of Chinese titles
+        self.texts = TrigramIndex()  # author and description
+        self.synced_at: Optional[float] = None
+        self.full_synced_at: Optional[float] = None
+        self.watermark: Optional[datetime] = None
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def is_fresh(self) -> bool:
+        return self.synced_at is not None and time.monotonic() - self.synced_at < self.max_age
+
+    def search(self, query: str, limit: Optional[int] = None, offset: int = 0) -> List[SearchResult]:
+        # Title matches rank first, then pinyin / simplified title forms, then author and description.
+        items = self.items
+        wanted = None if limit is None else offset + limit
+        keys = self.titles.search(query, wanted)
+        seen = set(keys)
+        for index in (self.variants, self.texts):
+            if wanted is not None and len(keys) >= wanted:
+                break
+            for key in index.search(query, wanted):
+                if key not in seen:
+                    seen.add(key)
+                    keys.append(key)
+        return [items[key] for key in keys[offset:wanted] if key in items]
+
+    async def sync(self):
+        started = time.monotonic()
+        sync_started = datetime.now(timezone.utc)
+        full = (not self.adapter.mirror_incremental or self.watermark is None or self.full_synced_at is None
+                or started - self.full_synced_at >= self.full_sync_interval)
+        since = None if full else self.watermark
+
+        if full:
+            items: Dict[str, SearchResult] = {}
+            titles, variants, texts = TrigramIndex(), VariantIndex(), TrigramIndex()
+        else:
+            items, titles, variants, texts = self.items, self.titles, self.variants, self.texts
+        count = 0
+        async for page in self.adapter.fetch_catalog(since):
+            for result in page:
+                items[result.id] = result
+                titles.add(result.id, result.title)
+                variants.add(result.id, result.title)
+                texts.add(result.id, _text(result))
+                count += 1
+        if full:
+            self.items, self.titles, self.variants, self.texts = items, titles, variants, texts
+            self.full_synced_at = started
+        self.watermark = sync_started - WATERMARK_SKEW
+        self.synced_at = time.monotonic()
+        print(f"{self.adapter.name}: mirror {'full' if full else 'incremental'} sync fetched {count} items "
+              f"in {self.synced_at - started:.1f}s ({len(self.items)} mirrored)")
+
+    async def run(self):
+        while True:
+            try:
+                await self.sync()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"{self.adapter.name}: mirror sync failed: {type(e).__name__} - {e}")
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,105 @@
+import heapq
+import math
+from typing import Iterable, List, Tuple
+
+from indexing.pinyin import has_han, variant_query, variant_text
+from models.search_filters import SearchFilters
+from models.search_result import SearchResult
+from services.cache import normalize_query
+
+# BM25 parameters and per-field weights; titles matter more than descriptions.
+K1 = 1.2
+B = 0.75
+TITLE_WEIGHT = 2.0
+DESCRIPTION_WEIGHT = 1.0
+EXACT_TITLE_BONUS = 3.0
+PREFIX_TITLE_BONUS = 1.0
+
+
+def query_terms(query: str) -> List[str]:
+    # Substring terms rather than tokens, so unsegmented CJK titles still score.
+    return list(dict.fromkeys(normalize_query(query).split()))
+
+
+def _bm25(tf: int, length: int, avg_length: float) -> float:
+    if tf == 0:
+        return 0.0
+    return tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / avg_length))
+
+
+def rank_results(batches: Iterable[Tuple[List[SearchResult], float]], query: str, k: int) -> Tuple[int, List[SearchResult]]:
+    """Score results from every source on the same scale and keep the best k.
+
+    ``batches`` pairs each source's results with that source's weight. IDF
+    is computed over the merged candidate pool. Returns the pool size and
+    the top k, best first; ties keep source order.
+    """
+    terms = query_terms(query)
+    # Chinese titles also match a term through their pinyin or simplified forms
+    # (cached per title), e.g. "santi" or "三体" for "三體".
+    variant_terms = {term: variant_query(term) for term in terms}
+    normalized = normalize_query(query)
+    docs = []
+    df = dict.fromkeys(terms, 0)
+    title_total = description_total = 0
+    for results, weight in batches:
+        for result in results:
+            title = result.title.lower()
+            description = (result.description or "").lower()
+            variants = variant_text(result.title) if has_han(result.title) else ""
+            docs.append((result, weight, title, description, variants))
+            title_total += len(title)
+            description_total += len(description)
+            for term in terms:
+                variant = variant_terms[term]
+                if term in title or term in description or (variant and variant in variants):
+                    df[term] += 1
+
+    total = len(docs)
+    if total == 0 or k <= 0:
+        return total, []
+    avg_title = max(title_total / total, 1.0)
+    avg_description = max(description_total / total, 1.0)
+    idf = {term: math.log(1 + (total - n + 0.5) / (n + 0.5)) for term, n in df.items()}
+
+    def scored():
+        for seq, (result, weight, title, description, variants) in enumerate(docs):
+            score = 0.0
+            for term in terms:
+                tf = title.count(term)
+                if not tf and variant_terms[term]:
+                    tf = variants.count(variant_terms[term])
+                score += idf[term] * (
+                    TITLE_WEIGHT * _bm25(tf, len(title), avg_title)
+                    + DESCRIPTION_WEIGHT * _bm25(description.count(term), len(description), avg_description)
+                )
+            if title == normalized:
+                score += EXACT_TITLE_BONUS
+            elif title.startswith(normalized):
+                score += PREFIX_TITLE_BONUS
+            yield score * weight, -seq, result
+
+    # nlargest keeps a heap of size k instead of sorting the whole pool.
+    top = heapq.nlargest(k, scored(), key=lambda item: (item[0], item[1]))
+    return total, [result for _, _, result in top]
+
+
+_SORT_FIELDS = {
+    "name": lambda result: result.title.lower(),
+    "size": lambda result: result.size,
+    "modified": lambda result: result.modified,
+}
+
+
+def sort_results(batches: Iterable[Tuple[List[SearchResult], float]], filters: SearchFilters, k: int) -> Tuple[int, List[SearchResult]]:
+    """Order the merged pool by a metadata field instead of relevance.
+
+    Results without the field (it was not requested, or the source has no
+    such metadata) follow in their source's order.
+    """
+    key = _SORT_FIELDS[filters.sort]
+    pool = [result for results, _ in batches for result in results]
+    present = [result for result in pool if key(result) is not None]
+    missing = [result for result in pool if key(result) is None]
+    present.sort(key=key, reverse=filters.descending)
+    return len(pool), (present + missing)[:k]
@@ -0,0 +1,115 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import FrozenSet, List, Optional
+
+from models.search_result import SearchResult
+from services.metrics import SEARCH_DURATION, SEARCH_OUTCOMES, SEARCH_RESULTS
+
+
+class CircuitBreaker:
+    """Per-source breaker: opens after ``failure_threshold`` consecutive
+    failures, then lets a single background probe decide when to close."""
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe: Optional[asyncio.Task] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self._probe is not None and not self._probe.done():
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        return self.opened_at is None
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.failure_threshold and self.opened_at is None:
+            self.opened_at = time.monotonic()
+
+    def maybe_probe(self, adapter):
+        if self.opened_at is None or self.state == "half-open":
+            return
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return
+        self._probe = asyncio.create_task(self._run_probe(adapter))
+
+    async def _run_probe(self, adapter):
+        try:
+            await asyncio.wait_for(adapter.probe(), adapter.timeout)
+        except Exception as e:
+            print(f"{adapter.name}: health probe failed ({type(e).__name__}), keeping circuit open.")
+            self.opened_at = time.monotonic()
+        else:
+            print(f"{adapter.name}: health probe succeeded, closing circuit.")
+            self.record_success()
+
+
+@dataclass
+class SearchOutcome:
+    source: str
+    status: str  # ok | degraded | timeout | error | skipped | warming
+    results: List[SearchResult] = field(default_factory=list)
+    elapsed_ms: int = 0
+
+
+async def guarded_search(adapter, query: str, deadline: float, limit: Optional[int] = None,
+                         fields: Optional[FrozenSet[str]] = None, filters=None) -> SearchOutcome:
+    """Run one adapter within min(its own budget, the time left before the
+    global deadline). When the source is skipped, times out or fails, the
+    last cached results for the query are returned as ``degraded`` if any."""
+    started = time.monotonic()
+    breaker = adapter.breaker
+
+    def outcome(status: str, results: Optional[List[SearchResult]] = None) -> SearchOutcome:
+        if status != "ok" and results is None:
+            stale = adapter.peek_cached(query, limit, 0, fields, filters)
+            if stale is not None:
+                status, results = "degraded", stale
+        elapsed = time.monotonic() - started
+        results = results or []
+        if status != "skipped":
+            SEARCH_DURATION.observe(elapsed, source=adapter.name)
+        SEARCH_OUTCOMES.inc(source=adapter.name, status=status)
+        SEARCH_RESULTS.inc(len(results), source=adapter.name)
+        return SearchOutcome(adapter.name, status, results, round(elapsed * 1000))
+
+    if not adapter.serving:
+        return outcome("warming")
+    if not breaker.allow():
+        breaker.maybe_probe(adapter)
+        return outcome("skipped")
+
+    budget = min(adapter.timeout, deadline - started)
+    if budget <= 0:
+        return outcome("timeout")
+    try:
+        results = await asyncio.wait_for(adapter.cached_search(query, limit, 0, fields, filters), budget)
+    except asyncio.TimeoutError:
+        breaker.record_failure()
+        print(f"{adapter.name}: search timed out after {budget:.1f}s")
+        return outcome("timeout")
+    except Exception as e:
+        breaker.record_failure()
+        print(f"Error during search for {adapter.name}: {type(e).__name__} - {e}")
+        return outcome("error")
+    breaker.record_success()
+    # A source whose warm-up failed becomes ready as soon as it answers a search.
+    if not adapter.ready:
+        adapter.ready, adapter.startup_error = True, None
+    return outcome("ok", results)
+
+
+def format_statuses(outcomes: List[SearchOutcome]) -> str:
+    return ", ".join(f"{o.source}={o.status}" for o in outcomes)
@@ -0,0 +1,93 @@
+import gzip
+import importlib.util
+from dataclasses import fields
+from typing import Iterable, List, Optional
+
+import pydantic_core
+from fastapi import Request, Response
+
+from models.search_result import SearchResult
+
+# orjson encodes dataclasses natively and is several times faster. It is a
+# backend dependency; an install without it uses pydantic-core's encoder
+# (always installed with FastAPI).
+if importlib.util.find_spec("orjson") is not None:
+    import orjson
+
+    ENCODER = "orjson"
+
+    def dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+else:
+    ENCODER = "pydantic-core"
+
+    def dumps(obj) -> bytes:
+        return pydantic_core.to_json(obj)
+
+# Brotli is a backend dependency too; without it only gzip is offered.
+if importlib.util.find_spec("brotli") is not None:
+    import brotli
+else:
+    brotli = None
+
+RESULT_FIELDS = [f.name for f in fields(SearchResult)]
+COMPRESS_MIN_BYTES = 1024
+
+
+def to_columns(results: List[SearchResult]) -> dict:
+    """Column-oriented form of `results`: one array per field, skipping fields
+    that are null in every result. Field names are sent once instead of once
+    per result, and repeated values (source, type) compress well."""
+    columns = {}
+    for name in RESULT_FIELDS:
+        column = [getattr(result, name) for result in results]
+        if any(value is not None for value in column):
+            columns[name] = column
+    return {"count": len(results), "columns": columns}
+
+
+def _accepted(header: str) -> Iterable[str]:
+    # Codings from an Accept-Encoding header, minus those explicitly refused with q=0.
+    for part in header.split(","):
+        coding, *params = part.split(";")
+        q = 1.0
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            yield coding.strip().lower()
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    accepted = set(_accepted(accept_encoding or ""))
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: Optional[str]) -> bytes:
+    # Low levels: most of the size win for a fraction of the CPU of the maximum.
+    if encoding == "br":
+        return brotli.compress(body, quality=4)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=5)
+    return body
+
+
+def json_response(request: Request, payload, headers: Optional[dict] = None) -> Response:
+    """Encode `payload` once and compress it if the client accepts br or gzip."""
+    body = dumps(payload)
+    headers = dict(headers or {})
+    headers["Vary"] = "Accept-Encoding"
+    if len(body) >= COMPRESS_MIN_BYTES:
+        encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+        if encoding is not None:
+            body = compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+    return Response(body, media_type="application/json", headers=headers)
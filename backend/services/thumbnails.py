@@ -0,0 +1,141 @@
+import asyncio
+import hashlib
+import importlib.util
+import io
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+
+class ThumbnailStore:
+    """Size-bounded, content-addressed thumbnail cache on disk.
+
+    Blobs are stored once per SHA-256 of their bytes under ``blobs/``; a small
+    SQLite table maps each request key to its blob and last access time, and
+    the least recently used keys are evicted once the blobs exceed
+    ``max_bytes``. All methods block and are meant to run in a worker thread.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, ttl: float):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        os.makedirs(os.path.join(directory, "blobs"), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, "thumbnails.db"), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, digest TEXT NOT NULL, "
+            "content_type TEXT NOT NULL, size INTEGER NOT NULL, fetched_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+        self._db.commit()
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.directory, "blobs", digest[:2], digest)
+
+    def get(self, key: str) -> Optional[Tuple[str, str]]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT digest, content_type, fetched_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            digest, content_type, fetched_at = row
+            if now - fetched_at > self.ttl or not os.path.isfile(self.blob_path(digest)):
+                return None
+            self._db.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            self._db.commit()
+        return digest, content_type
+
+    def put(self, key: str, content: bytes, content_type: str) -> str:
+        digest = hashlib.sha256(content).hexdigest()
+        path = self.blob_path(digest)
+        if not os.path.isfile(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                             (key, digest, content_type, len(content), now, now))
+            self._db.commit()
+            self._evict(keep=key)
+        return digest
+
+    def _evict(self, keep: str):
+        # Sizes are counted per distinct blob, since identical images share one file.
+        # The entry just written is never evicted, even if it alone exceeds the budget.
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM (SELECT MAX(size) AS size FROM entries GROUP BY digest)").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, digest, size in self._db.execute("SELECT key, digest, size FROM entries ORDER BY accessed_at").fetchall():
+            if key == keep:
+                continue
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            if self._db.execute("SELECT 1 FROM entries WHERE digest = ? LIMIT 1", (digest,)).fetchone() is None:
+                try:
+                    os.remove(self.blob_path(digest))
+                except OSError:
+                    pass
+                total -= size
+                if total <= self.max_bytes:
+                    break
+        self._db.commit()
+
+
+def _downscale(content: bytes, content_type: str, max_size: int) -> Tuple[bytes, str]:
+    from PIL import Image
+
+    with Image.open(io.BytesIO(content)) as image:
+        if max(image.size) <= max_size:
+            return content, content_type
+        image.thumbnail((max_size, max_size))
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        out = io.BytesIO()
+        image.save(out, format="JPEG", quality=85)
+    return out.getvalue(), "image/jpeg"
+
+
+class ThumbnailProxy:
+    """Fetches thumbnails through the owning adapter and caches them in a
+    ThumbnailStore; concurrent requests for the same image share one fetch."""
+
+    def __init__(self, store: ThumbnailStore, max_size: int = 0):
+        self.store = store
+        self.max_size = max_size
+        if max_size and importlib.util.find_spec("PIL") is None:
+            print("ThumbnailProxy: THUMBNAIL_MAX_SIZE is set but Pillow is not installed, serving original sizes.")
+            self.max_size = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def get(self, adapter, path: str) -> Tuple[str, str, str]:
+        key = f"{adapter.name}:{self.max_size}:{path}"
+        cached = await asyncio.to_thread(self.store.get, key)
+        if cached is not None:
+            digest, content_type = cached
+            return self.store.blob_path(digest), digest, content_type
+
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch(adapter, path, key))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield() so one client disconnecting doesn't cancel the fetch the others are waiting on.
+        digest, content_type = await asyncio.shield(future)
+        return self.store.blob_path(digest), digest, content_type
+
+    async def _fetch(self, adapter, path: str, key: str) -> Tuple[str, str]:
+        response = await adapter.fetch_thumbnail(path)
+        response.raise_for_status()
+        content_type = response.headers.get("Content-Type", "application/octet-stream").split(";")[0]
+        if not content_type.startswith("image/"):
+            raise ValueError(f"upstream returned {content_type}, not an image")
+        content = response.content
+        if self.max_size:
+            content, content_type = await asyncio.to_thread(_downscale, content, content_type, self.max_size)
+        digest = await asyncio.to_thread(self.store.put, key, content, content_type)
+        return digest, content_type
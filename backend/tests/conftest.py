@@ -0,0 +1,6 @@
+import os
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Tests import backend modules the way the app does, and reuse the benchmark stubs.
+sys.path[:0] = [BACKEND, os.path.join(BACKEND, "benchmarks")]
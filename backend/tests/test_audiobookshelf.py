@@ -0,0 +1,34 @@
+import asyncio
+
+from adapters.audiobookshelf import AudiobookshelfAdapter
+from stub_upstreams import StubSettings, start_stubs
+
+
+def test_search_merges_libraries_and_tolerates_a_failing_one():
+    server, base_url = start_stubs(StubSettings(latency=0, items=3, libraries=3, broken_libraries=1))
+    adapter = AudiobookshelfAdapter({
+        "enabled": True,
+        "api_base_url": f"{base_url}/abs/api",
+        "web_base_url": f"{base_url}/abs",
+        "username": "bench",
+        "password": "bench",
+        "timeout": 5.0,
+        "cache_max_entries": 0,
+    })
+
+    async def scenario():
+        results = await adapter.search("dune", limit=10)
+        await adapter.shutdown()
+        return results
+
+    try:
+        results = asyncio.run(scenario())
+    finally:
+        server.shutdown()
+    assert adapter.libraries == [("lib1", "Library 1"), ("lib2", "Library 2"), ("lib3", "Library 3")]
+    # The two working libraries are interleaved rank by rank; the failing third is left out.
+    assert [(r.id, r.library) for r in results] == [
+        ("abs1-0", "Library 1"), ("abs2-0", "Library 2"),
+        ("abs1-1", "Library 1"), ("abs2-1", "Library 2"),
+        ("abs1-2", "Library 1"), ("abs2-2", "Library 2"),
+    ]
@@ -0,0 +1,84 @@
+import asyncio
+
+from models.search_result import SearchResult
+from services.cache import ResultCache
+
+
+def _results(tag):
+    return [SearchResult(id=tag, source="test", title=tag, detail_url=f"/{tag}")]
+
+
+class Upstream:
+    def __init__(self):
+        self.calls = 0
+
+    async def fetch(self):
+        self.calls += 1
+        return _results(f"v{self.calls}")
+
+
+def test_fresh_entries_are_served_from_the_cache():
+    cache = ResultCache(ttl=60.0)
+    upstream = Upstream()
+
+    async def scenario():
+        first = await cache.get_or_fetch("Dune  Messiah", upstream.fetch)
+        second = await cache.get_or_fetch("dune messiah", upstream.fetch)  # same normalized query
+        other_page = await cache.get_or_fetch("dune messiah", upstream.fetch, variant="10:10:*")
+        return first, second, other_page
+
+    first, second, other_page = asyncio.run(scenario())
+    assert first == second == _results("v1")
+    assert other_page == _results("v2")
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_stale_entries_are_served_while_one_refresh_runs():
+    cache = ResultCache(ttl=0.0, stale_ttl=60.0)
+    upstream = Upstream()
+
+    async def scenario():
+        await cache.get_or_fetch("dune", upstream.fetch)
+        stale = [await cache.get_or_fetch("dune", upstream.fetch) for _ in range(3)]
+        await asyncio.gather(*cache._refreshing.values())
+        return stale, cache.peek("dune")
+
+    stale, refreshed = asyncio.run(scenario())
+    assert stale == [_results("v1")] * 3
+    assert upstream.calls == 2  # one background refresh for three stale hits
+    assert refreshed == _results("v2")
+    assert cache.stale_hits == 3
+
+
+def test_invalidate_drops_entries_and_results_fetched_across_it():
+    cache = ResultCache(ttl=None)
+    upstream = Upstream()
+
+    async def invalidated_midway():
+        results = await upstream.fetch()
+        cache.invalidate()
+        return results
+
+    async def scenario():
+        await cache.get_or_fetch("dune", upstream.fetch)
+        cache.invalidate()
+        assert cache.peek("dune") is None
+        await cache.get_or_fetch("dune", invalidated_midway)
+        assert cache.peek("dune") is None  # computed against data that changed meanwhile
+        return await cache.get_or_fetch("dune", upstream.fetch)
+
+    assert asyncio.run(scenario()) == _results("v3")
+    assert cache.misses == 3
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ResultCache(max_entries=2, ttl=None)
+    upstream = Upstream()
+
+    async def scenario():
+        for query in ("a", "b", "a", "c"):
+            await cache.get_or_fetch(query, upstream.fetch)
+
+    asyncio.run(scenario())
+    assert cache.peek("a") is not None and cache.peek("c") is not None
+    assert cache.peek("b") is None
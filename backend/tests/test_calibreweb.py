@@ -0,0 +1,99 @@
+import asyncio
+import time
+
+import httpx
+
+from adapters.calibreweb import CalibreWebAdapter
+from services.resilience import guarded_search
+from stub_upstreams import StubSettings, start_stubs
+
+
+def test_breaker_recovers_through_web_base_url():
+    settings = StubSettings(latency=0, items=5, failure_rate=1.0)
+    server, base_url = start_stubs(settings)
+    adapter = CalibreWebAdapter({
+        "enabled": True,
+        # The shipped default: CalibreWeb has no separate API host.
+        "api_base_url": "http://your-calibreweb-ip:8083/api",
+        "web_base_url": f"{base_url}/calibre",
+        "username": "bench",
+        "password": "bench",
+        "search_mode": "opds",
+        "timeout": 5.0,
+        "breaker_failure_threshold": 2,
+        "breaker_reset_timeout": 0.0,
+        "cache_max_entries": 0,
+    })
+
+    async def scenario():
+        for _ in range(2):
+            assert (await guarded_search(adapter, "dune", time.monotonic() + 10)).status == "error"
+        assert adapter.breaker.state == "open"
+
+        settings.failure_rate = 0.0
+        assert (await guarded_search(adapter, "dune", time.monotonic() + 10)).status == "skipped"
+        await adapter.breaker._probe
+        assert adapter.breaker.state == "closed"
+        outcome = await guarded_search(adapter, "dune", time.monotonic() + 10)
+        await adapter.shutdown()
+        return outcome
+
+    try:
+        outcome = asyncio.run(scenario())
+    finally:
+        server.shutdown()
+    assert outcome.status == "ok"
+    assert outcome.results
+
+
+def _adapter_with(routes):
+    # routes: path -> (status, body, content type); everything else answers 404.
+    from bench_calibre_parse import synthetic_html, synthetic_opds
+
+    def handle(request):
+        path = request.url.path
+        if path == "/login" and request.method == "POST":
+            return httpx.Response(302, headers={"Location": "http://calibre.test/"})
+        if path == "/login":
+            return httpx.Response(200, text='<input name="csrf_token" value="t">', headers={"Content-Type": "text/html"})
+        if path == "/":
+            return httpx.Response(200, text="<html></html>", headers={"Content-Type": "text/html"})
+        if path == "/search":
+            return httpx.Response(200, text=synthetic_html(3), headers={"Content-Type": "text/html"})
+        if path.startswith("/opds/search/"):
+            status, content_type = routes["opds"]
+            body = synthetic_opds(3) if status == 200 else b"error"
+            return httpx.Response(status, content=body, headers={"Content-Type": content_type})
+        return httpx.Response(404)
+
+    adapter = CalibreWebAdapter({"enabled": True, "web_base_url": "http://calibre.test", "search_mode": "auto"})
+    adapter._http = httpx.AsyncClient(transport=httpx.MockTransport(handle), follow_redirects=True)
+    return adapter
+
+
+def test_auto_mode_retries_opds_after_transient_errors():
+    routes = {"opds": (503, "text/plain")}
+    adapter = _adapter_with(routes)
+
+    async def scenario():
+        first = await adapter.search("dune", 2)
+        assert adapter._opds_retry_at > time.monotonic()
+        routes["opds"] = (200, "application/atom+xml")
+        second = await adapter.search("dune", 2)  # still cooling down: HTML again
+        adapter._opds_retry_at = 0.0
+        third = await adapter.search("dune", 2)
+        return first, second, third
+
+    first, second, third = asyncio.run(scenario())
+    assert len(first) == len(second) == len(third) == 2
+    assert adapter.search_mode == "auto"
+
+
+def test_auto_mode_switches_to_html_without_a_feed():
+    adapter = _adapter_with({"opds": (404, "text/plain")})
+    assert len(asyncio.run(adapter.search("dune", 2))) == 2
+    assert adapter.search_mode == "html"
+
+    adapter = _adapter_with({"opds": (200, "text/html")})
+    assert len(asyncio.run(adapter.search("dune", 2))) == 2
+    assert adapter.search_mode == "html"
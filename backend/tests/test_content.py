@@ -0,0 +1,30 @@
+import sqlite3
+
+from indexing.content import ContentIndex
+
+
+def test_read_only_instance_counts_files_from_the_database(tmp_path):
+    path = str(tmp_path / "content.db")
+    assert ContentIndex(path, str(tmp_path), readonly=True).count() == 0  # no database yet
+
+    leader = ContentIndex(path, str(tmp_path))
+    conn = sqlite3.connect(path)
+    with conn:
+        leader._write(conn, "notes.txt", 1.0, 10, "meeting notes")
+        leader._write(conn, "broken.pdf", 1.0, 20, None)
+    conn.close()
+
+    follower = ContentIndex(path, str(tmp_path), readonly=True)
+    assert leader.count() == follower.count() == 2
+
+
+def test_content_index_stores_non_utf8_paths(tmp_path):
+    rel_path = b"r\xe9sum\xe9.txt".decode("utf-8", "surrogateescape")
+    index = ContentIndex(str(tmp_path / "content.db"), str(tmp_path))
+    conn = sqlite3.connect(index.path)
+    with conn:
+        index._write(conn, rel_path, 1.0, 10, "quarterly planning notes")
+    conn.close()
+
+    assert [path for path, _ in index.search("planning", 10)] == [rel_path]
+    assert ContentIndex(index.path, str(tmp_path))._fingerprints == {rel_path: (1.0, 10)}
@@ -0,0 +1,71 @@
+import os
+import random
+
+from indexing.filestore import FileStore, extension
+from models.search_filters import SearchFilters
+
+
+def _random_path(rng):
+    depth = rng.randint(0, 3)
+    parts = [f"d{rng.randrange(5)}" for _ in range(depth)]
+    return os.path.join(*parts, f"f{rng.randrange(4000)}.{rng.choice(['pdf', 'mkv', 'txt', 'PDF'])}")
+
+
+def test_store_matches_a_dict_through_puts_removes_and_compaction():
+    rng = random.Random(3)
+    store = FileStore()
+    expected = {}
+    for _ in range(20000):
+        roll = rng.random()
+        if expected and roll < 0.4:
+            rel_path = rng.choice(list(expected))
+            assert store.remove(rel_path)
+            del expected[rel_path]
+        else:
+            # Some puts update an existing file in place.
+            rel_path = rng.choice(list(expected)) if expected and roll < 0.5 else _random_path(rng)
+            stat = (rng.uniform(0, 1e9), rng.randrange(1 << 40))
+            store.put(rel_path, *stat)
+            expected[rel_path] = stat
+    assert not store.remove("missing/file.txt")
+    assert len(store) == len(expected)
+    assert dict(store.items()) == expected
+    assert sorted(store) == sorted(expected)
+    for rel_path, stat in expected.items():
+        assert store.get(rel_path) == stat
+    assert sorted(store.paths_under(["d1"])) == sorted(p for p in expected if p.startswith("d1" + os.sep))
+
+
+def test_select_filters_and_sorts_like_a_scan():
+    rng = random.Random(5)
+    entries = {_random_path(rng): (float(rng.randrange(1000)), rng.randrange(10000)) for _ in range(3000)}
+    store = FileStore((rel_path, mtime, size) for rel_path, (mtime, size) in entries.items())
+    candidates = list(entries)[::2] + ["not/indexed.pdf"]
+
+    filters = SearchFilters(extensions=frozenset({"pdf"}), min_size=5000, modified_after=500.0,
+                            sort="size", descending=True)
+    kept = [p for p in candidates if p in entries and extension(p) == "pdf"
+            and entries[p][1] >= 5000 and entries[p][0] > 500.0]
+    assert store.select(candidates, filters) == sorted(kept, key=lambda p: entries[p][1], reverse=True)
+
+    relevance = SearchFilters(min_size=9000)
+    assert store.select(candidates, relevance) == [p for p in candidates if p in entries and entries[p][1] >= 9000]
+    assert store.select(candidates, SearchFilters(extensions=frozenset({"iso"}))) == []
+
+
+def test_copy_is_independent():
+    store = FileStore([("a/one.txt", 1.0, 1)])
+    copy = store.copy()
+    store.put("a/two.txt", 2.0, 2)
+    store.put("a/one.txt", 3.0, 3)
+    copy.remove("a/one.txt")
+    assert dict(copy.items()) == {}
+    assert dict(store.items()) == {"a/one.txt": (3.0, 3), "a/two.txt": (2.0, 2)}
+
+
+def test_non_utf8_names():
+    rel_path = b"d/r\xe9sum\xe9.pdf".decode("utf-8", "surrogateescape")
+    store = FileStore([(rel_path, 1.0, 10)])
+    assert store.get(rel_path) == (1.0, 10)
+    assert list(store) == [rel_path]
+    assert store.remove(rel_path) and len(store) == 0
@@ -0,0 +1,28 @@
+import os
+
+from adapters.filesystem import FileSystemAdapter
+
+
+def _adapter(root, snapshot_path):
+    return FileSystemAdapter({"enabled": True, "search_path": str(root), "index_snapshot_path": str(snapshot_path)})
+
+
+def test_non_utf8_file_names_are_indexed_and_snapshotted(tmp_path):
+    root = tmp_path / "root"
+    root.mkdir()
+    # A Latin-1 name, which os.scandir returns with surrogate escapes.
+    with open(os.path.join(os.fsencode(root), b"r\xe9sum\xe9.txt"), "w") as f:
+        f.write("notes")
+    (root / "plain.txt").write_text("notes")
+    rel_path = b"r\xe9sum\xe9.txt".decode("utf-8", "surrogateescape")
+
+    built = _adapter(root, tmp_path / "index.db")
+    built._initialize()
+    assert built.serving
+    assert built.name_index.search("sum") == [rel_path]
+    assert os.path.isfile(tmp_path / "index.db")
+
+    loaded = _adapter(root, tmp_path / "index.db")
+    assert loaded._load_snapshot()
+    assert sorted(loaded.files) == sorted([rel_path, "plain.txt"])
+
@@ -0,0 +1,46 @@
+import asyncio
+
+from adapters.base import DataSourceAdapter
+from models.search_result import SearchResult
+
+
+class CatalogAdapter(DataSourceAdapter):
+    name = "Catalog"
+    supports_mirror = True
+
+    async def fetch_catalog(self, since=None):
+        yield [
+            SearchResult(id="1", source=self.name, title="Dune", detail_url="/1", author="Frank Herbert",
+                         description="Desert planet epic", thumbnail_url="/1.jpg", type="Book"),
+            SearchResult(id="2", source=self.name, title="Children of Dune", detail_url="/2", author="Frank Herbert",
+                         thumbnail_url="/2.jpg", type="Book"),
+            SearchResult(id="3", source=self.name, title="Foundation", detail_url="/3", author="Isaac Asimov",
+                         description="A galactic empire falls; Dune is not involved", type="Book"),
+        ]
+
+    async def search(self, query, limit=None, offset=0, fields=None):
+        raise AssertionError("a fresh mirror should answer without a live search")
+
+
+def test_mirror_matches_author_and_description_and_projects_fields():
+    adapter = CatalogAdapter({"enabled": True, "mirror_enabled": True})
+
+    async def scenario():
+        await adapter.mirror.sync()
+        by_title = await adapter.cached_search("dune")
+        by_author = await adapter.cached_search("asimov")
+        by_text = await adapter.cached_search("desert")
+        projected = await adapter.cached_search("herbert", fields=frozenset({"author"}))
+        return by_title, by_author, by_text, projected
+
+    by_title, by_author, by_text, projected = asyncio.run(scenario())
+    # Title matches come before the description mentioning the query.
+    assert [r.id for r in by_title] == ["1", "2", "3"]
+    assert [r.id for r in by_author] == ["3"]
+    assert [r.id for r in by_text] == ["1"]
+    assert [(r.id, r.author, r.description, r.thumbnail_url, r.type) for r in projected] == [
+        ("1", "Frank Herbert", None, None, None),
+        ("2", "Frank Herbert", None, None, None),
+    ]
+    # The mirrored items themselves keep every field.
+    assert adapter.mirror.items["1"].description == "Desert planet epic"
@@ -0,0 +1,77 @@
+import threading
+
+from indexing.filestore import FileStore
+from indexing.shared import SharedIndexPublisher, SharedIndexReader, serialize
+from indexing.trigram import TrigramIndex
+from models.search_filters import SearchFilters
+from bench_name_index import synthetic_paths
+
+
+def _publish(tmp_path, names, files=None):
+    SharedIndexPublisher(str(tmp_path)).publish(serialize(names.export(), files))
+    reader = SharedIndexReader(str(tmp_path))
+    assert reader.refresh()
+    return reader
+
+
+def test_published_index_answers_like_the_live_one(tmp_path):
+    entries = list(synthetic_paths(2000))
+    names = TrigramIndex(entries)
+    names.track_order()
+    files = FileStore((rel_path, float(i), i) for i, (rel_path, _) in enumerate(entries))
+    for rel_path, _ in entries[::7]:
+        names.remove(rel_path)
+        files.remove(rel_path)
+    reader = _publish(tmp_path, names, files)
+
+    assert len(reader) == len(names)
+    for query in ("photo", "_20", "ab", "x", "zzzz"):
+        assert reader.search(query) == names.search(query)
+    assert reader.complete("re", 50) == names.prefix("re", 50)
+    rel_path = entries[1][0]
+    assert reader.get(rel_path) == files.get(rel_path) == (1.0, 1)
+    assert reader.get(entries[0][0]) is None
+    filters = SearchFilters(sort="size", descending=True)
+    candidates = names.search("a")
+    assert reader.select(candidates, filters) == (files.select(candidates, filters), [])
+
+
+def test_inserts_during_serialization_do_not_corrupt_the_file(tmp_path):
+    names = TrigramIndex(synthetic_paths(20000))
+    exported = names.export()
+    stop = threading.Event()
+
+    def insert():
+        # Without the index lock, as the adapter's event batches run while it encodes.
+        for i, (rel_path, name) in enumerate(synthetic_paths(10 ** 6, seed=1)):
+            if stop.is_set():
+                break
+            names.add(f"new/{i}/{rel_path}", name)
+
+    writer = threading.Thread(target=insert)
+    writer.start()
+    try:
+        serialized = serialize(exported)
+    finally:
+        stop.set()
+        writer.join()
+    SharedIndexPublisher(str(tmp_path)).publish(serialized)
+    reader = SharedIndexReader(str(tmp_path))
+    reader.refresh()
+    expected = TrigramIndex(zip(exported.keys, exported.names))
+    for query in ("photo", "_20", "ab", "ar", "旅", "ion_"):
+        assert reader.search(query) == expected.search(query)
+
+
+def test_names_that_are_not_utf8_round_trip(tmp_path):
+    # os.scandir returns undecodable bytes as surrogates.
+    rel_path = b"caf\xe9/r\xe9sum\xe9.pdf".decode("utf-8", "surrogateescape")
+    names = TrigramIndex([(rel_path, rel_path.rpartition("/")[2]), ("plain/resume.pdf", "resume.pdf")])
+    names.track_order()
+    files = FileStore([(rel_path, 2.0, 20), ("plain/resume.pdf", 1.0, 10)])
+    reader = _publish(tmp_path, names, files)
+
+    assert reader.search("sum") == names.search("sum") == [rel_path, "plain/resume.pdf"]
+    assert reader.search("caf") == []  # directories are not part of the name
+    assert reader.complete("r", 10) == names.prefix("r", 10)
+    assert reader.get(rel_path) == (2.0, 20)
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from services.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_result_or_error():
+    flights = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    async def failing():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def scenario():
+        shared = await asyncio.gather(*(flights.do("dune", fetch) for _ in range(5)))
+        errors = await asyncio.gather(*(flights.do("dune", failing) for _ in range(3)), return_exceptions=True)
+        later = await flights.do("dune", fetch)
+        return shared, errors, later
+
+    shared, errors, later = asyncio.run(scenario())
+    assert shared == [1] * 5
+    assert [str(e) for e in errors] == ["upstream down"] * 3
+    assert later == 3  # a finished flight is forgotten
+    assert len(flights) == 0
+
+
+def test_call_is_only_cancelled_when_every_waiter_gave_up():
+    flights = SingleFlight()
+    started = []
+    release = None
+
+    async def fetch():
+        started.append(1)
+        await release.wait()
+        return "done"
+
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        impatient = asyncio.ensure_future(flights.do("dune", fetch))
+        patient = asyncio.ensure_future(flights.do("dune", fetch))
+        await asyncio.sleep(0)
+        impatient.cancel()
+        await asyncio.sleep(0)
+        assert "dune" in flights  # still running for the patient caller
+        release.set()
+        result = await patient
+        with pytest.raises(asyncio.CancelledError):
+            await impatient
+
+        release.clear()
+        lone = asyncio.ensure_future(flights.do("other", fetch))
+        await asyncio.sleep(0)
+        task = flights._flights["other"].task
+        lone.cancel()
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        return result, task.cancelled()
+
+    result, cancelled = asyncio.run(scenario())
+    assert result == "done"
+    assert cancelled
+    assert started == [1, 1]
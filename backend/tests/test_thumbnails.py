@@ -0,0 +1,64 @@
+import asyncio
+import urllib.parse
+
+from adapters.audiobookshelf import AudiobookshelfAdapter
+from adapters.calibreweb import CalibreWebAdapter
+from adapters.jellyfin import JellyfinAdapter
+from adapters.photoprism import PhotoPrismAdapter
+from stub_upstreams import StubSettings, start_stubs
+
+
+def _proxied_paths(adapter, results):
+    paths = []
+    for result in results:
+        url = urllib.parse.urlsplit(result.thumbnail_url)
+        assert urllib.parse.unquote(url.path) == f"/thumbnail/{adapter.name}"
+        paths.append(urllib.parse.parse_qs(url.query)["path"][0])
+    return paths
+
+
+def test_generated_thumbnail_paths_are_the_only_ones_proxied():
+    server, base_url = start_stubs(StubSettings(latency=0, items=3, libraries=1))
+    common = {"enabled": True, "timeout": 5.0, "cache_max_entries": 0, "thumbnail_proxy": True,
+              "backend_base_url": "http://backend"}
+    adapters = [
+        JellyfinAdapter(dict(common, api_base_url=f"{base_url}/jellyfin", web_base_url=f"{base_url}/jellyfin",
+                             api_key="key", user_id="user")),
+        PhotoPrismAdapter(dict(common, api_base_url=f"{base_url}/photoprism/api/v1",
+                               web_base_url=f"{base_url}/photoprism", api_key="key")),
+        AudiobookshelfAdapter(dict(common, api_base_url=f"{base_url}/abs/api", web_base_url=f"{base_url}/abs",
+                                   username="bench", password="bench")),
+        CalibreWebAdapter(dict(common, web_base_url=f"{base_url}/calibre", username="bench", password="bench",
+                               search_mode="html")),
+        CalibreWebAdapter(dict(common, web_base_url=f"{base_url}/calibre", username="bench", password="bench",
+                               search_mode="opds", instance="opds")),
+    ]
+
+    async def scenario():
+        found = []
+        for adapter in adapters:
+            found.append((adapter, await adapter.search("dune", limit=3)))
+            await adapter.shutdown()
+        return found
+
+    try:
+        found = asyncio.run(scenario())
+    finally:
+        server.shutdown()
+    for adapter, results in found:
+        paths = _proxied_paths(adapter, results)
+        assert len(paths) == 3, adapter.name
+        for path in paths:
+            assert adapter.thumbnail_path.fullmatch(path), (adapter.name, path)
+
+
+def test_other_upstream_paths_are_rejected():
+    rejected = {
+        JellyfinAdapter: ["/Users/user/Items", "/Items/1/Images/Primary/../../../System/Info", "/Items/../Users"],
+        PhotoPrismAdapter: ["/api/v1/photos", "/api/v1/t/abc/public/tile_500/../../../config"],
+        AudiobookshelfAdapter: ["/libraries", "/items/1/cover/../../me", "/items/1"],
+        CalibreWebAdapter: ["/admin/config", "/opds/download/1/epub", "/cover/1/og?c=1&x=/admin"],
+    }
+    for adapter_type, paths in rejected.items():
+        for path in paths:
+            assert not adapter_type.thumbnail_path.fullmatch(path), (adapter_type.name, path)
@@ -0,0 +1,67 @@
+import random
+
+from indexing.trigram import TrigramIndex, normalize
+
+
+def _brute_search(live, query):
+    q = normalize(query)
+    return [key for key, name in live.items() if q in normalize(name)]
+
+
+def _brute_prefix(live, prefix, limit):
+    needle = normalize(prefix)
+    # Equal names keep insertion order.
+    matches = sorted((normalize(name), position, key) for position, (key, name) in enumerate(live.items())
+                     if normalize(name).startswith(needle))
+    return [key for _, _, key in matches[:limit]]
+
+
+WORDS = ["report", "photo", "旅行", "照片", "家庭", "invoice", "k3", "zq", "x", "Résumé"]
+
+
+def _random_name(rng):
+    return "_".join(rng.choice(WORDS) for _ in range(rng.randint(1, 3))) + f"_{rng.randrange(100)}.txt"
+
+
+def test_search_and_prefix_match_a_scan_through_adds_removes_and_compaction():
+    rng = random.Random(7)
+    index = TrigramIndex()
+    index.track_order()
+    live = {}
+    # Mostly inserts first, so fresh entries are merged into the order, then
+    # enough removals to compact the index several times.
+    for step in range(18000):
+        if live and rng.random() < (0.05 if step < 6000 else 0.4):
+            key = rng.choice(list(live))
+            index.remove(key)
+            del live[key]
+        else:
+            # New keys early on; later, re-adds of existing keys as well.
+            key = f"k{step if step < 6000 else rng.randrange(18000)}"
+            name = _random_name(rng)
+            index.add(key, name)
+            live.pop(key, None)  # re-adding moves an entry to the end, like a new insert
+            live[key] = name
+        if step % 3000 == 2999:
+            for query in ("report", "旅行", "照", "k3", "x", "_1", "résumé", "nothing"):
+                assert index.search(query) == _brute_search(live, query), query
+            for prefix in ("report", "旅", "x_", "r"):
+                assert index.prefix(prefix, 20) == _brute_prefix(live, prefix, 20), prefix
+    assert len(index) == len(live)
+
+
+def test_search_limit_keeps_insertion_order():
+    index = TrigramIndex((f"k{i}", f"photo {i}") for i in range(10))
+    assert index.search("photo", 3) == ["k0", "k1", "k2"]
+    assert index.search("o", 2) == ["k0", "k1"]  # single Latin characters scan
+
+
+def test_export_is_not_affected_by_later_changes():
+    index = TrigramIndex([("a", "holiday photo"), ("b", "photo album")])
+    exported = index.export()
+    index.add("c", "photo booth")
+    index.remove("a")
+    assert exported.keys == ["a", "b"]
+    assert exported.names == ["holiday photo", "photo album"]
+    assert exported.live_count == 2
+    assert list(exported.postings["pho"]) == [0, 1]